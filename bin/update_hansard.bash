@@ -10,6 +10,7 @@ source ../pombola-virtualenv/bin/activate
 
 ./manage.py hansard_check_for_new_sources
 ./manage.py hansard_process_sources
+./manage.py wordcloud_update_word_counts
 ./manage.py hansard_assign_speakers
 
 # This will print out to STDOUT if it finds any. This should then get emailed to
@@ -0,0 +1,100 @@
+"""Precompute how the boundaries of places change between sessions
+
+Place.get_boundary_changes shows, for a place such as a constituency,
+which places of the same kind in the previous and next parliamentary
+sessions its boundary overlaps with.  Working that out needs spatial
+queries and polygon intersections, so it's done here in advance for
+every place in adjacent sessions, in a pool of worker processes, and
+the results are stored as PlaceBoundaryOverlap objects."""
+
+from multiprocessing import Pool
+
+from django.db import connections, transaction
+
+from pombola.core import fragment_cache
+from pombola.core.models import (
+    ParliamentarySession, Place, PlaceBoundaryOverlap, PlaceKind
+)
+
+
+def boundary_overlap_jobs():
+    """Return (place ID, session ID) for each overlap calculation needed
+
+    For every PlaceKind, and every pair of adjacent parliamentary
+    sessions that have places of that kind, each place in one session
+    should be compared with the places in the other."""
+    jobs = []
+    for kind in PlaceKind.objects.all():
+        sessions = list(kind.parliamentary_sessions())
+        for session, other_session in zip(sessions, sessions[1:]):
+            for a, b in ((session, other_session), (other_session, session)):
+                place_ids = Place.objects.filter(
+                    kind=kind,
+                    parliamentary_session=a,
+                    mapit_area__isnull=False,
+                ).values_list('id', flat=True)
+                jobs.extend((place_id, b.id) for place_id in place_ids)
+    return jobs
+
+
+def compute_overlaps(job):
+    """Work out the overlaps for one job, in a worker process
+
+    This returns the place ID, the session ID and a list of
+    (other place ID, percent) tuples."""
+    place_id, session_id = job
+    place = Place.objects.select_related('kind', 'mapit_area__type').get(id=place_id)
+    session = ParliamentarySession.objects.get(id=session_id)
+    return place_id, session_id, [
+        (other_place.id, percent)
+        for percent, other_place in place.compute_boundary_overlaps(session)
+    ]
+
+
+def save_overlaps(place_id, session_id, overlaps):
+    """Replace the stored overlaps of a place with places in a session"""
+    with transaction.atomic():
+        PlaceBoundaryOverlap.objects.filter(
+            place_id=place_id,
+            other_place__parliamentary_session_id=session_id,
+        ).delete()
+        PlaceBoundaryOverlap.objects.bulk_create([
+            PlaceBoundaryOverlap(
+                place_id=place_id,
+                other_place_id=other_place_id,
+                percent=percent,
+            )
+            for other_place_id, percent in overlaps
+        ])
+
+
+def update_boundary_overlaps(processes=None, progress=None):
+    """Recalculate every PlaceBoundaryOverlap, using a pool of processes
+
+    If processes is None, the pool has one process per CPU.  progress,
+    if given, is called with the number of jobs done and the total
+    after each one.  Returns the number of jobs done."""
+
+    jobs = boundary_overlap_jobs()
+
+    # Don't share this process's database connections with the
+    # forked worker processes:
+    for connection in connections.all():
+        connection.close()
+
+    pool = Pool(processes=processes)
+    try:
+        for i, (place_id, session_id, overlaps) in enumerate(
+                pool.imap_unordered(compute_overlaps, jobs), 1):
+            save_overlaps(place_id, session_id, overlaps)
+            if progress:
+                progress(i, len(jobs))
+    finally:
+        pool.close()
+        pool.join()
+
+    # The boundary changes are shown on the pages of places in other
+    # sessions too, so invalidate every cached fragment:
+    fragment_cache.invalidate_all()
+
+    return len(jobs)
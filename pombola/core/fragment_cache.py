@@ -0,0 +1,95 @@
+"""Cache fragments of pages that are invalidated when their objects change
+
+The person, place and organisation pages have blocks (positions,
+related people, scorecards, aspirants, boundary changes) that take
+many queries to render.  Those blocks are wrapped in the
+{% cachefragment %} tag from the fragment_cache template tag library,
+which caches them under a key that includes a version for each object
+that they depend on.  Each object's version is a random token kept in
+the cache; invalidating an object just deletes its token, so every
+fragment that depended on it is recomputed on the next request.
+
+The signal handlers at the end of pombola.core.models decide which
+objects are affected by a change to a Position, Person, Place,
+Organisation or Contact."""
+
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Model
+
+
+# Changing this token invalidates every fragment at once, e.g. after
+# data that many pages depend on has been regenerated in bulk:
+GLOBAL_VERSION_KEY = 'fragment-version:all'
+
+
+def version_key(model, pk):
+    # Use the concrete model so that proxy models (e.g. ZAPlace) share
+    # versions with the model they're a proxy for:
+    opts = model._meta.concrete_model._meta
+    return 'fragment-version:{0}.{1}:{2}'.format(
+        opts.app_label, opts.model_name, pk)
+
+
+def get_versions(keys):
+    """Return the version tokens for keys, creating any that are missing"""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            token = uuid4().hex
+            # If another request has just created a token, use that:
+            if not cache.add(key, token, None):
+                token = cache.get(key) or token
+            versions[key] = token
+    return [versions[key] for key in keys]
+
+
+def get_fragment_key(fragment_name, vary_on):
+    """Return the cache key for a fragment
+
+    vary_on is a list of values the fragment depends on.  For model
+    instances (or lists of them) the current versions of the objects
+    are used, and any other values are used as they are."""
+    keys = [GLOBAL_VERSION_KEY]
+    values = []
+    for value in vary_on:
+        objects = value if isinstance(value, (list, tuple)) else [value]
+        for o in objects:
+            if isinstance(o, Model):
+                keys.append(version_key(o.__class__, o.pk))
+            else:
+                values.append(unicode(o))
+    versions = get_versions(keys)
+    digest = md5(u':'.join(versions + values).encode('utf-8')).hexdigest()
+    return 'fragment:{0}:{1}'.format(fragment_name, digest)
+
+
+def get_fragment(fragment_name, vary_on, render):
+    """Return the cached fragment, or call render and cache its result"""
+    key = get_fragment_key(fragment_name, vary_on)
+    value = cache.get(key)
+    if value is None:
+        value = render()
+        cache.set(key, value, settings.FRAGMENT_CACHE_TIMEOUT)
+    return value
+
+
+def invalidate_ids(model, pks):
+    """Invalidate the fragments depending on the model's objects with these pks"""
+    keys = [version_key(model, pk) for pk in set(pks) if pk is not None]
+    if keys:
+        cache.delete_many(keys)
+
+
+def invalidate(*objects):
+    """Invalidate the fragments depending on any of these objects"""
+    for o in objects:
+        if o is not None:
+            invalidate_ids(o.__class__, [o.pk])
+
+
+def invalidate_all():
+    cache.delete(GLOBAL_VERSION_KEY)
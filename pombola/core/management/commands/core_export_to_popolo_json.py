@@ -7,8 +7,13 @@ from os.path import exists, isdir, join
 import urlparse
 
 from pombola.core.popolo import get_popolo_data
+from pombola.core.popolo_delta import write_popolo_delta
+from pombola.core.popolo_stream import (
+    DEFAULT_CHUNK_SIZE, write_collection_files, write_pombola_files
+)
 
 from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
 
 
 class Command(BaseCommand):
@@ -22,6 +27,25 @@ class Command(BaseCommand):
                 action="store_true",
                 help="Make a single file with inline memberships"
             ),
+            make_option(
+                "--streaming",
+                dest="streaming",
+                action="store_true",
+                help="Write the output incrementally from a single pass over the database"
+            ),
+            make_option(
+                "--chunk-size",
+                dest="chunk_size",
+                type="int",
+                default=DEFAULT_CHUNK_SIZE,
+                help="With --streaming or --incremental, the number of rows to fetch at a time"
+            ),
+            make_option(
+                "--incremental",
+                dest="incremental",
+                action="store_true",
+                help="Only export what has changed since the last incremental export, as a delta file"
+            ),
     )
 
     def handle(self, *args, **options):
@@ -40,7 +64,35 @@ class Command(BaseCommand):
 
         primary_id_scheme = '.'.join(reversed(parsed_url.netloc.split('.')))
 
-        if options['pombola']:
+        if options['incremental']:
+            leafname = timezone.now().strftime('popolo-delta-%Y%m%d%H%M%S.json')
+            counts = write_popolo_delta(
+                join(output_directory, leafname),
+                output_directory,
+                primary_id_scheme,
+                pombola_url,
+                chunk_size=options['chunk_size'],
+            )
+            for collection, collection_counts in sorted(counts.items()):
+                self.stdout.write(
+                    "{0}: {1} changed, {2} deleted".format(
+                        collection,
+                        collection_counts['changed'],
+                        collection_counts['deleted'],
+                    )
+                )
+        elif options['streaming']:
+            if options['pombola']:
+                write_function = write_pombola_files
+            else:
+                write_function = write_collection_files
+            write_function(
+                output_directory,
+                primary_id_scheme,
+                pombola_url,
+                chunk_size=options['chunk_size'],
+            )
+        elif options['pombola']:
             for inline_memberships, leafname in (
                     (True, 'pombola.json'),
                     (False, 'pombola-no-inline-memberships.json'),
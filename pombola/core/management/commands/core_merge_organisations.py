@@ -1,6 +1,9 @@
 # This admin command is to save having to do a series of manual steps
 # when merging to people in Pombola.
 
+from django.db.models import Q
+
+from pombola.core import fragment_cache
 import pombola.core.models as core_models
 
 from ..merge import MergeCommandBase
@@ -16,17 +19,48 @@ class Command(MergeCommandBase):
     )
     model_class = core_models.Organisation
 
-    def model_specific_merge(self, to_keep, to_delete, **options):
-        core_models.Position.objects.filter(organisation=to_delete) \
-            .update(organisation=to_keep)
-        core_models.Place.objects.filter(organisation=to_delete) \
-            .update(organisation=to_keep)
-        core_models.OrganisationRelationship.objects \
-            .filter(organisation_a=to_delete) \
-            .update(organisation_a=to_keep)
-        core_models.OrganisationRelationship.objects \
-            .filter(organisation_b=to_delete) \
-            .update(organisation_b=to_keep)
-        core_models.ParliamentarySession.objects \
-            .filter(house=to_delete) \
-            .update(house=to_keep)
+    def model_specific_bulk_merge(self, objects, mapping, **options):
+        self.reassign(
+            core_models.Position.objects.all(), 'organisation', mapping)
+        self.reassign(
+            core_models.Place.objects.all(), 'organisation', mapping)
+        self.reassign(
+            core_models.OrganisationRelationship.objects.all(),
+            'organisation_a',
+            mapping)
+        self.reassign(
+            core_models.OrganisationRelationship.objects.all(),
+            'organisation_b',
+            mapping)
+        self.reassign(
+            core_models.ParliamentarySession.objects.all(), 'house', mapping)
+        # The positions were moved without sending signals:
+        core_models.Organisation.update_position_counts(
+            set(mapping.values()))
+
+    def invalidate_caches(self, mapping):
+        super(Command, self).invalidate_caches(mapping)
+        keep_ids = set(mapping.values())
+        person_ids = set()
+        place_ids = set(
+            core_models.Place.objects
+            .filter(organisation__in=keep_ids)
+            .values_list('id', flat=True))
+        for person_id, place_id in core_models.Position.objects \
+                .filter(organisation__in=keep_ids) \
+                .values_list('person_id', 'place_id'):
+            person_ids.add(person_id)
+            place_ids.add(place_id)
+        related_organisation_ids = set()
+        for organisation_a_id, organisation_b_id in \
+                core_models.OrganisationRelationship.objects \
+                .filter(
+                    Q(organisation_a__in=keep_ids) |
+                    Q(organisation_b__in=keep_ids)) \
+                .values_list('organisation_a_id', 'organisation_b_id'):
+            related_organisation_ids.update(
+                (organisation_a_id, organisation_b_id))
+        fragment_cache.invalidate_ids(core_models.Person, person_ids)
+        fragment_cache.invalidate_ids(core_models.Place, place_ids)
+        fragment_cache.invalidate_ids(
+            core_models.Organisation, related_organisation_ids - keep_ids)
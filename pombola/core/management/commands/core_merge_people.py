@@ -1,15 +1,19 @@
 # This admin command is to save having to do a series of manual steps
 # when merging to people in Pombola.
 
+from collections import defaultdict
+import re
+import sys
+
 from django.conf import settings
 
+from pombola.core import fragment_cache
 import pombola.core.models as core_models
-from pombola.core.views import PersonSpeakerMappingsMixin
 
 from ..merge import MergeCommandBase
 
 
-class Command(PersonSpeakerMappingsMixin, MergeCommandBase):
+class Command(MergeCommandBase):
     admin_url_name = 'admin:core_person_change'
     basic_fields_to_check = (
         'date_of_birth',
@@ -20,40 +24,55 @@ class Command(PersonSpeakerMappingsMixin, MergeCommandBase):
     )
     model_class = core_models.Person
 
-    def model_specific_merge(self, to_keep, to_delete, **options):
-        # Find names that might be lost and add it them as
-        # alternative names to the person to keep:
-        names_to_add = to_delete.all_names_set() - to_keep.all_names_set()
-
-        for name in names_to_add:
-            to_keep.add_alternative_name(name)
+    def model_specific_bulk_merge(self, objects, mapping, **options):
+        person_ids = set(mapping.keys()) | set(mapping.values())
 
-        # If a SayIt ID scheme is specified, move speeches from deleted person
+        # Find names that might be lost and add it them as
+        # alternative names to the people to keep:
+        def normalise(name):
+            return re.sub(r'\s+', ' ', name).strip()
+
+        names = defaultdict(set)
+        for person_id in person_ids:
+            names[person_id].add(normalise(objects[person_id].legal_name))
+        for person_id, name in core_models.AlternativePersonName.objects \
+                .filter(person__in=person_ids) \
+                .values_list('person_id', 'alternative_name'):
+            names[person_id].add(normalise(name))
+        names_to_add = set(
+            (keep_id, name)
+            for delete_id, keep_id in mapping.items()
+            for name in names[delete_id] - names[keep_id]
+        )
+        core_models.AlternativePersonName.objects.bulk_create([
+            core_models.AlternativePersonName(
+                person_id=keep_id, alternative_name=name)
+            for keep_id, name in names_to_add
+        ])
+
+        # If a SayIt ID scheme is specified, move speeches from deleted people
         if 'speeches' in settings.INSTALLED_APPS:
 
             if not options['quiet']:
-                print "Moving SayIt speeches"
+                print >> sys.stderr, "Moving SayIt speeches"
 
             from speeches.models import Speech
 
-            delete_sayit_speaker = self.pombola_person_to_sayit_speaker(
-                to_delete)
-
-            keep_sayit_speaker = self.pombola_person_to_sayit_speaker(
-                to_keep)
-
-            if delete_sayit_speaker and keep_sayit_speaker:
-                Speech.objects.filter(
-                    speaker=delete_sayit_speaker
-                ).update(
-                    speaker=keep_sayit_speaker
-                )
-            else:
-                if not options['quiet']:
-                    print "One or both of the people does not have a SayIt " \
-                        "speaker. Not moving speeches."
-
-        core_models.Position.objects.filter(person=to_delete).update(person=to_keep)
+            sayit_speaker_ids = dict(
+                core_models.Person.objects
+                .filter(id__in=person_ids, sayit_link__isnull=False)
+                .values_list('id', 'sayit_link__sayit_speaker'))
+            speaker_mapping = dict(
+                (sayit_speaker_ids[delete_id], sayit_speaker_ids[keep_id])
+                for delete_id, keep_id in mapping.items()
+                if delete_id in sayit_speaker_ids and keep_id in sayit_speaker_ids
+            )
+            self.reassign(Speech.objects.all(), 'speaker', speaker_mapping)
+            if len(speaker_mapping) < len(mapping) and not options['quiet']:
+                print >> sys.stderr, "Some of the people do not have a SayIt " \
+                    "speaker. Not moving their speeches."
+
+        self.reassign(core_models.Position.objects.all(), 'person', mapping)
 
         # Then those in hansard, if that application is installed:
         #    hansard_models.Alias
@@ -62,11 +81,11 @@ class Command(PersonSpeakerMappingsMixin, MergeCommandBase):
             import pombola.hansard.models as hansard_models
 
             if not options['quiet']:
-                print "Moving Hansard entries"
+                print >> sys.stderr, "Moving Hansard entries"
 
-            hansard_models.Alias.objects.filter(person=to_delete).update(person=to_keep)
+            self.reassign(hansard_models.Alias.objects.all(), 'person', mapping)
 
-            hansard_models.Entry.objects.filter(speaker=to_delete).update(speaker=to_keep)
+            self.reassign(hansard_models.Entry.objects.all(), 'speaker', mapping)
 
         # (The scorecard application can be ignored, since those
         # results are regenerated automatically.)
@@ -77,6 +96,19 @@ class Command(PersonSpeakerMappingsMixin, MergeCommandBase):
             import pombola.interests_register.models as interests_register_models
 
             if not options['quiet']:
-                print "Moving interests register entries"
-
-            interests_register_models.Entry.objects.filter(person=to_delete).update(person=to_keep)
+                print >> sys.stderr, "Moving interests register entries"
+
+            self.reassign(
+                interests_register_models.Entry.objects.all(), 'person', mapping)
+
+    def invalidate_caches(self, mapping):
+        super(Command, self).invalidate_caches(mapping)
+        organisation_ids = set()
+        place_ids = set()
+        for organisation_id, place_id in core_models.Position.objects \
+                .filter(person__in=set(mapping.values())) \
+                .values_list('organisation_id', 'place_id'):
+            organisation_ids.add(organisation_id)
+            place_ids.add(place_id)
+        fragment_cache.invalidate_ids(core_models.Organisation, organisation_ids)
+        fragment_cache.invalidate_ids(core_models.Place, place_ids)
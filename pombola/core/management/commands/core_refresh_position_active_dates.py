@@ -0,0 +1,87 @@
+import datetime
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+from django.db.models import Q
+
+from pombola.core import fragment_cache, position_listing
+from pombola.core.models import Organisation, Person, Place, Position
+from pombola.search.index_updates import update_search_index
+
+
+class Command(NoArgsCommand):
+
+    help = "Recalculate the indexed active dates used by Position's currently_active filter"
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--commit', action='store_true', dest='commit', help='Actually update the database'),
+        make_option('--reindex-days', type='int', dest='reindex_days', default=1,
+                    help='With --commit, reindex and clear the cached page fragments of the people, '
+                         'places and organisations whose current positions changed in this '
+                         'many days (default 1, for a daily run)'),
+    )
+
+    def handle_noargs(self, **options):
+        verbose = int(options['verbosity']) > 1
+        # Positions whose dates were changed without save(), so without
+        # their search index data or cached fragments being updated:
+        position_ids = set()
+        with transaction.atomic():
+            for position in Position.objects.order_by().only(
+                    'start_date', 'end_date', 'active_from', 'active_until').iterator():
+                if not position._set_active_dates():
+                    continue
+                position_ids.add(position.id)
+                if verbose:
+                    self.stdout.write("  Updating active dates for position %d" % position.id)
+                if options['commit']:
+                    Position.objects.filter(pk=position.pk).update(
+                        active_from=position.active_from,
+                        active_until=position.active_until,
+                    )
+        self.stdout.write("%d positions had out of date active dates" % len(position_ids))
+
+        if options['commit']:
+            if position_ids:
+                position_listing.invalidate()
+            self.refresh_date_dependent_data(position_ids, options['reindex_days'])
+
+    def refresh_date_dependent_data(self, position_ids, days):
+        """Update search data and cached fragments that depend on the date
+
+        The search index stores each person's current positions, and
+        whether each place's parliamentary session is still going, and
+        the person, place and organisation pages cache their lists of
+        current positions.  These need updating when a position starts
+        or ends, or a session ends, even though nothing has been saved."""
+        today = datetime.date.today()
+        since = today - datetime.timedelta(days=days)
+
+        person_ids = set()
+        organisation_ids = set()
+        place_ids = set()
+        for person_id, organisation_id, place_id in Position.objects \
+                .filter(
+                    Q(id__in=position_ids) |
+                    Q(active_from__gt=since, active_from__lte=today) |
+                    Q(active_until__gte=since, active_until__lt=today)) \
+                .values_list('person_id', 'organisation_id', 'place_id'):
+            person_ids.add(person_id)
+            organisation_ids.add(organisation_id)
+            place_ids.add(place_id)
+
+        session_place_ids = set(
+            Place.objects
+            .filter(
+                parliamentary_session__end_date__gte=since,
+                parliamentary_session__end_date__lt=today)
+            .values_list('id', flat=True)
+        )
+
+        update_search_index(Person, person_ids)
+        update_search_index(Place, session_place_ids)
+
+        fragment_cache.invalidate_ids(Person, person_ids)
+        fragment_cache.invalidate_ids(Organisation, organisation_ids)
+        fragment_cache.invalidate_ids(Place, place_ids | session_place_ids)
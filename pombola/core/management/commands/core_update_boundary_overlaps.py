@@ -0,0 +1,29 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from pombola.core.boundary_overlaps import update_boundary_overlaps
+
+
+class Command(NoArgsCommand):
+    help = 'Recalculate how place boundaries overlap between parliamentary sessions'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--processes',
+            type='int',
+            dest='processes',
+            default=None,
+            help='The number of worker processes to use (default: one per CPU)'
+        ),
+    )
+
+    def handle_noargs(self, **options):
+        verbose = int(options['verbosity']) >= 2
+
+        def progress(done, total):
+            if verbose and (done % 100 == 0 or done == total):
+                self.stdout.write("Calculated overlaps for {0} of {1} places".format(
+                    done, total))
+
+        update_boundary_overlaps(processes=options['processes'], progress=progress)
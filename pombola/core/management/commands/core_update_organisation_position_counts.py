@@ -0,0 +1,15 @@
+from django.core.management.base import NoArgsCommand
+
+from pombola.core.models import Organisation
+
+
+class Command(NoArgsCommand):
+
+    help = "Recalculate the position counts kept on every organisation"
+
+    def handle_noargs(self, **options):
+        # Which positions are current changes from day to day, so this
+        # should be run daily:
+        Organisation.update_position_counts()
+        if int(options['verbosity']) > 1:
+            self.stdout.write("Updated the position counts of %d organisations" % Organisation.objects.count())
@@ -1,7 +1,19 @@
 # This base class is to make it easier to write management commands
 # for merging object in Pombola (e.g. Person and Organisation at the
 # moment).
+#
+# As well as merging a single pair of objects, the commands can merge
+# a whole file of (keep, delete) pairs at once with --file, which is
+# what's needed to fold in the duplicates after an import.  Chains of
+# pairs (A merged into B, and B into C) are resolved so that everything
+# ends up in the final object, and the references to the objects being
+# deleted are moved with one UPDATE per table for each batch, rather
+# than per pair.  A JSON report of what was merged, and what was
+# skipped because data might be lost, is written at the end.
 
+from collections import defaultdict
+import csv
+import json
 from optparse import make_option
 import sys
 
@@ -9,17 +21,22 @@ from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand, CommandError
 from django.core.urlresolvers import reverse
 from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
 
 from slug_helpers.models import SlugRedirect
 from images.models import Image
 
+from pombola.core import fragment_cache, position_listing
 import pombola.core.models as core_models
 
 
-def check_basic_fields(basic_fields, to_keep, to_delete):
-    """Return False if any data might be lost on merging"""
+DEFAULT_BATCH_SIZE = 100
+
 
-    safe_to_delete = True
+def find_mismatches(basic_fields, to_keep, to_delete):
+    """Return (field, keep value, delete value) for data that might be lost"""
+
+    mismatches = []
     for basic_field in basic_fields:
         if basic_field == 'summary':
             # We can't just check equality of summary fields because
@@ -36,14 +53,132 @@ def check_basic_fields(basic_fields, to_keep, to_delete):
 
         if delete_value and (keep_value != delete_value):
             # i.e. there's some data that might be lost:
-            safe_to_delete = False
-            message = "Mismatch in '%s': '%s' ({%d}) and '%s' (%d)"
-            print >> sys.stderr, message % (basic_field,
-                                            keep_value,
-                                            to_keep.id,
-                                            delete_value,
-                                            to_delete.id)
-    return safe_to_delete
+            mismatches.append((basic_field, keep_value, delete_value))
+    return mismatches
+
+
+def check_basic_fields(basic_fields, to_keep, to_delete):
+    """Return False if any data might be lost on merging"""
+
+    mismatches = find_mismatches(basic_fields, to_keep, to_delete)
+    for basic_field, keep_value, delete_value in mismatches:
+        message = "Mismatch in '%s': '%s' ({%d}) and '%s' (%d)"
+        print >> sys.stderr, message % (basic_field,
+                                        keep_value,
+                                        to_keep.id,
+                                        delete_value,
+                                        to_delete.id)
+    return not mismatches
+
+
+def reassign_references(queryset, field_name, mapping, **extra_updates):
+    """Repoint field_name from each key of mapping to its value in one UPDATE
+
+    mapping maps the IDs of the objects being deleted to the IDs of
+    the ones they're being merged into.  Any extra_updates are also
+    made to the rows that are moved.  Returns the number of rows
+    updated."""
+
+    if not mapping:
+        return 0
+    new_value = Case(
+        *[When(then=Value(new_id), **{field_name: old_id})
+          for old_id, new_id in mapping.items()],
+        default=F(field_name),
+        output_field=IntegerField()
+    )
+    extra_updates[field_name] = new_value
+    return queryset.filter(**{field_name + '__in': mapping.keys()}) \
+        .update(**extra_updates)
+
+
+def read_merge_pairs(filename):
+    """Return a list of (keep, delete) identifiers from a CSV or JSON file
+
+    A JSON file (one whose name ends in .json) should contain a list
+    of objects with 'keep' and 'delete' keys, or of two-element lists.
+    A CSV file should have two columns, keep and delete, with an
+    optional header row."""
+
+    if filename.lower().endswith('.json'):
+        with open(filename) as f:
+            rows = json.load(f)
+        pairs = []
+        for row in rows:
+            if isinstance(row, dict):
+                pairs.append((row['keep'], row['delete']))
+            else:
+                keep, delete = row
+                pairs.append((keep, delete))
+    else:
+        with open(filename, 'rb') as f:
+            pairs = [
+                (row[0].decode('utf-8'), row[1].decode('utf-8'))
+                for row in csv.reader(f)
+                if any(cell.strip() for cell in row)
+            ]
+        if pairs and pairs[0] == ('keep', 'delete'):
+            pairs = pairs[1:]
+    return [(unicode(keep).strip(), unicode(delete).strip())
+            for keep, delete in pairs]
+
+
+def resolve_merge_chains(pairs):
+    """Return a dictionary mapping each ID to delete to the ID it ends up in
+
+    pairs is a list of (keep ID, delete ID).  If an object that's being
+    kept in one pair is deleted in another (e.g. A is merged into B and
+    B into C) it's followed to the object that's finally kept.  Raises
+    CommandError if an object is to be merged into itself, into two
+    different objects, or (via a cycle) back into itself."""
+
+    targets = {}
+    for keep_id, delete_id in pairs:
+        if keep_id == delete_id:
+            raise CommandError(
+                "Object {0} is both kept and deleted".format(keep_id))
+        if targets.get(delete_id, keep_id) != keep_id:
+            raise CommandError(
+                "Object {0} would be merged into both {1} and {2}".format(
+                    delete_id, targets[delete_id], keep_id))
+        targets[delete_id] = keep_id
+
+    resolved = {}
+    for delete_id, keep_id in targets.items():
+        chain = [delete_id]
+        while keep_id in targets:
+            if keep_id in chain:
+                raise CommandError("These merges form a cycle: {0}".format(
+                    " -> ".join(str(i) for i in chain + [keep_id])))
+            chain.append(keep_id)
+            keep_id = targets[keep_id]
+        resolved[delete_id] = keep_id
+    return resolved
+
+
+def batch_merges(mapping, batch_size):
+    """Split mapping into batches of about batch_size objects to delete
+
+    All the objects being merged into the same object are kept in the
+    same batch, so that each object's merge is done in one transaction."""
+
+    groups = defaultdict(list)
+    for delete_id, keep_id in mapping.items():
+        groups[keep_id].append(delete_id)
+
+    batch = {}
+    for keep_id in sorted(groups):
+        for delete_id in groups[keep_id]:
+            batch[delete_id] = keep_id
+        if len(batch) >= batch_size:
+            yield batch
+            batch = {}
+    if batch:
+        yield batch
+
+
+def describe(obj):
+    return {'id': obj.id, 'slug': obj.slug, 'name': unicode(obj)}
 
 
 class MergeCommandBase(BaseCommand):
@@ -54,6 +189,15 @@ class MergeCommandBase(BaseCommand):
         make_option("--delete-object", dest="delete_object", type="string",
                     help="The ID or slug of the object to delete",
                     metavar="OBJECT-ID"),
+        make_option("--file", dest="merge_file", type="string",
+                    help="A CSV or JSON file of (keep, delete) pairs of IDs or slugs to merge",
+                    metavar="FILENAME"),
+        make_option("--batch-size", dest="batch_size", type="int",
+                    default=DEFAULT_BATCH_SIZE,
+                    help="With --file, the number of objects to delete in each transaction"),
+        make_option("--report", dest="report", type="string",
+                    help="With --file, write the JSON report here rather than to standard output",
+                    metavar="FILENAME"),
         make_option('--noinput',  dest='interactive',
                     action='store_false', default=True,
                     help="Do NOT prompt the user for input of any kind"),
@@ -68,6 +212,28 @@ class MergeCommandBase(BaseCommand):
     def model_specific_merge(self, to_keep, to_delete, **options):
         pass
 
+    def model_specific_bulk_merge(self, objects, mapping, **options):
+        """Move the model specific references for every pair in mapping
+
+        objects maps IDs to objects, and mapping maps the ID of each
+        object to delete to the ID of the object to keep.  Subclasses
+        should override this to move everything with set-based updates
+        (see reassign); by default model_specific_merge is called for
+        each pair."""
+        for delete_id, keep_id in mapping.items():
+            self.model_specific_merge(
+                objects[keep_id], objects[delete_id], **options)
+
+    def reassign(self, queryset, field_name, mapping, **extra_updates):
+        """Call reassign_references, counting the rows updated for the report"""
+        count = reassign_references(
+            queryset, field_name, mapping, **extra_updates)
+        opts = queryset.model._meta
+        self.updated[
+            '{0}.{1}.{2}'.format(opts.app_label, opts.object_name, field_name)
+        ] += count
+        return count
+
     def get_by_slug_or_id(self, identifier):
         try:
             return self.model_class.objects.get(slug=identifier)
@@ -82,8 +248,96 @@ class MergeCommandBase(BaseCommand):
                     )
             return self.model_class.objects.get(pk=object_id)
 
-    @transaction.atomic
+    def get_objects_by_slug_or_id(self, identifiers):
+        """Return a dictionary mapping each identifier to its object
+
+        As in get_by_slug_or_id, slugs are tried before IDs; the
+        objects are all found with two queries."""
+        identifiers = set(identifiers)
+        found = {}
+        for obj in self.model_class.objects.filter(slug__in=identifiers):
+            found[obj.slug] = obj
+        ids = dict(
+            (int(i), i) for i in identifiers
+            if i not in found and i.isdigit())
+        for obj in self.model_class.objects.filter(pk__in=ids.keys()):
+            found[ids[obj.pk]] = obj
+        missing = identifiers - set(found)
+        if missing:
+            raise CommandError(u"No objects found matching: {0}".format(
+                u", ".join(sorted(missing))))
+        return found
+
+    def merge_objects(self, objects, mapping, **options):
+        """Merge each object in mapping's keys into the one it maps to
+
+        The callers run this in a transaction."""
+
+        content_type = ContentType.objects.get_for_model(self.model_class)
+
+        self.model_specific_bulk_merge(objects, mapping, **options)
+
+        # Replace the object on all models with generic foreign keys in core
+
+        for model in (core_models.Contact,
+                      core_models.Identifier,
+                      core_models.InformationSource):
+            self.reassign(
+                model.objects.filter(content_type=content_type),
+                'object_id',
+                mapping)
+
+        # Add any images for the objects to delete as non-primary
+        # images for the objects to keep:
+        self.reassign(
+            Image.objects.filter(content_type=content_type),
+            'object_id',
+            mapping,
+            is_primary=False)
+        # Earlier redirects to the objects to delete (e.g. from a
+        # previous merge) should now go to the objects to keep:
+        self.reassign(
+            SlugRedirect.objects.filter(content_type=content_type),
+            'new_object_id',
+            mapping)
+        # Make sure the old slugs redirect to the objects to keep:
+        SlugRedirect.objects.bulk_create([
+            SlugRedirect(
+                content_type=content_type,
+                new_object_id=keep_id,
+                old_object_slug=objects[delete_id].slug,
+            )
+            for delete_id, keep_id in mapping.items()
+        ])
+        # Finally delete the now unnecessary objects:
+        self.model_class.objects.filter(pk__in=mapping.keys()).delete()
+
+        # The references were moved without sending any signals, so the
+        # cached pages that show them have to be cleared here:
+        self.invalidate_caches(mapping)
+
+    def invalidate_caches(self, mapping):
+        """Clear the cached fragments and listings affected by the merges
+
+        By default these are the fragments of the objects that were
+        kept; subclasses should also clear those of any other objects
+        whose pages show the references that were moved."""
+        fragment_cache.invalidate_ids(self.model_class, set(mapping.values()))
+        position_listing.invalidate()
+
     def handle(self, *args, **options):
+        self.updated = defaultdict(int)
+        if options['merge_file']:
+            if options['keep_object'] or options['delete_object']:
+                raise CommandError(
+                    "--file can't be used with --keep-object or --delete-object")
+            if args:
+                raise CommandError("Don't supply arguments, only --file")
+            return self.handle_file(**options)
+        return self.handle_pair(*args, **options)
+
+    @transaction.atomic
+    def handle_pair(self, *args, **options):
         if not options['keep_object']:
             raise CommandError("You must specify --keep-object")
         if not options['delete_object']:
@@ -115,33 +369,109 @@ class MergeCommandBase(BaseCommand):
         ):
             raise CommandError("You must resolve differences in the above fields")
 
-        content_type = ContentType.objects.get_for_model(self.model_class)
+        self.merge_objects(
+            {to_keep.id: to_keep, to_delete.id: to_delete},
+            {to_delete.id: to_keep.id},
+            **options)
 
-        self.model_specific_merge(to_keep, to_delete, **options)
+        if not options['quiet']:
+            print "Now check the remaining object (", to_keep_admin_url, ")"
+            print "for any duplicate information."
 
-        # Replace the object on all models with generic foreign keys in core
+    def handle_file(self, **options):
+        pairs = read_merge_pairs(options['merge_file'])
+        objects_by_identifier = self.get_objects_by_slug_or_id(
+            [identifier for pair in pairs for identifier in pair])
+        objects = dict((o.id, o) for o in objects_by_identifier.values())
+        mapping = resolve_merge_chains([
+            (objects_by_identifier[keep].id, objects_by_identifier[delete].id)
+            for keep, delete in pairs
+        ])
 
-        for model in (core_models.Contact,
-                      core_models.Identifier,
-                      core_models.InformationSource):
-            model.objects.filter(content_type=content_type,
-                                 object_id=to_delete.id) \
-                .update(object_id=to_keep.id)
-
-        # Add any images for the object to delete as non-primary
-        # images for the object to keep:
-        Image.objects.filter(content_type=content_type,
-                             object_id=to_delete.id) \
-                .update(is_primary=False,
-                        object_id=to_keep.id)
-        # Make sure the old slug redirects to the object to keep:
-        SlugRedirect.objects.create(
-            new_object=to_keep,
-            old_object_slug=to_delete.slug,
-            )
-        # Finally delete the now unnecessary object:
-        to_delete.delete()
+        # Each object to delete is checked against the object it ends
+        # up merged into; if any might lose data, none of the objects
+        # being merged into that object are merged:
+        mismatches = defaultdict(list)
+        for delete_id, keep_id in mapping.items():
+            for basic_field, keep_value, delete_value in find_mismatches(
+                    self.basic_fields_to_check,
+                    objects[keep_id],
+                    objects[delete_id]):
+                mismatches[keep_id].append({
+                    'object_id': delete_id,
+                    'field': basic_field,
+                    'keep_value': unicode(keep_value),
+                    'delete_value': unicode(delete_value),
+                })
+        to_merge = dict(
+            (delete_id, keep_id) for delete_id, keep_id in mapping.items()
+            if keep_id not in mismatches)
 
+        # The report may be going to standard output, so progress
+        # messages go to standard error:
         if not options['quiet']:
-            print "Now check the remaining object (", to_keep_admin_url, ")"
-            print "for any duplicate information."
+            print >> sys.stderr, "Going to merge {0} objects into {1} others".format(
+                len(to_merge), len(set(to_merge.values())))
+            if mismatches:
+                print >> sys.stderr, \
+                    "Skipping merges into {0} objects where data might be lost".format(
+                        len(mismatches))
+
+        if options['interactive']:
+            sys.stderr.write('Do you wish to continue? (y/[n]): ')
+            answer = raw_input()
+            if answer != 'y':
+                raise CommandError("Command halted by user, no changes made")
+
+        skipped = self.describe_merges(objects, dict(
+            (delete_id, keep_id) for delete_id, keep_id in mapping.items()
+            if keep_id in mismatches))
+        for group in skipped:
+            group['mismatches'] = mismatches[group['keep']['id']]
+        report = {
+            'model': '{0}.{1}'.format(
+                self.model_class._meta.app_label,
+                self.model_class._meta.model_name),
+            'merged': [],
+            'skipped': skipped,
+            'updated': self.updated,
+            'complete': False,
+        }
+
+        # If a batch fails, the earlier batches have still been merged,
+        # so the report is written whatever happens:
+        try:
+            for batch_number, batch in enumerate(
+                    batch_merges(to_merge, options['batch_size']), 1):
+                with transaction.atomic():
+                    self.merge_objects(objects, batch, **options)
+                report['merged'].extend(self.describe_merges(objects, batch))
+                if not options['quiet']:
+                    print >> sys.stderr, "Merged batch {0} ({1} objects deleted)".format(
+                        batch_number, len(batch))
+            report['complete'] = True
+        finally:
+            self.write_report(report, options['report'])
+
+    def describe_merges(self, objects, mapping):
+        groups = defaultdict(list)
+        for delete_id, keep_id in mapping.items():
+            groups[keep_id].append(delete_id)
+        return [
+            {
+                'keep': describe(objects[keep_id]),
+                'deleted': [
+                    describe(objects[delete_id])
+                    for delete_id in sorted(groups[keep_id])
+                ],
+            }
+            for keep_id in sorted(groups)
+        ]
+
+    def write_report(self, report, filename):
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if filename:
+            with open(filename, 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
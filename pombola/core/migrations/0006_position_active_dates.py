@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import calendar
+import datetime
+
+from django.db import migrations, models
+
+
+def approximate_date_to_date(approx_date, assume):
+    # A copy of pombola.core.models.approximate_date_to_date as of this
+    # migration, so that later changes to it don't affect the migration.
+    earliest = (assume == 'earliest')
+    if (earliest and not approx_date) or (approx_date and approx_date.past):
+        return datetime.date.min
+    if (not earliest and not approx_date) or (approx_date and approx_date.future):
+        return datetime.date.max
+    year, month, day = approx_date.year, approx_date.month, approx_date.day
+    if month == 0 and day == 0:
+        if earliest:
+            return datetime.date(year, 1, 1)
+        else:
+            return datetime.date(year, 12, 31)
+    if day == 0:
+        if earliest:
+            return datetime.date(year, month, 1)
+        else:
+            last_day = calendar.monthrange(year, month)[1]
+            return datetime.date(year, month, last_day)
+    return datetime.date(year, month, day)
+
+
+def set_active_dates(apps, schema_editor):
+    Position = apps.get_model('core', 'Position')
+    for position in Position.objects.only('start_date', 'end_date').iterator():
+        Position.objects.filter(pk=position.pk).update(
+            active_from=approximate_date_to_date(position.start_date, 'earliest'),
+            active_until=approximate_date_to_date(position.end_date, 'latest'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_parliamentarysession_make_house_optional'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='position',
+            name='active_from',
+            field=models.DateField(default=datetime.date(1, 1, 1), editable=False, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='position',
+            name='active_until',
+            field=models.DateField(default=datetime.date(9999, 12, 31), editable=False, db_index=True),
+        ),
+        migrations.RunPython(
+            set_active_dates,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_position_active_dates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceBoundaryOverlap',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('percent', models.FloatField(help_text="The percentage of the place's area that's in other_place")),
+                ('other_place', models.ForeignKey(related_name='+', to='core.Place')),
+                ('place', models.ForeignKey(related_name='boundary_overlaps', to='core.Place')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='placeboundaryoverlap',
+            unique_together=set([('place', 'other_place')]),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+
+from django.db import migrations, models
+
+
+def set_position_counts(apps, schema_editor):
+    # This is a copy of Organisation.update_position_counts as of this
+    # migration, using the historical models:
+    Organisation = apps.get_model('core', 'Organisation')
+    Position = apps.get_model('core', 'Position')
+
+    today = datetime.date.today()
+    current = models.Q(active_from__lte=today, active_until__gte=today)
+
+    def count_when(condition):
+        return models.Sum(models.Case(
+            models.When(condition, then=1),
+            default=0,
+            output_field=models.IntegerField(),
+        ))
+
+    # Clear the default ordering so that it's not in the GROUP BY:
+    positions = Position.objects.filter(organisation__isnull=False).order_by()
+    counts = {}
+    for row in positions \
+            .values('organisation_id') \
+            .annotate(
+                num_positions=models.Count('id'),
+                num_current_positions=count_when(current),
+                num_current_politician_positions=count_when(
+                    current & models.Q(category='political')),
+            ):
+        organisation_id = row.pop('organisation_id')
+        row['num_current_member_positions'] = 0
+        counts[organisation_id] = row
+    for organisation_id, count in positions \
+            .filter(current, title__slug='member') \
+            .values_list('organisation_id') \
+            .annotate(count=models.Count('id')):
+        counts[organisation_id]['num_current_member_positions'] = count
+
+    # The new fields default to zero, so only organisations with
+    # positions need updating:
+    for organisation_id, row in counts.items():
+        Organisation.objects.filter(id=organisation_id).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_placeboundaryoverlap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organisation',
+            name='num_positions',
+            field=models.PositiveIntegerField(default=0, editable=False, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='organisation',
+            name='num_current_positions',
+            field=models.PositiveIntegerField(default=0, editable=False, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='organisation',
+            name='num_current_politician_positions',
+            field=models.PositiveIntegerField(default=0, editable=False, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='organisation',
+            name='num_current_member_positions',
+            field=models.PositiveIntegerField(default=0, editable=False, db_index=True),
+        ),
+        migrations.RunPython(
+            set_position_counts,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -11,9 +11,10 @@ from collections import defaultdict
 from django.core import exceptions
 from django.core.urlresolvers import reverse
 
-from django.db.models import Q
+from django.db.models import Case, Count, Q, Sum, When
 from django.db import transaction
-from django.db.models.signals import post_init
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
 
 from django.utils.dateformat import DateFormat
 
@@ -33,13 +34,18 @@ from slug_helpers.models import validate_slug_not_redirecting
 from images.models import HasImageMixin, Image
 
 from pombola.tasks.models import Task
+from pombola.tasks.regeneration import regenerate_tasks
 
-from pombola.scorecards.models import ScorecardMixin
+from pombola.scorecards.models import (
+    ScorecardMixin, Entry as ScorecardEntry, overall_score as scorecard_overall_score,
+    prefetch_scorecard_aggregates,
+)
 from pombola.budgets.models import BudgetsMixin
 
 from mapit import models as mapit_models
 
 from pombola.country import significant_positions_filter
+from pombola.core import fragment_cache
 
 date_help_text = "Format: '2011-12-31', '31 Jan 2011', 'Jan 2011' or '2011' or 'future'"
 
@@ -277,6 +283,18 @@ class Contact(ModelBase):
         Task.call_generate_tasks_on_if_possible(self.content_object)
         return []
 
+    @classmethod
+    def generate_tasks_in_bulk(cls, contacts):
+        """Like generate_tasks, but regenerates the foreign objects' tasks together"""
+        object_ids = defaultdict(set)
+        for contact in contacts:
+            object_ids[contact.content_type_id].add(contact.object_id)
+        for content_type_id, ids in object_ids.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            if model is not None and hasattr(model, 'generate_tasks'):
+                regenerate_tasks(model, ids)
+        return dict((contact.pk, []) for contact in contacts)
+
     class Meta:
        ordering = ["content_type", "object_id", "kind"]
 
@@ -541,11 +559,13 @@ class Person(ModelBase, HasImageMixin, ScorecardMixin, IdentifierMixin):
               | Q(title__slug='coalition-member')
             )
         )
-        return Organisation.objects.filter(position__in=party_memberships).distinct()
+        return Organisation.objects.filter(position__in=party_memberships) \
+            .select_related('kind').distinct()
 
     def constituencies(self):
         """Return list of constituencies that this person is currently an politician for"""
-        return Place.objects.filter(position__in=self.politician_positions()).distinct()
+        return Place.objects.filter(position__in=self.politician_positions()) \
+            .select_related('kind').distinct()
 
     def constituency_offices(self):
         """
@@ -567,29 +587,50 @@ class Person(ModelBase, HasImageMixin, ScorecardMixin, IdentifierMixin):
     def get_absolute_url(self):
         return ('person', [self.slug])
 
+    wanted_contact_slugs = ['phone','email','address']
+
     def generate_tasks(self):
         """Generate tasks for missing contact details etc"""
-        task_slugs = []
+        return self.generate_tasks_in_bulk([self])[self.pk]
+
+    @classmethod
+    def generate_tasks_in_bulk(cls, people):
+        """Like generate_tasks, but for many people with one query
+
+        Returns a dictionary mapping each person's pk to their task slugs."""
+        have_contact_slugs = defaultdict(set)
+        for object_id, kind_slug in Contact.objects.filter(
+                content_type=ContentType.objects.get_for_model(cls),
+                object_id__in=[p.pk for p in people],
+                ).values_list('object_id', 'kind__slug'):
+            have_contact_slugs[object_id].add(kind_slug)
+
+        return dict(
+            (person.pk, [
+                "find-missing-" + wanted
+                for wanted in cls.wanted_contact_slugs
+                if wanted not in have_contact_slugs[person.pk]
+            ])
+            for person in people
+        )
 
-        wanted_contact_slugs = ['phone','email','address']
-        have_contact_slugs = [c.kind.slug for c in self.contacts.all()]
-        for wanted in wanted_contact_slugs:
-            if wanted not in have_contact_slugs:
-                task_slugs.append("find-missing-" + wanted)
+    def constituency_scorecard_aggregates(self):
+        """Return a list of the aggregates of each of this person's constituencies
 
-        return task_slugs
+        These are all found with one query, unless they've already been
+        fetched with prefetch_scorecard_aggregates."""
+        constituencies = list(self.constituencies())
+        to_fetch = [
+            c for c in constituencies
+            if not hasattr(c, '_prefetched_scorecard_aggregates')]
+        prefetch_scorecard_aggregates(to_fetch)
+        return [c.get_scorecard_aggregates() for c in constituencies]
 
     def scorecard_overall(self):
-        total_count = super(Person, self).active_scorecards().count()
-        total_score = super(Person, self).active_scorecards().aggregate(models.Sum('score'))['score__sum']
-
-        for constituency in self.constituencies():
-            constituency_count = constituency.active_scorecards().count()
-            if constituency_count:
-                total_count += constituency_count
-                total_score += constituency.active_scorecards().aggregate(models.Sum('score'))['score__sum']
-
-        return total_score / total_count
+        aggregates = list(super(Person, self).get_scorecard_aggregates())
+        for constituency_aggregates in self.constituency_scorecard_aggregates():
+            aggregates.extend(constituency_aggregates)
+        return scorecard_overall_score(aggregates)
 
     def scorecards(self):
         """This is the list of scorecards that will actually be displayed on the site."""
@@ -606,16 +647,20 @@ class Person(ModelBase, HasImageMixin, ScorecardMixin, IdentifierMixin):
     def has_scorecards(self):
         # We're only showing scorecards for current MPs
         if self.is_politician():
-            return super(Person, self).has_scorecards() or any([x.has_scorecards() for x in self.constituencies()])
+            return super(Person, self).has_scorecards() or any(
+                a.visible_count
+                for constituency_aggregates in self.constituency_scorecard_aggregates()
+                for a in constituency_aggregates)
 
     @property
     def show_overall_score(self):
         """Should we show an overall score? Yes if applicable and there are active scorecards and we have the CDF category"""
         if super(Person, self).show_overall_score:
             # We could show the scorecard. Check that there is a CDF report in there.
-            for constituency in self.constituencies():
-                if constituency.active_scorecards().filter(category__slug='cdf-performance').exists():
-                    return True
+            for constituency_aggregates in self.constituency_scorecard_aggregates():
+                for a in constituency_aggregates:
+                    if a.category.slug == 'cdf-performance' and a.active_count:
+                        return True
 
         # fall through to here
         return False
@@ -692,18 +737,17 @@ class OrganisationQuerySet(models.query.GeoQuerySet):
         return self.filter(kind__slug='party')
 
     def active_parties(self):
-        # FIXME - What a lot of subqueries...
-        active_politician_positions = Position.objects.all().current_politician_positions()
-        active_member_positions = Position.objects.all().filter(title__slug='member').currently_active()
+        """Parties with current politicians or members
 
+        This uses the position counts kept on each organisation (see
+        Organisation.update_position_counts)."""
         return (
             self
                 .parties()
                 .filter(
-                    Q(position__in=active_politician_positions) |
-                    Q(position__in=active_member_positions)
+                    Q(num_current_politician_positions__gt=0) |
+                    Q(num_current_member_positions__gt=0)
                 )
-                .distinct()
             )
 
 
@@ -720,6 +764,21 @@ class Organisation(ModelBase, HasImageMixin, IdentifierMixin):
     started = ApproximateDateField(blank=True, help_text=date_help_text)
     ended = ApproximateDateField(blank=True, help_text=date_help_text)
 
+    # Counts of the organisation's positions, so that listings can be
+    # sorted and filtered by them without aggregating the positions.
+    # These are updated whenever a position is saved or deleted, but
+    # which positions are current changes as time passes, so the
+    # core_update_organisation_position_counts command should be run
+    # daily too.
+    num_positions = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True)
+    num_current_positions = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True)
+    num_current_politician_positions = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True)
+    num_current_member_positions = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True)
+
     fields_to_whitespace_normalize = ['name']
 
     objects = OrganisationQuerySet.as_manager()
@@ -738,6 +797,66 @@ class Organisation(ModelBase, HasImageMixin, IdentifierMixin):
     class Meta:
        ordering = ["slug"]
 
+    @classmethod
+    def update_position_counts(cls, organisation_ids=None):
+        """Recalculate the position counts of these organisations, or all of them
+
+        The counts are found with a single grouped query, and
+        organisations with the same counts are updated together."""
+        organisations = cls.objects.all()
+        positions = Position.objects.all()
+        if organisation_ids is not None:
+            organisation_ids = set(i for i in organisation_ids if i is not None)
+            if not organisation_ids:
+                return
+            organisations = organisations.filter(id__in=organisation_ids)
+            positions = positions.filter(organisation__in=organisation_ids)
+
+        today = datetime.date.today()
+        current = Q(active_from__lte=today, active_until__gte=today)
+
+        def count_when(condition):
+            return Sum(Case(
+                When(condition, then=1),
+                default=0,
+                output_field=models.IntegerField(),
+            ))
+
+        # Clear the default ordering so that it's not in the GROUP BY:
+        positions = positions.filter(organisation__isnull=False).order_by()
+        counts = {}
+        for row in positions \
+                .values('organisation_id') \
+                .annotate(
+                    num_positions=Count('id'),
+                    num_current_positions=count_when(current),
+                    num_current_politician_positions=count_when(
+                        current & Q(category='political')),
+                ):
+            organisation_id = row.pop('organisation_id')
+            row['num_current_member_positions'] = 0
+            counts[organisation_id] = row
+        for organisation_id, count in positions \
+                .filter(current, title__slug='member') \
+                .values_list('organisation_id') \
+                .annotate(count=Count('id')):
+            counts[organisation_id]['num_current_member_positions'] = count
+
+        zero = dict(
+            num_positions=0,
+            num_current_positions=0,
+            num_current_politician_positions=0,
+            num_current_member_positions=0,
+        )
+        ids_by_counts = defaultdict(list)
+        for organisation_id in organisations.values_list('id', flat=True):
+            row = counts.get(organisation_id, zero)
+            ids_by_counts[tuple(sorted(row.items()))].append(organisation_id)
+
+        with transaction.atomic():
+            for count_items, ids in ids_by_counts.items():
+                cls.objects.filter(id__in=ids).update(**dict(count_items))
+
     def is_ongoing(self):
         """Return True or False for whether the organisation is currently ongoing"""
         if not self.ended:
@@ -990,30 +1109,22 @@ class Place(ModelBase, ScorecardMixin, BudgetsMixin):
         # Occasionally a place will not have a MapIt area associated
         # with it; in these cases we can't find which boundaries it
         # overlaps with, so just return an empty dictionary.
-        if self.mapit_area is None:
+        if self.mapit_area_id is None:
             return result
 
+        # The overlaps are precomputed by the
+        # core_update_boundary_overlaps management command:
+        overlaps_by_session = defaultdict(list)
+        for overlap in self.boundary_overlaps.select_related('other_place'):
+            overlaps_by_session[overlap.other_place.parliamentary_session_id].append(
+                (overlap.percent, overlap.other_place))
+
         for key, session in (('previous', previous_session),
                              ('next', next_session)):
             if not session:
                 result[key] = None
                 continue
-            intersections = []
-            for area in mapit_models.Area.objects.intersect('intersects',
-                                               self.mapit_area,
-                                               [self.mapit_area.type.code],
-                                               mapit_models.Generation.objects.get(pk=session.mapit_generation)):
-                # Now work out the % intersection between the two:
-                self_geos_geometry = self.mapit_area.polygons.collect()
-                if self_geos_geometry.area == 0:
-                    continue
-                other_geos_geometry = area.polygons.collect()
-                intersection = self_geos_geometry.intersection(other_geos_geometry)
-                proportion_shared = intersection.area / self_geos_geometry.area
-                intersections.append((100 * proportion_shared,
-                                      Place.objects.get(kind=self.kind,
-                                                        parliamentary_session=session,
-                                                        mapit_area=area)))
+            intersections = overlaps_by_session[session.id]
             intersections.sort(key=lambda x: -x[0])
             result[key] = {'session': session,
                            'connector': connectors[key][session.relative_time()],
@@ -1025,6 +1136,46 @@ class Place(ModelBase, ScorecardMixin, BudgetsMixin):
 
         return result
 
+    def compute_boundary_overlaps(self, session):
+        """Return the places in session that this place's boundary overlaps
+
+        This returns a list of (percent, place) tuples, where percent is
+        the percentage of this place's area that is shared with place,
+        for each place of the same kind in session whose MapIt area
+        intersects this place's MapIt area.  It's expensive, so
+        get_boundary_changes uses the results of this that are stored
+        as PlaceBoundaryOverlap objects instead."""
+
+        if self.mapit_area is None or session.mapit_generation is None:
+            return []
+
+        self_geos_geometry = self.mapit_area.polygons.collect()
+        if self_geos_geometry is None or self_geos_geometry.area == 0:
+            return []
+
+        areas = mapit_models.Area.objects.intersect(
+            'intersects',
+            self.mapit_area,
+            [self.mapit_area.type.code],
+            mapit_models.Generation.objects.get(pk=session.mapit_generation))
+        places_by_area_id = dict(
+            (place.mapit_area_id, place)
+            for place in Place.objects.filter(
+                kind=self.kind,
+                parliamentary_session=session,
+                mapit_area__in=areas))
+
+        intersections = []
+        for area in areas:
+            place = places_by_area_id.get(area.id)
+            if place is None:
+                continue
+            other_geos_geometry = area.polygons.collect()
+            intersection = self_geos_geometry.intersection(other_geos_geometry)
+            proportion_shared = intersection.area / self_geos_geometry.area
+            intersections.append((100 * proportion_shared, place))
+        return intersections
+
     def get_aspirants(self):
         """Return aspirants for this place and each parent place
 
@@ -1103,6 +1254,26 @@ class Place(ModelBase, ScorecardMixin, BudgetsMixin):
         else:
             True
 
+
+class PlaceBoundaryOverlap(ModelBase):
+    """How much of a place's boundary overlaps with a place in another session
+
+    These are generated by the core_update_boundary_overlaps
+    management command from Place.compute_boundary_overlaps, for
+    places of the same kind in adjacent parliamentary sessions."""
+
+    place = models.ForeignKey(Place, related_name='boundary_overlaps')
+    other_place = models.ForeignKey(Place, related_name='+')
+    percent = models.FloatField(help_text="The percentage of the place's area that's in other_place")
+
+    objects = ManagerBase()
+
+    def __unicode__(self):
+        return u"%s overlaps %s by %.1f%%" % (self.place, self.other_place, self.percent)
+
+    class Meta:
+        unique_together = ('place', 'other_place')
+
 class PositionTitle(ModelBase):
     name = models.CharField(max_length=200, unique=True)
     slug = models.SlugField(max_length=200, unique=True, help_text="created from name")
@@ -1146,70 +1317,48 @@ class PositionTitle(ModelBase):
        ordering = ["slug"]
 
 
-class PositionQuerySet(models.query.GeoQuerySet):
-    def currently_active(self, when=None):
-        """Filter on start and end dates to limit to currently active positions"""
-
-        if when == None:
-            when = datetime.date.today()
+def as_date(when):
+    """Return when as a date, defaulting to today"""
+    if when is None:
+        return datetime.date.today()
+    if isinstance(when, datetime.datetime):
+        return when.date()
+    return when
 
-        now_approx = repr(ApproximateDate(year=when.year, month=when.month, day=when.day))
 
-        qs = (
-            self
-                .filter(sorting_start_date__lte=now_approx)
-                .filter(Q(sorting_end_date_high__gte=now_approx) | Q(end_date=''))
-        )
+class PositionQuerySet(models.query.GeoQuerySet):
+    # These filters use the indexed active_from and active_until dates
+    # rather than comparing the string representations of the
+    # approximate start and end dates.
 
-        return qs
+    def currently_active(self, when=None):
+        """Filter on start and end dates to limit to currently active positions"""
+        when = as_date(when)
+        return self.filter(active_from__lte=when, active_until__gte=when)
 
     def currently_inactive(self, when=None):
         """Filter on start and end dates to limit to currently inactive positions"""
-
-        if when == None:
-            when = datetime.date.today()
-
-        now_approx = repr(ApproximateDate(year=when.year, month=when.month, day=when.day))
-
-        start_criteria = Q(start_date__gt=now_approx)
-        end_criteria = Q(sorting_end_date_high__lt=now_approx) & ~Q(end_date='')
-
-        qs = self.filter(start_criteria | end_criteria)
-
-        return qs
+        when = as_date(when)
+        return self.filter(Q(active_from__gt=when) | Q(active_until__lt=when))
 
     def previous(self, when=None):
         """Filter end dates to limit to positions which are already over."""
-
-        when = when or datetime.date.today()
-
-        when_approx = repr(ApproximateDate(year=when.year, month=when.month, day=when.day))
-
-        end_criteria = Q(sorting_end_date_high__lt=when_approx) & ~Q(end_date='')
-
-        return self.filter(end_criteria)
+        return self.filter(active_until__lt=as_date(when))
 
     def future(self, when=None):
         """Positions which have not yet started."""
-
-        when = when or datetime.date.today()
-
-        when_approx = repr(ApproximateDate(year=when.year, month=when.month, day=when.day))
-
-        start_criteria = Q(sorting_start_date__gt=when_approx)
-
-        return self.filter(start_criteria)
+        return self.filter(active_from__gt=as_date(when))
 
     def overlapping_dates(self, start_date, end_date):
-        start_criteria = \
-            Q(start_date='') | \
-            Q(start_date='past') | \
-            Q(sorting_start_date__lte=end_date)
-        end_criteria = \
-            Q(end_date='') | \
-            Q(end_date='future') | \
-            Q(sorting_end_date_high__gte=start_date)
-        return self.filter(start_criteria & end_criteria)
+        """Filter to positions that were active at any time between the dates
+
+        A start or end date of None is treated as unbounded."""
+        qs = self
+        if end_date is not None:
+            qs = qs.filter(active_from__lte=as_date(end_date))
+        if start_date is not None:
+            qs = qs.filter(active_until__gte=as_date(start_date))
+        return qs
 
     def aspirant_positions(self):
         """
@@ -1296,6 +1445,16 @@ class Position(ModelBase, IdentifierMixin):
     sorting_start_date_high = models.CharField(editable=True, default='', max_length=10)
     sorting_end_date_high = models.CharField(editable=True, default='', max_length=10)
 
+    # More hidden fields, filled in by code, with the earliest date the
+    # position might have started and the latest date it might have
+    # ended.  These are indexed so that currently_active can be a
+    # simple date range comparison.  They're set in save(), and can be
+    # recalculated for every position (e.g. after bulk updates that
+    # bypass save()) with the core_refresh_position_active_dates
+    # management command.
+    active_from = models.DateField(editable=False, default=datetime.date.min, db_index=True)
+    active_until = models.DateField(editable=False, default=datetime.date.max, db_index=True)
+
     identifiers = GenericRelation(Identifier)
 
     objects = PositionQuerySet.as_manager()
@@ -1453,11 +1612,23 @@ class Position(ModelBase, IdentifierMixin):
         self.sorting_start_date_high = re.sub('-00', '-99', sorting_start_date)
         self.sorting_end_date_high   = re.sub('-00', '-99', sorting_end_date)
 
+    def _set_active_dates(self):
+        """Set active_from and active_until from the actual dates (does not call save())
+
+        Returns True if either of them changed, and False otherwise."""
+        active_from = approximate_date_to_date(self.start_date, 'earliest')
+        active_until = approximate_date_to_date(self.end_date, 'latest')
+        changed = (active_from, active_until) != (self.active_from, self.active_until)
+        self.active_from = active_from
+        self.active_until = active_until
+        return changed
+
     def is_nominated_politician(self):
         return self.title.slug == 'nominated-member-parliament'
 
     def save(self, *args, **kwargs):
         self._set_sorting_dates()
+        self._set_active_dates()
         super(Position, self).save(*args, **kwargs)
 
     def __unicode__(self):
@@ -1638,3 +1809,92 @@ def raw_query_with_prefetch(query_model, query, params, fields_prefetches):
             if related_object:
                 setattr(o, field, related_object)
     return objects
+
+
+# Invalidate the cached fragments of the person, place and organisation
+# pages that depend on an object that's changed.  (These check the
+# instance's class rather than using sender so that proxy models, like
+# ZAPlace, are handled too.)
+
+@receiver(pre_save)
+def invalidate_fragments_for_previous_position(sender, instance, **kwargs):
+    """Invalidate the objects a position was associated with before it changed"""
+    if not isinstance(instance, Position) or not instance.pk:
+        return
+    previous = Position.objects.filter(pk=instance.pk) \
+        .values('person_id', 'organisation_id', 'place_id').first()
+    # This is also used to update the position counts of the
+    # organisation the position was moved from:
+    instance._previous_ids = previous
+    if previous:
+        fragment_cache.invalidate_ids(Person, [previous['person_id']])
+        fragment_cache.invalidate_ids(Organisation, [previous['organisation_id']])
+        fragment_cache.invalidate_ids(Place, [previous['place_id']])
+
+
+@receiver([post_save, post_delete])
+def invalidate_fragments(sender, instance, **kwargs):
+    if isinstance(instance, Position):
+        fragment_cache.invalidate_ids(Person, [instance.person_id])
+        fragment_cache.invalidate_ids(Organisation, [instance.organisation_id])
+        fragment_cache.invalidate_ids(Place, [instance.place_id])
+    elif isinstance(instance, Person):
+        # Their name appears on the pages of their places and organisations:
+        fragment_cache.invalidate(instance)
+        place_ids, organisation_ids = set(), set()
+        for place_id, organisation_id in instance.position_set \
+                .values_list('place_id', 'organisation_id'):
+            place_ids.add(place_id)
+            organisation_ids.add(organisation_id)
+        fragment_cache.invalidate_ids(Place, place_ids)
+        fragment_cache.invalidate_ids(Organisation, organisation_ids)
+    elif isinstance(instance, (Place, Organisation)):
+        # The people with positions there, and for places the parent
+        # place whose page lists its children:
+        fragment_cache.invalidate(instance)
+        fragment_cache.invalidate_ids(
+            Person, instance.position_set.values_list('person_id', flat=True))
+        if isinstance(instance, Place):
+            fragment_cache.invalidate_ids(Place, [instance.parent_place_id])
+    elif isinstance(instance, Contact):
+        fragment_cache.invalidate_ids(
+            instance.content_type.model_class(), [instance.object_id])
+    elif isinstance(instance, ScorecardEntry):
+        # A person's overall score includes their constituencies' scorecards:
+        model = instance.content_type.model_class()
+        fragment_cache.invalidate_ids(model, [instance.object_id])
+        if issubclass(model, Place):
+            fragment_cache.invalidate_ids(
+                Person,
+                Position.objects.filter(place_id=instance.object_id)
+                    .values_list('person_id', flat=True))
+
+
+@receiver([post_save, post_delete])
+def invalidate_position_listings(sender, instance, **kwargs):
+    """Invalidate the cached position listings if anything in them changes"""
+    if isinstance(instance, (
+            Position, Person, AlternativePersonName, Place, PlaceKind,
+            Organisation, OrganisationKind, PositionTitle,
+            ParliamentarySession)):
+        # Imported here to avoid a circular import:
+        from pombola.core import position_listing
+        position_listing.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Position)
+def update_organisation_position_counts(sender, instance, **kwargs):
+    organisation_ids = [instance.organisation_id]
+    previous = getattr(instance, '_previous_ids', None)
+    if previous:
+        organisation_ids.append(previous['organisation_id'])
+    Organisation.update_position_counts(organisation_ids)
+
+
+@receiver(post_save, sender=Organisation)
+def refresh_saved_organisation_position_counts(sender, instance, created, raw, **kwargs):
+    # Saving an organisation writes back whatever counts it was loaded
+    # with, which may be out of date by now:
+    if not (created or raw):
+        Organisation.update_position_counts([instance.id])
+
@@ -149,17 +149,18 @@ def get_events(primary_id_scheme, base_url):
         result.append(event)
     return result
 
-def get_organizations(primary_id_scheme, base_url):
-    """Return a list of Popolo organization objects"""
+def get_organization_categories():
+    """Return a dictionary mapping organisation slugs to their category
 
-    result = []
+    The category of an organisation is inferred from the categories of
+    the positions associated with it."""
 
     oslug_to_categories = defaultdict(set)
 
-    for pos in Position.objects.order_by().select_related('organisation'):
-        if pos.organisation:
-            slug = pos.organisation.slug
-            oslug_to_categories[slug].add(pos.category)
+    for slug, category in Position.objects.order_by() \
+            .filter(organisation__isnull=False) \
+            .values_list('organisation__slug', 'category').distinct():
+        oslug_to_categories[slug].add(category)
 
     all_categories = set()
     oslug_to_category = {}
@@ -191,34 +192,50 @@ def get_organizations(primary_id_scheme, base_url):
             print >> sys.stderr, error
         raise Exception, "Found organisations with multiple categories other than 'other'"
 
-    for o in Organisation.objects.order_by().select_related('kind').prefetch_related(
-            Prefetch(
-                'contacts',
-                queryset=Contact.objects.select_related('kind')
-            ),
-            'identifiers',
-    ):
-        properties = {'slug': o.slug,
-                      'name': o.name.strip(),
-                      'classification': o.kind.name}
-        if o.slug in oslug_to_category:
-            properties['category'] = oslug_to_category[o.slug]
-        add_start_and_end_date(
-            o,
-            properties,
-            start_key_map=('started', 'founding_date'),
-            end_key_map=('ended', 'dissolution_date'))
-        add_identifiers_to_properties(o, properties, primary_id_scheme)
-        add_contact_details_to_properties(o, properties)
-        result.append(properties)
-        country.add_extra_popolo_data_for_organization(o, properties, base_url)
-    return result
+    return oslug_to_category
+
+def organisations_queryset():
+    return Organisation.objects.order_by().select_related('kind').prefetch_related(
+        Prefetch(
+            'contacts',
+            queryset=Contact.objects.select_related('kind')
+        ),
+        'identifiers',
+    )
+
+def get_organization_properties(o, primary_id_scheme, base_url, oslug_to_category):
+    properties = {'slug': o.slug,
+                  'name': o.name.strip(),
+                  'classification': o.kind.name}
+    if o.slug in oslug_to_category:
+        properties['category'] = oslug_to_category[o.slug]
+    add_start_and_end_date(
+        o,
+        properties,
+        start_key_map=('started', 'founding_date'),
+        end_key_map=('ended', 'dissolution_date'))
+    add_identifiers_to_properties(o, properties, primary_id_scheme)
+    add_contact_details_to_properties(o, properties)
+    country.add_extra_popolo_data_for_organization(o, properties, base_url)
+    return properties
+
+def get_organizations(primary_id_scheme, base_url):
+    """Return a list of Popolo organization objects"""
+
+    oslug_to_category = get_organization_categories()
+    return [
+        get_organization_properties(
+            o, primary_id_scheme, base_url, oslug_to_category)
+        for o in organisations_queryset()
+    ]
+
+def places_queryset():
+    return Place.objects.order_by().select_related(
+        'mapit_area__type', 'parliamentary_session__house')
 
 def get_areas(primary_id_scheme, base_url):
     all_areas = [
-        get_area_information(pl, base_url) for pl in
-        Place.objects.order_by().select_related(
-            'mapit_area__type', 'parliamentary_session__house')
+        get_area_information(pl, base_url) for pl in places_queryset()
     ]
     return [a for a in all_areas if a is not None]
 
@@ -240,6 +257,103 @@ def create_organisations(popit, primary_id_scheme, base_url):
             print >> sys.stderr, json.dumps(organization, indent=4)
             raise
 
+def people_queryset():
+    # TODO: if interests_register is being used, we should prefetch
+    # that as well (with the Prefetch doing a select_related on
+    # category and a prefetch_related on line_items.
+    return Person.objects.order_by().prefetch_related(
+        'alternative_names',
+        Prefetch(
+            'contacts',
+            queryset=Contact.objects.select_related('kind')
+        ),
+        'identifiers',
+        'images',
+        Prefetch(
+            'position_set',
+            queryset=Position.objects.order_by().select_related(
+                'organisation',
+                'place__mapit_area__type',
+                'place__parliamentary_session__house',
+                'title',
+            ).prefetch_related('identifiers')
+        )
+    )
+
+def get_person_properties(person, primary_id_scheme, base_url):
+    """Return the Popolo person object for person, without memberships"""
+    name = person.legal_name
+    person_properties = {'name': name}
+    for date, key in ((person.date_of_birth, 'birth_date'),
+                      (person.date_of_death, 'death_date')):
+        if date:
+            person_properties[key] = date_to_partial_iso8601(date)
+    primary_image = person.primary_image()
+    if primary_image:
+        person_properties['images' ] = [
+            {
+                'url': urljoin(base_url, primary_image.url)
+            }
+        ]
+    add_identifiers_to_properties(person, person_properties, primary_id_scheme)
+    add_contact_details_to_properties(person, person_properties)
+    add_other_names(person, person_properties)
+    for key in extra_popolo_person_fields:
+        value = getattr(person, key)
+        # This might be a markitup.fields.Markup field, in
+        # which case we need to call raw on it:
+        try:
+            value = value.raw
+        except AttributeError:
+            pass
+        if value:
+            person_properties[key] = value
+    country.add_extra_popolo_data_for_person(person, person_properties, base_url)
+    return person_properties
+
+def get_membership_properties(position, primary_id_scheme, base_url, title_to_sessions):
+    """Return the Popolo membership object for a position"""
+    properties = {'person_id': position.person.get_popolo_id(primary_id_scheme)}
+    if position.title and position.title.name:
+        properties['role'] = position.title.name
+    add_start_and_end_date(position, properties)
+    add_identifiers_to_properties(position, properties, primary_id_scheme)
+    if position.organisation:
+        organization_id = position.organisation.get_popolo_id(primary_id_scheme)
+        properties['organization_id'] = organization_id
+    if position.place:
+        # If there's a place associated with the position, set that on
+        # the position as an area:
+        properties['area'] = get_area_information(position.place, base_url)
+    possible_events = []
+    if position.title:
+        possible_events = title_to_sessions.get(position.title.slug, [])
+    if possible_events:
+        # Order them by overlap:
+        events_with_overlap = [
+            (position.approximate_date_overlap(e.start_date, e.end_date), e)
+            for e in possible_events
+        ]
+        events_with_overlap.sort(reverse=True, key=lambda t: t[0])
+        # n.b. There's an assumption here that if someone's an
+        # MP in consecutive terms, that's represented by two
+        # positions rather than one. (In most cases that
+        # better models reality anyway.0
+        most_likely_event = events_with_overlap[0]
+        properties['legislative_period_id'] = most_likely_event[1].slug
+    return properties
+
+def get_person_memberships(person, primary_id_scheme, base_url, title_to_sessions):
+    """Return a list of Popolo memberships for each of person's positions"""
+    memberships = []
+    for position in person.position_set.all():
+        # Avoid a query to fetch the person again for each position:
+        position.person = person
+        memberships.append(
+            get_membership_properties(
+                position, primary_id_scheme, base_url, title_to_sessions))
+    return memberships
+
 def get_people(primary_id_scheme, base_url, title_to_sessions, inline_memberships=True):
 
     result = {
@@ -248,97 +362,23 @@ def get_people(primary_id_scheme, base_url, title_to_sessions, inline_membership
     if not inline_memberships:
         result['memberships'] = []
 
-    # TODO: if interests_register is being used, we should prefetch
-    # that as well (with the Prefetch doing a select_related on
-    # category and a prefetch_related on line_items.
-    for person in Person.objects.order_by().prefetch_related(
-            'alternative_names',
-            Prefetch(
-                'contacts',
-                queryset=Contact.objects.select_related('kind')
-            ),
-            'identifiers',
-            'images',
-            Prefetch(
-                'position_set',
-                queryset=Position.objects.order_by().select_related(
-                    'organisation',
-                    'place__mapit_area__type',
-                    'place__parliamentary_session__house',
-                    'title',
-                ).prefetch_related('identifiers')
-            )
-    ):
-        name = person.legal_name
-        person_properties = {'name': name}
-        for date, key in ((person.date_of_birth, 'birth_date'),
-                          (person.date_of_death, 'death_date')):
-            if date:
-                person_properties[key] = date_to_partial_iso8601(date)
-        primary_image = person.primary_image()
-        if primary_image:
-            person_properties['images' ] = [
-                {
-                    'url': urljoin(base_url, primary_image.url)
-                }
-            ]
-        add_identifiers_to_properties(person, person_properties, primary_id_scheme)
-        add_contact_details_to_properties(person, person_properties)
-        add_other_names(person, person_properties)
-        for key in extra_popolo_person_fields:
-            value = getattr(person, key)
-            # This might be a markitup.fields.Markup field, in
-            # which case we need to call raw on it:
-            try:
-                value = value.raw
-            except AttributeError:
-                pass
-            if value:
-                person_properties[key] = value
-        country.add_extra_popolo_data_for_person(person, person_properties, base_url)
-
+    for person in people_queryset():
+        person_properties = get_person_properties(
+            person, primary_id_scheme, base_url)
+        memberships = get_person_memberships(
+            person, primary_id_scheme, base_url, title_to_sessions)
         if inline_memberships:
-            person_properties['memberships'] = []
-
-        for position in person.position_set.all():
-            properties = {'person_id': person.get_popolo_id(primary_id_scheme)}
-            if position.title and position.title.name:
-                properties['role'] = position.title.name
-            add_start_and_end_date(position, properties)
-            add_identifiers_to_properties(position, properties, primary_id_scheme)
-            if position.organisation:
-                position.organisation.slug
-                organization_id = position.organisation.get_popolo_id(primary_id_scheme)
-                properties['organization_id'] = organization_id
-            if position.place:
-                # If there's a place associated with the position, set that on
-                # the position as an area:
-                properties['area'] = get_area_information(position.place, base_url)
-            possible_events = []
-            if position.title:
-                possible_events = title_to_sessions.get(position.title.slug, [])
-            if possible_events:
-                # Order them by overlap:
-                events_with_overlap = [
-                    (position.approximate_date_overlap(e.start_date, e.end_date), e)
-                    for e in possible_events
-                ]
-                events_with_overlap.sort(reverse=True, key=lambda t: t[0])
-                # n.b. There's an assumption here that if someone's an
-                # MP in consecutive terms, that's represented by two
-                # positions rather than one. (In most cases that
-                # better models reality anyway.0
-                most_likely_event = events_with_overlap[0]
-                properties['legislative_period_id'] = most_likely_event[1].slug
-            if inline_memberships:
-                person_properties['memberships'].append(properties)
-            else:
-                result['memberships'].append(properties)
+            person_properties['memberships'] = memberships
+        else:
+            result['memberships'].extend(memberships)
 
         result['persons'].append(person_properties)
     return result
 
-def get_popolo_data(primary_id_scheme, base_url, inline_memberships=True):
+def get_title_to_sessions():
+    """Map position title slugs to the sessions they're associated with
+
+    The sessions for each title slug are sorted by start date."""
     title_to_sessions = {}
     for ps in ParliamentarySession.objects.select_related(
             'house', 'position_title'):
@@ -350,10 +390,13 @@ def get_popolo_data(primary_id_scheme, base_url, inline_memberships=True):
         title_to_sessions[title_slug].append(ps)
     for sessions in title_to_sessions.values():
         sessions.sort(key=lambda s: s.start_date)
+    return title_to_sessions
+
+def get_popolo_data(primary_id_scheme, base_url, inline_memberships=True):
     result = get_people(
         primary_id_scheme,
         base_url,
-        title_to_sessions,
+        get_title_to_sessions(),
         inline_memberships,
     )
     result['organizations'] = get_organizations(primary_id_scheme, base_url)
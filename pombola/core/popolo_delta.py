@@ -0,0 +1,285 @@
+"""Incremental Popolo exports, based on the 'updated' timestamps of rows
+
+Rather than exporting every person, organisation and membership each
+time, write_popolo_delta only exports those that have changed since
+the previous run, along with the Popolo IDs of any objects that have
+been deleted since then.  The high-water mark and the IDs that have
+been exported so far for each collection are kept in a state file in
+the output directory, and the delta files it writes can be applied to
+the previous full export with merge_popolo_delta.
+
+An object is treated as changed if it, or any of the related objects
+its Popolo representation is built from (see collection_models), has
+been updated since the previous run.  A person's primary image and an
+organisation's category (which is inferred from the categories of its
+positions) have no timestamps, so they're saved in the state file and
+compared with the previous run's instead.
+
+Some changes can't be detected this way: deleting a related object
+(e.g. one of a person's contacts), changing which position title a
+parliamentary session is for, and any country-specific extra data.
+The nightly full export should be kept as the authoritative copy,
+with the deltas used for keeping up to date in between."""
+
+import json
+from os.path import exists, join
+
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from images.models import Image
+
+from pombola.core.models import Organisation, Person, Position
+from pombola.core.popolo import (
+    get_membership_properties, get_organization_categories,
+    get_organization_properties, get_person_properties,
+    get_title_to_sessions, organisations_queryset, people_queryset
+)
+from pombola.core.popolo_stream import (
+    DEFAULT_CHUNK_SIZE, JSONArrayWriter, queryset_in_chunks
+)
+
+
+STATE_FILENAME = 'popolo-export-state.json'
+
+DELTA_COLLECTIONS = ('memberships', 'organizations', 'persons')
+
+# For each collection, the model it's generated from, and the related
+# objects whose 'updated' timestamps also affect its Popolo
+# representation.  (Memberships refer to people and organisations
+# only by ID, so changes to them don't affect memberships.)
+collection_models = {
+    'memberships': (Position, (
+        'identifiers',
+        'title',
+        # The sessions used to find the legislative period:
+        'title__parliamentarysession',
+        # The place, and its session, used for the area:
+        'place',
+        'place__parliamentary_session',
+        'place__parliamentary_session__house',
+    )),
+    'organizations': (Organisation, ('contacts', 'identifiers', 'kind')),
+    'persons': (Person, ('alternative_names', 'contacts', 'identifiers')),
+}
+
+
+def memberships_queryset():
+    return Position.objects.order_by().select_related(
+        'person',
+        'organisation',
+        'place__mapit_area__type',
+        'place__parliamentary_session__house',
+        'title',
+    ).prefetch_related('identifiers')
+
+
+def load_state(output_directory):
+    """Return the state saved by the previous incremental export
+
+    If there has been no previous incremental export, this returns an
+    empty dictionary."""
+    filename = join(output_directory, STATE_FILENAME)
+    if not exists(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+
+def save_state(output_directory, state):
+    with open(join(output_directory, STATE_FILENAME), 'w') as f:
+        json.dump(state, f, indent=4, sort_keys=True)
+
+
+def changed_ids(collection, since):
+    """Return the set of IDs in collection that have changed since 'since'
+
+    The related objects are checked with a query each, rather than
+    joining them all at once, which could multiply the rows."""
+    model, related_names = collection_models[collection]
+    result = set(
+        model.objects.filter(updated__gt=since).values_list('id', flat=True))
+    for related_name in related_names:
+        result.update(
+            model.objects
+            .filter(**{related_name + '__updated__gt': since})
+            .values_list('id', flat=True)
+            .distinct()
+        )
+    return result
+
+
+def get_primary_images():
+    """Return a dictionary mapping person IDs to their primary images' names"""
+    return dict(
+        (unicode(person_id), image)
+        for person_id, image in Image.objects
+        .filter(
+            content_type=ContentType.objects.get_for_model(Person),
+            is_primary=True)
+        .order_by('id')
+        .values_list('object_id', 'image')
+    )
+
+
+def get_categories_by_id(oslug_to_category):
+    """Return a dictionary mapping organisation IDs to their categories"""
+    return dict(
+        (unicode(organisation_id), oslug_to_category[slug])
+        for organisation_id, slug in Organisation.objects.values_list('id', 'slug')
+        if slug in oslug_to_category
+    )
+
+
+def changed_keys(previous, current):
+    """Return the IDs whose values differ between two dictionaries"""
+    return set(
+        int(key) for key in set(previous) | set(current)
+        if previous.get(key) != current.get(key)
+    )
+
+
+def write_popolo_delta(output_filename, output_directory, primary_id_scheme,
+                       base_url, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write a delta of Popolo data changed since the last incremental export
+
+    Returns a dictionary with the number of objects that were
+    changed and deleted in each collection."""
+
+    state = load_state(output_directory)
+    # Take the new high-water mark before reading anything, so that
+    # objects updated while the export is running will be included in
+    # the next delta as well:
+    until = timezone.now()
+
+    previous_since = None
+    new_state = {}
+    changed = {}
+    deleted = {}
+    # The collections that have never been exported before:
+    unfiltered = set()
+    for collection in DELTA_COLLECTIONS:
+        collection_state = state.get(collection, {})
+        since = collection_state.get('high_water_mark')
+        if since is not None:
+            since = parse_datetime(since)
+            if previous_since is None or since < previous_since:
+                previous_since = since
+        model = collection_models[collection][0]
+        current_ids = set(model.objects.values_list('id', flat=True))
+        previous_ids = set(collection_state.get('ids', []))
+        if since is None:
+            # There's no previous export, so everything has changed:
+            changed[collection] = current_ids
+            unfiltered.add(collection)
+        else:
+            changed[collection] = changed_ids(collection, since) & current_ids
+        deleted[collection] = sorted(previous_ids - current_ids)
+        new_state[collection] = {
+            'high_water_mark': until.isoformat(),
+            'ids': sorted(current_ids),
+        }
+
+    title_to_sessions = get_title_to_sessions()
+    oslug_to_category = get_organization_categories()
+
+    # The values without timestamps that are compared with the
+    # previous run's instead:
+    fingerprints = {
+        'organizations': ('categories', get_categories_by_id(oslug_to_category)),
+        'persons': ('primary_images', get_primary_images()),
+    }
+    for collection, (key, current) in fingerprints.items():
+        new_state[collection][key] = current
+        if collection not in unfiltered:
+            previous = state[collection].get(key, {})
+            changed[collection] |= \
+                changed_keys(previous, current) & set(new_state[collection]['ids'])
+
+    table_names = {
+        collection: collection_models[collection][0]._meta.db_table
+        for collection in DELTA_COLLECTIONS
+    }
+
+    def changed_objects(collection, queryset):
+        if collection not in unfiltered:
+            queryset = queryset.filter(id__in=changed[collection])
+        return queryset_in_chunks(queryset, chunk_size)
+
+    def generate_memberships():
+        for position in changed_objects('memberships', memberships_queryset()):
+            yield get_membership_properties(
+                position, primary_id_scheme, base_url, title_to_sessions)
+
+    def generate_organizations():
+        for o in changed_objects('organizations', organisations_queryset()):
+            yield get_organization_properties(
+                o, primary_id_scheme, base_url, oslug_to_category)
+
+    def generate_persons():
+        for person in changed_objects('persons', people_queryset()):
+            yield get_person_properties(person, primary_id_scheme, base_url)
+
+    generators = {
+        'memberships': generate_memberships,
+        'organizations': generate_organizations,
+        'persons': generate_persons,
+    }
+
+    # The keys are written in sorted order, as json.dump(...,
+    # sort_keys=True) would do:
+    with open(output_filename, 'w') as f:
+        f.write('{\n')
+        f.write('    "deleted": ')
+        json.dump(
+            {
+                collection: [
+                    '{0}:{1}'.format(table_names[collection], object_id)
+                    for object_id in deleted[collection]
+                ]
+                for collection in DELTA_COLLECTIONS
+            },
+            f, sort_keys=True)
+        for collection in DELTA_COLLECTIONS:
+            f.write(',\n    {0}: '.format(json.dumps(collection)))
+            writer = JSONArrayWriter(f, level=1)
+            for item in generators[collection]():
+                writer.write(item)
+            writer.close()
+        f.write(',\n    "since": {0}'.format(json.dumps(
+            previous_since and previous_since.isoformat())))
+        f.write(',\n    "until": {0}'.format(json.dumps(until.isoformat())))
+        f.write('\n}')
+
+    save_state(output_directory, new_state)
+
+    return {
+        collection: {
+            'changed': len(changed[collection]),
+            'deleted': len(deleted[collection]),
+        }
+        for collection in DELTA_COLLECTIONS
+    }
+
+
+def merge_popolo_delta(popolo_data, delta):
+    """Apply a delta from write_popolo_delta to Popolo data in place
+
+    popolo_data should be in the format returned by get_popolo_data
+    with inline_memberships=False.  Objects in the delta replace
+    those with the same ID, new objects are appended and objects
+    listed as deleted are removed."""
+    for collection in DELTA_COLLECTIONS:
+        to_remove = set(delta['deleted'][collection])
+        replacements = {o['id']: o for o in delta[collection]}
+        merged = []
+        for o in popolo_data.get(collection, []):
+            if o['id'] in to_remove:
+                continue
+            merged.append(replacements.pop(o['id'], o))
+        merged.extend(
+            o for o in delta[collection] if o['id'] in replacements
+        )
+        popolo_data[collection] = merged
+    return popolo_data
@@ -0,0 +1,207 @@
+"""Write Popolo JSON exports incrementally, in constant memory
+
+get_popolo_data in pombola.core.popolo builds the whole export as one
+dictionary, which is fine for small instances but very expensive for
+large ones.  The functions here instead walk the database in chunks
+and write each Popolo object to the output files as soon as it has
+been generated, so every output variant can be produced from a
+single pass over the data."""
+
+import json
+from os.path import join
+import shutil
+import tempfile
+
+from pombola.core.popolo import (
+    get_area_information, get_events, get_organization_categories,
+    get_organization_properties, get_person_memberships,
+    get_person_properties, get_title_to_sessions, organisations_queryset,
+    people_queryset, places_queryset
+)
+
+
+COLLECTIONS = (
+    'areas',
+    'events',
+    'memberships',
+    'organizations',
+    'persons',
+    'posts',
+)
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def queryset_in_chunks(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield each object in queryset, fetching chunk_size rows at a time
+
+    This pages through the queryset by primary key rather than with
+    OFFSET, so each chunk is an indexed range scan, and any
+    prefetch_related lookups on the queryset are only done for the
+    objects in the current chunk."""
+    last_pk = None
+    while True:
+        chunk_queryset = queryset.order_by('pk')
+        if last_pk is not None:
+            chunk_queryset = chunk_queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk_queryset[:chunk_size])
+        if not chunk:
+            return
+        for o in chunk:
+            yield o
+        last_pk = chunk[-1].pk
+
+
+def indented_json(o, level):
+    """Return o as JSON, as if it were nested level deep in a document"""
+    prefix = ' ' * (4 * level)
+    return '\n'.join(
+        prefix + line
+        for line in json.dumps(o, indent=4, sort_keys=True).splitlines()
+    )
+
+
+class JSONArrayWriter(object):
+    """Write a JSON array to a file one item at a time
+
+    The output is formatted as json.dump(..., indent=4) would format
+    it, if the array were nested level deep in a document."""
+
+    def __init__(self, f, level=0):
+        self.f = f
+        self.level = level
+        self.empty = True
+
+    def write(self, item):
+        if self.empty:
+            self.f.write('[\n')
+            self.empty = False
+        else:
+            self.f.write(',\n')
+        self.f.write(indented_json(item, self.level + 1))
+
+    def close(self):
+        if self.empty:
+            self.f.write('[]')
+        else:
+            self.f.write('\n' + ' ' * (4 * self.level) + ']')
+
+
+def iter_popolo_objects(primary_id_scheme, base_url, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield (collection, properties, memberships) for every Popolo object
+
+    memberships is a list of the person's memberships for objects
+    in the 'persons' collection, and None otherwise."""
+
+    title_to_sessions = get_title_to_sessions()
+    for person in queryset_in_chunks(people_queryset(), chunk_size):
+        properties = get_person_properties(person, primary_id_scheme, base_url)
+        memberships = get_person_memberships(
+            person, primary_id_scheme, base_url, title_to_sessions)
+        yield 'persons', properties, memberships
+
+    oslug_to_category = get_organization_categories()
+    for o in queryset_in_chunks(organisations_queryset(), chunk_size):
+        properties = get_organization_properties(
+            o, primary_id_scheme, base_url, oslug_to_category)
+        yield 'organizations', properties, None
+
+    for event in get_events(primary_id_scheme, base_url):
+        yield 'events', event, None
+
+    for place in queryset_in_chunks(places_queryset(), chunk_size):
+        area = get_area_information(place, base_url)
+        if area is not None:
+            yield 'areas', area, None
+
+
+def write_collection_files(output_directory, primary_id_scheme, base_url,
+                           chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write a COLLECTION.json and mongo-COLLECTION.dump file per collection"""
+
+    json_files = {}
+    mongo_files = {}
+    writers = {}
+    try:
+        for collection in COLLECTIONS:
+            json_files[collection] = open(
+                join(output_directory, collection + '.json'), 'w')
+            mongo_files[collection] = open(
+                join(output_directory, 'mongo-' + collection + '.dump'), 'w')
+            writers[collection] = JSONArrayWriter(json_files[collection])
+
+        def write_item(collection, item):
+            item['_id'] = item['id']
+            writers[collection].write(item)
+            json.dump(item, mongo_files[collection], sort_keys=True)
+            mongo_files[collection].write("\n")
+
+        for collection, properties, memberships in iter_popolo_objects(
+                primary_id_scheme, base_url, chunk_size):
+            write_item(collection, properties)
+            for membership in memberships or []:
+                write_item('memberships', membership)
+
+        for writer in writers.values():
+            writer.close()
+    finally:
+        for f in json_files.values() + mongo_files.values():
+            f.close()
+
+
+def write_pombola_files(output_directory, primary_id_scheme, base_url,
+                        chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write pombola.json and pombola-no-inline-memberships.json
+
+    Each collection is streamed to a temporary file first, and then
+    those are concatenated into both output documents, so that the
+    keys of each document are in sorted order."""
+
+    parts = {}
+    try:
+        for part in COLLECTIONS + ('persons-inline',):
+            parts[part] = JSONArrayWriter(tempfile.TemporaryFile(), level=1)
+
+        for collection, properties, memberships in iter_popolo_objects(
+                primary_id_scheme, base_url, chunk_size):
+            parts[collection].write(properties)
+            if collection == 'persons':
+                for membership in memberships:
+                    parts['memberships'].write(membership)
+                inline_properties = properties.copy()
+                inline_properties['memberships'] = memberships
+                parts['persons-inline'].write(inline_properties)
+
+        for writer in parts.values():
+            writer.close()
+
+        for leafname, document_parts in (
+                ('pombola.json', (
+                    ('areas', 'areas'),
+                    ('events', 'events'),
+                    ('organizations', 'organizations'),
+                    ('persons', 'persons-inline'),
+                    ('posts', 'posts'),
+                )),
+                ('pombola-no-inline-memberships.json', (
+                    ('areas', 'areas'),
+                    ('events', 'events'),
+                    ('memberships', 'memberships'),
+                    ('organizations', 'organizations'),
+                    ('persons', 'persons'),
+                    ('posts', 'posts'),
+                )),
+        ):
+            with open(join(output_directory, leafname), 'w') as f:
+                f.write('{\n')
+                for i, (key, part) in enumerate(document_parts):
+                    if i > 0:
+                        f.write(',\n')
+                    f.write('    {0}: '.format(json.dumps(key)))
+                    part_file = parts[part].f
+                    part_file.seek(0)
+                    shutil.copyfileobj(part_file, f)
+                f.write('\n}')
+    finally:
+        for writer in parts.values():
+            writer.f.close()
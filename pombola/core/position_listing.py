@@ -0,0 +1,269 @@
+"""Find the positions and place filter options for position listing pages
+
+The position listing pages (e.g. /position/mp/) can list hundreds of
+people, and they're among the most crawled pages on the sites.
+get_position_listing finds everything those pages need - the rows
+for the positions, the places for the drop-down to filter by place,
+and the parliamentary sessions to switch between - in one pass over
+the positions, and caches the result.  The cached listings are all
+invalidated by the signal handlers in pombola.core.models whenever a
+position, person, place, organisation, title or session changes.
+
+The rows are plain dictionaries, so they're also used for the JSON
+and CSV versions of the pages; the HTML pages only fetch the position
+objects for the page of results that's shown."""
+
+from collections import defaultdict
+import datetime
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+
+from pombola.core import fragment_cache, models
+
+
+VERSION_KEY = 'position-listing-version'
+
+CSV_FIELDS = (
+    'person_name', 'person_slug', 'person_url', 'title', 'subtitle',
+    'organisation', 'organisation_slug', 'place', 'place_slug',
+    'parent_place', 'parent_place_slug', 'start_date', 'end_date',
+    'parties',
+)
+
+
+def get_cache_key(title, ok_slug, o_slug, session, order, place_slug):
+    version = fragment_cache.get_versions([VERSION_KEY])[0]
+    # Positions start and end as time passes, so the date is included.
+    # The slugs can come straight from the query string, so they're
+    # hashed to keep the key short and safe for memcached:
+    digest = md5(u':'.join([
+        version,
+        datetime.date.today().isoformat(),
+        title.slug,
+        ok_slug or '',
+        o_slug or '',
+        session.slug if session else '',
+        order or '',
+        place_slug or '',
+    ]).encode('utf-8')).hexdigest()
+    return 'position-listing:{0}'.format(digest)
+
+
+def invalidate():
+    cache.delete(VERSION_KEY)
+
+
+def place_details(place):
+    return {
+        'name': place.name,
+        'slug': place.slug,
+        'url': place.get_absolute_url(),
+        'kind': {'name': place.kind.name},
+    }
+
+
+def position_row(position, parties):
+    person = position.person
+    place = position.place
+    row = {
+        'id': position.id,
+        'person': {
+            'id': person.id,
+            'name': person.name,
+            'slug': person.slug,
+            # Hidden people's names are shown, but not linked to:
+            'url': None if person.hidden else person.get_absolute_url(),
+        },
+        'title': position.title.name,
+        'subtitle': position.subtitle,
+        'organisation': None,
+        'place': None,
+        'start_date': unicode(position.start_date or ''),
+        'end_date': unicode(position.end_date or ''),
+        'parties': parties,
+    }
+    if position.organisation:
+        row['organisation'] = {
+            'name': position.organisation.name,
+            'slug': position.organisation.slug,
+        }
+    if place:
+        row['place'] = place_details(place)
+        row['place']['parent_place'] = \
+            place_details(place.parent_place) if place.parent_place else None
+    return row
+
+
+def get_party_memberships(person_ids):
+    """Return a dictionary mapping each person's id to their current parties"""
+    parties = defaultdict(list)
+    for person_id, name, slug in models.Position.objects \
+            .filter(
+                person__in=person_ids,
+                title__slug='member',
+                organisation__kind__slug='party') \
+            .currently_active() \
+            .order_by('organisation__name') \
+            .values_list('person_id', 'organisation__name', 'organisation__slug'):
+        parties[person_id].append({'name': name, 'slug': slug})
+    return parties
+
+
+def get_sessions(title):
+    """Return the parliamentary sessions that the page can switch between
+
+    These are only shown if the title is associated with any session."""
+    if not models.ParliamentarySession.objects.filter(position_title=title).exists():
+        return []
+    return [
+        {
+            'name': s.name,
+            'slug': s.slug,
+            'positions_url': s.positions_url(),
+        }
+        for s in models.ParliamentarySession.objects.order_by('name') \
+            .select_related('position_title', 'house__kind')
+    ]
+
+
+def compute_position_listing(title, ok_slug=None, o_slug=None, session=None,
+                             order=None, place_slug=None):
+    # If a particular parliamentary session has been requested, only
+    # return positions that overlap with the period of that
+    # session. Otherwise only return currently active positions.
+    if session:
+        positions = title.position_set.overlapping_dates(
+            session.start_date, session.end_date
+        )
+    else:
+        positions = title.position_set.all().currently_active()
+    if ok_slug is not None:
+        positions = positions.filter(organisation__kind__slug=ok_slug)
+    if o_slug is not None:
+        positions = positions.filter(organisation__slug=o_slug)
+
+    # Order by place name unless ordering by person name is requested:
+    positions = positions \
+        .order_by('person__sort_name' if order == 'name' else 'place') \
+        .select_related(
+            'person',
+            'organisation',
+            'title',
+            'place__kind',
+            'place__parent_place__kind',
+        ) \
+        .prefetch_related('person__alternative_names')
+    positions = list(positions)
+
+    parties = get_party_memberships(set(p.person_id for p in positions))
+
+    # The drop-down offers every place the positions are for, and their
+    # parents, whichever place is being filtered by:
+    child_places = {}
+    parent_places = {}
+    rows = []
+    for position in positions:
+        place = position.place
+        parent_place = place.parent_place if place else None
+        if place:
+            child_places[place.id] = place
+        if parent_place:
+            parent_places[parent_place.id] = parent_place
+        if place_slug and not (
+                (place and place.slug == place_slug) or
+                (parent_place and parent_place.slug == place_slug)):
+            continue
+        rows.append(position_row(position, parties[position.person_id]))
+
+    places = [
+        place_details(p)
+        for p in sorted(parent_places.values(), key=lambda p: p.slug)
+    ] + [
+        place_details(p)
+        for p in sorted(child_places.values(), key=lambda p: p.name)
+    ]
+
+    return {
+        'rows': rows,
+        'places': places,
+        'sessions': get_sessions(title),
+    }
+
+
+def get_position_listing(title, ok_slug=None, o_slug=None, session=None,
+                         order=None, place_slug=None):
+    """Return the cached listing for these options, computing it if needed
+
+    The listing is a dictionary with 'rows', a dictionary for each
+    position, 'places', the places to offer in the drop-down, and
+    'sessions', the parliamentary sessions that can be switched to."""
+    # Anything other than ordering by name gets the default order, so
+    # there's no need for a separate listing for each other value:
+    order = 'name' if order == 'name' else None
+    args = (title, ok_slug, o_slug, session, order, place_slug)
+    key = get_cache_key(*args)
+    listing = cache.get(key)
+    if listing is None:
+        listing = compute_position_listing(*args)
+        cache.set(key, listing, settings.POSITION_LISTING_CACHE_TIMEOUT)
+    return listing
+
+
+def csv_row(row, absolute_uri):
+    """Flatten a listing row into a dictionary with CSV_FIELDS as keys"""
+    organisation = row['organisation'] or {}
+    place = row['place'] or {}
+    parent_place = place.get('parent_place') or {}
+    person_url = row['person']['url']
+    return {
+        'person_name': row['person']['name'],
+        'person_slug': row['person']['slug'],
+        'person_url': absolute_uri(person_url) if person_url else '',
+        'title': row['title'],
+        'subtitle': row['subtitle'],
+        'organisation': organisation.get('name', ''),
+        'organisation_slug': organisation.get('slug', ''),
+        'place': place.get('name', ''),
+        'place_slug': place.get('slug', ''),
+        'parent_place': parent_place.get('name', ''),
+        'parent_place_slug': parent_place.get('slug', ''),
+        'start_date': row['start_date'],
+        'end_date': row['end_date'],
+        'parties': '; '.join(p['name'] for p in row['parties']),
+    }
+
+
+class ListedPositions(object):
+    """The positions in a listing, fetched a slice at a time
+
+    This can be paginated like a queryset, but only the positions on
+    the page that's shown are fetched, in the listing's order."""
+
+    def __init__(self, position_ids):
+        self.position_ids = position_ids
+
+    def __len__(self):
+        return len(self.position_ids)
+
+    def count(self):
+        return len(self.position_ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0] if index >= 0 else self[:][index]
+        ids = self.position_ids[index]
+        positions = models.Position.objects \
+            .select_related(
+                'person',
+                'organisation',
+                'title',
+                'place__kind',
+                'place__parent_place__kind',
+            ) \
+            .in_bulk(ids)
+        return [positions[i] for i in ids if i in positions]
+
+    def __iter__(self):
+        return iter(self[:])
@@ -0,0 +1,48 @@
+from django.template import Library, Node, TemplateSyntaxError
+
+from pombola.core.fragment_cache import get_fragment
+
+register = Library()
+
+@register.tag
+def cachefragment(parser, token):
+    """Cache the enclosed content until one of the objects it depends on changes
+
+    For example:
+
+        {% cachefragment "person-experience" object %}
+            ...
+        {% endcachefragment %}
+
+    The first argument is a name for the fragment, and the rest are the
+    model instances (or lists of them) that it depends on, or any other
+    values that it varies on, such as user.is_superuser.  See
+    pombola.core.fragment_cache for how the fragments are invalidated.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise TemplateSyntaxError(
+            "%r takes a fragment name and at least one object" % bits[0])
+    nodelist = parser.parse(('end' + bits[0],))
+    parser.delete_first_token()
+    fragment_name = bits[1]
+    if not (fragment_name[0] == fragment_name[-1] and fragment_name[0] in ('"', "'")):
+        raise TemplateSyntaxError(
+            "%r's fragment name must be a quoted string" % bits[0])
+    vary_on = [parser.compile_filter(bit) for bit in bits[2:]]
+    return FragmentCacheNode(fragment_name[1:-1], vary_on, nodelist)
+
+class FragmentCacheNode(Node):
+
+    def __init__(self, fragment_name, vary_on, nodelist):
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.nodelist = nodelist
+
+    def render(self, context):
+        vary_on = [v.resolve(context) for v in self.vary_on]
+        return get_fragment(
+            self.fragment_name,
+            vary_on,
+            lambda: self.nodelist.render(context),
+        )
@@ -0,0 +1,101 @@
+from datetime import date
+
+from django.contrib.gis.geos import Polygon
+from django.test import TestCase
+
+from mapit.models import Area, Generation, Geometry, Type
+
+from pombola.core import models
+from pombola.core.boundary_overlaps import (
+    boundary_overlap_jobs, compute_overlaps, save_overlaps
+)
+
+
+class BoundaryOverlapTest(TestCase):
+
+    def setUp(self):
+        constituency_type = Type.objects.create(
+            code='CON',
+            description='Constituency',
+        )
+        place_kind = models.PlaceKind.objects.create(
+            name='Constituency',
+            slug='constituency',
+        )
+
+        def make_place(name, session, generation, bbox):
+            area = Area.objects.create(
+                name=name,
+                type=constituency_type,
+                generation_low=generation,
+                generation_high=generation,
+            )
+            Geometry.objects.create(
+                area=area,
+                polygon=Polygon.from_bbox(bbox),
+            )
+            return models.Place.objects.create(
+                name=name,
+                slug=name.lower(),
+                kind=place_kind,
+                parliamentary_session=session,
+                mapit_area=area,
+            )
+
+        for name, start_date, end_date in (
+                ('Old', date(2008, 1, 1), date(2012, 12, 31)),
+                ('New', date(2013, 1, 1), date(9999, 12, 31)),
+        ):
+            generation = Generation.objects.create(
+                active=True,
+                description=name,
+            )
+            session = models.ParliamentarySession.objects.create(
+                name=name,
+                slug=name.lower(),
+                start_date=start_date,
+                end_date=end_date,
+                mapit_generation=generation.id,
+            )
+            if name == 'Old':
+                self.old_place = make_place(
+                    'Bigplace', session, generation, (0, 0, 2, 2))
+            else:
+                self.west_place = make_place(
+                    'Westplace', session, generation, (0, 0, 1, 2))
+                self.east_place = make_place(
+                    'Eastplace', session, generation, (1, 0, 3, 2))
+
+        # Run the jobs in this process rather than in a pool of
+        # workers, since they couldn't see this test's transaction:
+        for job in boundary_overlap_jobs():
+            save_overlaps(*compute_overlaps(job))
+
+    def test_boundary_changes_from_stored_overlaps(self):
+        # Just the sessions and the stored overlaps are fetched:
+        with self.assertNumQueries(2):
+            changes = self.old_place.get_boundary_changes()
+        self.assertEqual(
+            sorted(
+                (i['place'].name, round(i['percent']))
+                for i in changes['next']['intersections']
+            ),
+            [('Eastplace', 50), ('Westplace', 50)],
+        )
+        self.assertIsNone(changes['previous'])
+
+        changes = self.east_place.get_boundary_changes()
+        self.assertEqual(
+            [(i['place'], round(i['percent']))
+             for i in changes['previous']['intersections']],
+            [(self.old_place, 50)],
+        )
+        self.assertIsNone(changes['next'])
+
+        changes = self.west_place.get_boundary_changes()
+        self.assertEqual(
+            [(i['place'], round(i['percent']))
+             for i in changes['previous']['intersections']],
+            [(self.old_place, 100)],
+        )
+        self.assertEqual(changes['previous']['others'], [])
@@ -2,9 +2,14 @@
 # ./manage.py or django-admin.py).
 
 import contextlib
+import json
 from mock import patch
+import os
+from StringIO import StringIO
 import sys
+import tempfile
 
+from pombola.core import fragment_cache
 from pombola.core.models import (
     Contact,
     ContactKind,
@@ -21,9 +26,13 @@ from pombola.core.models import (
 )
 
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from django.test import TestCase
+from django.test.utils import override_settings
+
+from slug_helpers.models import SlugRedirect
 
 
 # A context manager to suppress standard output, as suggested in:
@@ -337,3 +346,156 @@ class MergeObjectsCommandTest(TestCase):
         Organisation.objects.get(pk=self.organisation_a.id)
         with self.assertRaises(Organisation.DoesNotExist):
             Organisation.objects.get(pk=self.organisation_b.id)
+
+    def write_merge_file(self, suffix, contents):
+        fd, filename = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as f:
+            f.write(contents)
+        self.addCleanup(os.remove, filename)
+        return filename
+
+    def test_merge_people_from_file_with_chain(self):
+        person_c = Person.objects.create(
+            name="J. Stewart",
+            slug="j-stewart")
+        Position.objects.create(
+            title=self.position_title,
+            person=person_c,
+            category="other",
+            organisation=self.organisation_c)
+        # person_c is merged into person_b, which is merged into
+        # person_a, so both should end up in person_a:
+        filename = self.write_merge_file('.json', json.dumps([
+            {'keep': 'james-stewart', 'delete': person_c.id},
+            {'keep': self.person_a.id, 'delete': 'james-stewart'},
+        ]))
+        stdout = StringIO()
+        with no_stdout_or_stderr():
+            call_command(
+                'core_merge_people',
+                merge_file=filename,
+                quiet=True,
+                interactive=False,
+                stdout=stdout)
+
+        self.assertEqual(
+            [self.person_a.id],
+            list(Person.objects.values_list('id', flat=True)))
+        self.assertEqual(3, Position.objects.filter(person=self.person_a).count())
+        self.assertEqual(
+            set(["James Stewart", "J. Stewart"]),
+            set(self.person_a.additional_names()))
+        self.assertEqual(
+            set(['james-stewart', 'j-stewart']),
+            set(SlugRedirect.objects
+                .filter(new_object_id=self.person_a.id)
+                .values_list('old_object_slug', flat=True)))
+
+        report = json.loads(stdout.getvalue())
+        self.assertTrue(report['complete'])
+        self.assertEqual([], report['skipped'])
+        self.assertEqual(1, len(report['merged']))
+        self.assertEqual(self.person_a.id, report['merged'][0]['keep']['id'])
+        self.assertEqual(
+            [self.person_b.id, person_c.id],
+            [p['id'] for p in report['merged'][0]['deleted']])
+        self.assertEqual(2, report['updated']['core.Position.person'])
+
+    def test_merge_orgs_from_file_skips_mismatches(self):
+        organisation_d = Organisation.objects.create(
+            name="Organisation D",
+            kind=self.organisation_kind,
+            slug="organisation-d",
+            started="1908-05-21")
+        self.organisation_c.started = "1908-05-20"
+        self.organisation_c.save()
+        filename = self.write_merge_file(
+            '.csv',
+            "keep,delete\n"
+            "organisation-a,organisation-b\n"
+            "organisation-c,organisation-d\n")
+        report_filename = self.write_merge_file('.json', '')
+        with no_stdout_or_stderr():
+            call_command(
+                'core_merge_organisations',
+                merge_file=filename,
+                report=report_filename,
+                quiet=True,
+                interactive=False)
+
+        # Merging D into C would lose D's start date, so only B is merged:
+        self.assertFalse(
+            Organisation.objects.filter(pk=self.organisation_b.id).exists())
+        self.assertTrue(
+            Organisation.objects.filter(pk=organisation_d.id).exists())
+        self.assertEqual(2, Position.objects.filter(
+                organisation=self.organisation_a).count())
+        self.assertEqual(2, Organisation.objects.get(
+                pk=self.organisation_a.id).num_positions)
+        self.assertEqual(1, OrganisationRelationship.objects.filter(
+                organisation_a=self.organisation_a,
+                organisation_b=self.organisation_c).count())
+
+        with open(report_filename) as f:
+            report = json.load(f)
+        self.assertEqual(
+            [self.organisation_a.id],
+            [m['keep']['id'] for m in report['merged']])
+        self.assertEqual(1, len(report['skipped']))
+        self.assertEqual(self.organisation_c.id, report['skipped'][0]['keep']['id'])
+        self.assertEqual(
+            ['started'],
+            [m['field'] for m in report['skipped'][0]['mismatches']])
+
+    def test_merge_from_file_with_cycle(self):
+        filename = self.write_merge_file(
+            '.csv',
+            "jimmy-stewart,james-stewart\n"
+            "james-stewart,jimmy-stewart\n")
+        with self.assertRaises(CommandError):
+            with no_stdout_or_stderr():
+                call_command(
+                    'core_merge_people',
+                    merge_file=filename,
+                    quiet=True,
+                    interactive=False)
+
+        # Check that nothing was deleted:
+        Person.objects.get(pk=self.person_a.id)
+        Person.objects.get(pk=self.person_b.id)
+
+    @patch('__builtin__.raw_input', return_value='y')
+    def test_merge_from_file_only_writes_report_to_stdout(self, mock_input):
+        filename = self.write_merge_file('.csv', "jimmy-stewart,james-stewart\n")
+        stdout = StringIO()
+        with no_stdout_or_stderr():
+            # Anything printed should end up with the report if it's
+            # not sent to standard error:
+            sys.stdout = stdout
+            call_command('core_merge_people', merge_file=filename, stdout=stdout)
+
+        report = json.loads(stdout.getvalue())
+        self.assertTrue(report['complete'])
+        self.assertEqual(self.person_a.id, report['merged'][0]['keep']['id'])
+
+    @override_settings(
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+        },
+    )
+    def test_merge_people_invalidates_fragments(self):
+        cache.clear()
+        keys = [
+            fragment_cache.version_key(Person, self.person_a.id),
+            fragment_cache.version_key(Organisation, self.organisation_b.id),
+        ]
+        fragment_cache.get_versions(keys)
+
+        with no_stdout_or_stderr():
+            call_command('core_merge_people', **self.options)
+
+        # Person B's position is now Person A's, so both Person A's and
+        # Organisation B's pages have changed:
+        self.assertEqual({}, cache.get_many(keys))
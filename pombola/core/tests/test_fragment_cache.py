@@ -0,0 +1,118 @@
+import datetime
+from StringIO import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from django_date_extensions.fields import ApproximateDate
+
+from pombola.core import fragment_cache, models
+
+
+TEMPLATE = Template('''{% load fragment_cache %}
+{% cachefragment "test-positions" person %}
+{% for position in person.position_set.all %}{{ position.organisation.name }};{% endfor %}
+{% endcachefragment %}''')
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    FRAGMENT_CACHE_TIMEOUT=60,
+)
+class FragmentCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.person = models.Person.objects.create(
+            legal_name='Test Person',
+            slug='test-person',
+        )
+        organisation_kind = models.OrganisationKind.objects.create(
+            name='Test OrgKind',
+            slug='test-orgkind',
+        )
+        self.organisation = models.Organisation.objects.create(
+            name='Test Org',
+            slug='test-org',
+            kind=organisation_kind,
+        )
+        self.position = models.Position.objects.create(
+            person=self.person,
+            organisation=self.organisation,
+            category='political',
+        )
+
+    def render(self):
+        # Fetch the person again so that nothing's cached on the instance:
+        person = models.Person.objects.get(pk=self.person.pk)
+        return TEMPLATE.render(Context({'person': person})).strip()
+
+    def test_fragment_is_cached(self):
+        self.assertEqual(self.render(), 'Test Org;')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.render(), 'Test Org;')
+
+    def test_invalidated_by_changed_organisation(self):
+        self.assertEqual(self.render(), 'Test Org;')
+        self.organisation.name = 'Renamed Org'
+        self.organisation.save()
+        self.assertEqual(self.render(), 'Renamed Org;')
+
+    def test_invalidated_by_new_and_deleted_positions(self):
+        self.assertEqual(self.render(), 'Test Org;')
+        other_organisation = models.Organisation.objects.create(
+            name='Other Org',
+            slug='other-org',
+            kind=self.organisation.kind,
+        )
+        models.Position.objects.create(
+            person=self.person,
+            organisation=other_organisation,
+            category='political',
+        )
+        self.assertEqual(
+            sorted(self.render().split(';')),
+            ['', 'Other Org', 'Test Org'],
+            )
+        self.position.delete()
+        self.assertEqual(self.render(), 'Other Org;')
+
+    def test_invalidated_by_moved_position(self):
+        other_person = models.Person.objects.create(
+            legal_name='Other Person',
+            slug='other-person',
+        )
+        self.assertEqual(self.render(), 'Test Org;')
+        self.position.person = other_person
+        self.position.save()
+        self.assertEqual(self.render(), '')
+
+    def test_invalidate_all(self):
+        self.assertEqual(self.render(), 'Test Org;')
+        # Change the organisation without sending any signals:
+        models.Organisation.objects.filter(pk=self.organisation.pk) \
+            .update(name='Renamed Org')
+        self.assertEqual(self.render(), 'Test Org;')
+        fragment_cache.invalidate_all()
+        self.assertEqual(self.render(), 'Renamed Org;')
+
+    def test_invalidated_by_daily_active_dates_refresh(self):
+        self.assertEqual(self.render(), 'Test Org;')
+        # End the position yesterday and rename the organisation, both
+        # without sending any signals:
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        models.Position.objects.filter(pk=self.position.pk).update(
+            end_date=ApproximateDate(yesterday.year, yesterday.month, yesterday.day))
+        models.Organisation.objects.filter(pk=self.organisation.pk) \
+            .update(name='Renamed Org')
+        self.assertEqual(self.render(), 'Test Org;')
+        call_command(
+            'core_refresh_position_active_dates', commit=True, stdout=StringIO())
+        self.assertEqual(self.render(), 'Renamed Org;')
@@ -1,5 +1,7 @@
 from django.test import TestCase
 
+from django_date_extensions.fields import ApproximateDate
+
 from pombola.core import models
 
 from django.contrib.contenttypes.models import ContentType
@@ -34,3 +36,80 @@ class OrganisationTest(TestCase):
         self.mysociety_id.delete()
         self.organisation.delete()
         self.organisation_kind.delete()
+
+
+class OrganisationPositionCountsTest(TestCase):
+    def setUp(self):
+        party_kind = models.OrganisationKind.objects.create(
+            name='Party',
+            slug='party',
+        )
+        self.party = models.Organisation.objects.create(
+            name='Test Party',
+            slug='test-party',
+            kind=party_kind,
+        )
+        self.other_party = models.Organisation.objects.create(
+            name='Other Party',
+            slug='other-party',
+            kind=party_kind,
+        )
+        self.member_title = models.PositionTitle.objects.create(
+            name='Member',
+            slug='member',
+        )
+        self.person = models.Person.objects.create(
+            legal_name='Test Person',
+            slug='test-person',
+        )
+
+    def counts(self, organisation):
+        organisation = models.Organisation.objects.get(pk=organisation.pk)
+        return (
+            organisation.num_positions,
+            organisation.num_current_positions,
+            organisation.num_current_politician_positions,
+            organisation.num_current_member_positions,
+        )
+
+    def test_counts_follow_position_changes(self):
+        self.assertEqual(self.counts(self.party), (0, 0, 0, 0))
+        self.assertFalse(models.Organisation.objects.active_parties().exists())
+
+        position = models.Position.objects.create(
+            person=self.person,
+            organisation=self.party,
+            title=self.member_title,
+            category='political',
+        )
+        models.Position.objects.create(
+            person=self.person,
+            organisation=self.party,
+            category='other',
+            start_date=ApproximateDate(year=2001),
+            end_date=ApproximateDate(year=2002),
+        )
+        self.assertEqual(self.counts(self.party), (2, 1, 1, 1))
+        self.assertEqual(
+            list(models.Organisation.objects.active_parties()), [self.party])
+
+        # Moving a position updates both organisations:
+        position.organisation = self.other_party
+        position.save()
+        self.assertEqual(self.counts(self.party), (1, 0, 0, 0))
+        self.assertEqual(self.counts(self.other_party), (1, 1, 1, 1))
+
+        position.delete()
+        self.assertEqual(self.counts(self.other_party), (0, 0, 0, 0))
+
+    def test_rebuild(self):
+        models.Position.objects.create(
+            person=self.person,
+            organisation=self.party,
+            title=self.member_title,
+            category='political',
+        )
+        models.Organisation.objects.update(num_positions=0, num_current_positions=0)
+        models.Organisation.update_position_counts()
+        self.assertEqual(self.counts(self.party), (1, 1, 1, 1))
+        self.assertEqual(self.counts(self.other_party), (0, 0, 0, 0))
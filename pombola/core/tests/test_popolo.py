@@ -1,4 +1,8 @@
 from datetime import date
+import json
+from os.path import join
+import shutil
+import tempfile
 
 from django.contrib.contenttypes.models import ContentType
 from django.core.files.base import ContentFile
@@ -12,6 +16,10 @@ from images.models import Image
 
 from pombola.core import models
 from pombola.core.popolo import get_popolo_data
+from pombola.core.popolo_delta import merge_popolo_delta, write_popolo_delta
+from pombola.core.popolo_stream import (
+    write_collection_files, write_pombola_files
+)
 
 
 class PopoloTest(TestCase):
@@ -294,5 +302,142 @@ class PopoloTest(TestCase):
         self.assertEqual(session['id'], example_session.id)
         self.assertEqual(session['mapit_generation'], self.generation.id)
 
+    def test_streaming_pombola_files_match(self):
+        output_directory = tempfile.mkdtemp()
+        try:
+            write_pombola_files(output_directory,
+                                'org.example',
+                                'http://pombola.example.org/',
+                                chunk_size=1)
+            for leafname, inline_memberships in (
+                    ('pombola.json', True),
+                    ('pombola-no-inline-memberships.json', False),
+            ):
+                with open(join(output_directory, leafname)) as f:
+                    streamed_data = json.load(f)
+                expected_data = get_popolo_data(
+                    'org.example',
+                    'http://pombola.example.org/',
+                    inline_memberships=inline_memberships)
+                self.assertEqual(streamed_data, expected_data)
+        finally:
+            shutil.rmtree(output_directory)
+
+    def test_streaming_collection_files_match(self):
+        output_directory = tempfile.mkdtemp()
+        try:
+            write_collection_files(output_directory,
+                                   'org.example',
+                                   'http://pombola.example.org/')
+            expected_data = get_popolo_data('org.example',
+                                            'http://pombola.example.org/',
+                                            inline_memberships=False)
+            for collection, expected_items in expected_data.items():
+                for item in expected_items:
+                    item['_id'] = item['id']
+                with open(join(output_directory, collection + '.json')) as f:
+                    self.assertEqual(json.load(f), expected_items)
+                filename = join(output_directory, 'mongo-' + collection + '.dump')
+                with open(filename) as f:
+                    self.assertEqual(
+                        [json.loads(line) for line in f],
+                        expected_items)
+        finally:
+            shutil.rmtree(output_directory)
+
+    def test_incremental_export(self):
+        output_directory = tempfile.mkdtemp()
+        try:
+            delta_filename = join(output_directory, 'delta.json')
+
+            # The first incremental export should include everything:
+            counts = write_popolo_delta(delta_filename,
+                                        output_directory,
+                                        'org.example',
+                                        'http://pombola.example.org/')
+            self.assertEqual(counts['persons'], {'changed': 1, 'deleted': 0})
+            self.assertEqual(counts['memberships'], {'changed': 1, 'deleted': 0})
+            with open(delta_filename) as f:
+                delta = json.load(f)
+            self.rewrite_expected_data()
+            self.assertEqual(delta['persons'], self.expected_persons)
+            self.assertEqual(delta['organizations'], self.expected_organizations)
+            self.assertEqual(delta['memberships'], self.expected_memberships)
+            self.assertIsNone(delta['since'])
+
+            full_data = get_popolo_data('org.example',
+                                        'http://pombola.example.org/',
+                                        inline_memberships=False)
+
+            # Now change the person and remove their position:
+            self.person.legal_name = 'Changed Person'
+            self.person.save()
+            deleted_position_id = self.position.id
+            self.position.delete()
+
+            counts = write_popolo_delta(delta_filename,
+                                        output_directory,
+                                        'org.example',
+                                        'http://pombola.example.org/')
+            self.assertEqual(counts['persons'], {'changed': 1, 'deleted': 0})
+            # The organisation's category came from the deleted position:
+            self.assertEqual(counts['organizations'], {'changed': 1, 'deleted': 0})
+            self.assertEqual(counts['memberships'], {'changed': 0, 'deleted': 1})
+            with open(delta_filename) as f:
+                delta = json.load(f)
+            self.assertEqual(delta['persons'][0]['name'], 'Changed Person')
+            self.assertNotIn('category', delta['organizations'][0])
+            self.assertEqual(
+                delta['deleted']['memberships'],
+                ['core_position:{0}'.format(deleted_position_id)])
+            self.assertIsNotNone(delta['since'])
+
+            merged_data = merge_popolo_delta(full_data, delta)
+            current_data = get_popolo_data('org.example',
+                                           'http://pombola.example.org/',
+                                           inline_memberships=False)
+            for collection in ('memberships', 'organizations', 'persons'):
+                self.assertEqual(merged_data[collection], current_data[collection])
+        finally:
+            shutil.rmtree(output_directory)
+
+    def test_incremental_export_follows_related_objects(self):
+        output_directory = tempfile.mkdtemp()
+        try:
+            delta_filename = join(output_directory, 'delta.json')
+            write_popolo_delta(delta_filename,
+                               output_directory,
+                               'org.example',
+                               'http://pombola.example.org/')
+
+            # Renaming the position title changes the membership's
+            # role, and a new primary image changes the person:
+            self.position_title.name = 'Dame of the Realm'
+            self.position_title.save()
+            new_image = Image(
+                content_object=self.person,
+                source='Another image that is not real',
+                is_primary=True,
+            )
+            new_image.image.save(
+                name='another-image',
+                content=ContentFile(''),
+            )
+
+            counts = write_popolo_delta(delta_filename,
+                                        output_directory,
+                                        'org.example',
+                                        'http://pombola.example.org/')
+            self.assertEqual(counts['memberships'], {'changed': 1, 'deleted': 0})
+            self.assertEqual(counts['persons'], {'changed': 1, 'deleted': 0})
+            self.assertEqual(counts['organizations'], {'changed': 0, 'deleted': 0})
+            with open(delta_filename) as f:
+                delta = json.load(f)
+            self.assertEqual(delta['memberships'][0]['role'], 'Dame of the Realm')
+            self.assertIn(
+                new_image.image.name, delta['persons'][0]['images'][0]['url'])
+        finally:
+            shutil.rmtree(output_directory)
+
 # FIXME: also mock out the PopIt API to test create_organisations and
 # create_people.
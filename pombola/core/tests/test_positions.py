@@ -1,15 +1,22 @@
+import csv
 import random
 import datetime
+import json
+from StringIO import StringIO
 
 from django.contrib.contenttypes.models import ContentType
 from django.core import exceptions
+from django.core.management import call_command
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+from django.test.utils import override_settings
 
 from django_date_extensions.fields import ApproximateDate
+from mock import patch
 from slug_helpers.models import SlugRedirect
 
-from pombola.core import models
+from pombola.core import models, position_listing
 
 
 class PositionTest(TestCase):
@@ -507,6 +514,34 @@ class PositionTest(TestCase):
         self.assertEqual( pos_qs.previous(mid_2012).count(), 0 )
         self.assertEqual( pos_qs.previous(mid_2013).count(), 1 )
 
+    def test_active_dates(self):
+        position = models.Position.objects.create(
+            person=self.person,
+            title=self.title,
+            start_date=ApproximateDate(year=2011, month=3),
+            end_date=ApproximateDate(year=2012),
+        )
+        self.assertEqual(position.active_from, datetime.date(2011, 3, 1))
+        self.assertEqual(position.active_until, datetime.date(2012, 12, 31))
+
+        position.start_date = ApproximateDate(past=True)
+        position.end_date = ApproximateDate(future=True)
+        position.save()
+        self.assertEqual(position.active_from, datetime.date.min)
+        self.assertEqual(position.active_until, datetime.date.max)
+
+        # If the dates are changed without going through save(), the
+        # management command should fix them:
+        models.Position.objects.filter(pk=position.pk).update(
+            end_date=ApproximateDate(year=2013, month=2, day=3))
+        self.assertEqual(
+            models.Position.objects.all().currently_active(datetime.date(2014, 1, 1)).count(), 1)
+        call_command('core_refresh_position_active_dates', commit=True, stdout=StringIO())
+        position = models.Position.objects.get(pk=position.pk)
+        self.assertEqual(position.active_until, datetime.date(2013, 2, 3))
+        self.assertEqual(
+            models.Position.objects.all().currently_active(datetime.date(2014, 1, 1)).count(), 0)
+
     def test_position_title_no_redirect(self):
         response = self.client.get(
             reverse('position_pt', kwargs={
@@ -637,3 +672,128 @@ class PositionTest(TestCase):
                 'o_slug': 'test-org',
             })
         )
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    POSITION_LISTING_CACHE_TIMEOUT=60,
+)
+class PositionListingTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.title = models.PositionTitle.objects.create(
+            name='Member of Parliament',
+            slug='mp',
+        )
+        county_kind = models.PlaceKind.objects.create(
+            name='County',
+            slug='county',
+        )
+        constituency_kind = models.PlaceKind.objects.create(
+            name='Constituency',
+            slug='constituency',
+        )
+        self.county = models.Place.objects.create(
+            name='Test County',
+            slug='test-county',
+            kind=county_kind,
+        )
+        party_kind = models.OrganisationKind.objects.create(
+            name='Party',
+            slug='party',
+        )
+        party = models.Organisation.objects.create(
+            name='Test Party',
+            slug='test-party',
+            kind=party_kind,
+        )
+        member_title = models.PositionTitle.objects.create(
+            name='Member',
+            slug='member',
+        )
+        self.people = []
+        for i, parent_place in enumerate((self.county, None)):
+            place = models.Place.objects.create(
+                name='Constituency {0}'.format(i),
+                slug='constituency-{0}'.format(i),
+                kind=constituency_kind,
+                parent_place=parent_place,
+            )
+            person = models.Person.objects.create(
+                legal_name='Person {0}'.format(i),
+                slug='person-{0}'.format(i),
+            )
+            self.people.append(person)
+            models.Position.objects.create(
+                person=person,
+                title=self.title,
+                place=place,
+                category='political',
+            )
+            models.Position.objects.create(
+                person=person,
+                title=member_title,
+                organisation=party,
+                category='political',
+            )
+
+    def get_listing(self, **params):
+        response = self.client.get(
+            reverse('position_pt', kwargs={'pt_slug': 'mp'}), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_place_filter_and_facets(self):
+        response = self.get_listing(place_slug='test-county')
+        self.assertEqual(
+            [p.person for p in response.context['positions']],
+            [self.people[0]])
+        # All the places are offered, parents first:
+        self.assertEqual(
+            [p['slug'] for p in response.context['places']],
+            ['test-county', 'constituency-0', 'constituency-1'])
+
+    def test_json_and_csv(self):
+        rows = json.loads(self.get_listing(format='json').content)
+        self.assertEqual(
+            [row['person']['slug'] for row in rows],
+            ['person-0', 'person-1'])
+        self.assertEqual(rows[0]['place']['parent_place']['slug'], 'test-county')
+        self.assertEqual(rows[0]['parties'], [{'name': 'Test Party', 'slug': 'test-party'}])
+
+        response = self.get_listing(format='csv', order='name')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        csv_rows = list(csv.DictReader(StringIO(response.content)))
+        self.assertEqual(
+            [row['person_name'] for row in csv_rows],
+            ['Person 0', 'Person 1'])
+        self.assertEqual(csv_rows[0]['parent_place'], 'Test County')
+        self.assertEqual(csv_rows[1]['parties'], 'Test Party')
+
+    def test_listing_is_cached_and_invalidated(self):
+        self.get_listing(format='json')
+        with patch('pombola.core.position_listing.compute_position_listing') as compute:
+            self.get_listing(format='json')
+            self.assertFalse(compute.called)
+
+        self.people[1].legal_name = 'Renamed Person'
+        self.people[1].save()
+        rows = json.loads(self.get_listing(format='json').content)
+        self.assertEqual(rows[1]['person']['name'], 'Renamed Person')
+
+    def test_unknown_order_uses_default_listing(self):
+        self.get_listing(format='json')
+        with patch('pombola.core.position_listing.compute_position_listing') as compute:
+            self.get_listing(format='json', order='junk')
+            self.assertFalse(compute.called)
+
+    def test_cache_key_is_safe_for_memcached(self):
+        key = position_listing.get_cache_key(
+            self.title, None, None, None, None, u'a b\n' * 100)
+        self.assertLessEqual(len(key), 250)
+        self.assertNotRegexpMatches(key, r'[\s\x00-\x1f]')
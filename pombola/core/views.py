@@ -7,6 +7,7 @@ from __future__ import absolute_import
 
 import time
 import calendar
+import csv
 import datetime
 import os
 import random
@@ -18,7 +19,6 @@ from os.path import dirname
 
 import django
 from django.core.urlresolvers import reverse
-from django.db.models import Count
 from django.db.models import Q
 from django.http import HttpResponse
 from django.shortcuts  import render_to_response, get_object_or_404, redirect
@@ -29,12 +29,13 @@ from django.views.generic.detail import SingleObjectMixin
 from django.core.cache import cache
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.utils.functional import SimpleLazyObject
 from django.views.generic import View
 
 from popolo.models import Identifier
 from slug_helpers.views import SlugRedirectMixin, get_slug_redirect
 
-from pombola.core import models
+from pombola.core import models, position_listing
 from pombola.country import override_current_session
 
 
@@ -191,7 +192,9 @@ class BasePlaceDetailView(DetailView):
         # Call the base implementation first to get a context
         context = super(BasePlaceDetailView, self).get_context_data(**kwargs)
         context['place_type_count'] = models.Place.objects.filter(kind=self.object.kind).count()
-        context['related_people'] = self.object.related_people()
+        # This is only evaluated if the cached fragment of the page
+        # that lists these people needs to be rendered again:
+        context['related_people'] = SimpleLazyObject(self.object.related_people)
         if settings.ENABLED_FEATURES['projects']:
             # The number of projects associated with the place is used
             # in the link text in the object_menu_links:
@@ -335,14 +338,6 @@ def position(request, pt_slug, ok_slug=None, o_slug=None):
         slug=pt_slug
     )
 
-    # If this position title is one associated with any parliamentary
-    # session, show alternative parliamentary sessions:
-    possible_sessions = []
-    if models.ParliamentarySession.objects.filter(
-            position_title=title
-    ).exists():
-        possible_sessions = models.ParliamentarySession.objects.order_by('name')
-
     page_title = title.name
     if o_slug:
         organisation = get_object_or_404(models.Organisation,
@@ -360,11 +355,48 @@ def position(request, pt_slug, ok_slug=None, o_slug=None):
             models.ParliamentarySession,
             slug=session_slug
         )
+
+    order = request.GET.get('order')
+    place_slug = request.GET.get('place_slug')
+
+    # The rows, the places to filter by and the sessions to switch
+    # between are all cached - see pombola.core.position_listing:
+    listing = position_listing.get_position_listing(
+        title,
+        ok_slug=ok_slug,
+        o_slug=o_slug,
+        session=session,
+        order=order,
+        place_slug=place_slug,
+    )
+
+    output_format = request.GET.get('format')
+    if output_format == 'json':
+        return HttpResponse(
+            json.dumps(listing['rows']), content_type='application/json'
+        )
+    elif output_format == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = \
+            'attachment; filename="{0}.csv"'.format(title.slug)
+        writer = csv.DictWriter(response, position_listing.CSV_FIELDS)
+        writer.writeheader()
+        for row in listing['rows']:
+            writer.writerow(dict(
+                (k, v.encode('utf-8'))
+                for k, v in position_listing.csv_row(
+                    row, request.build_absolute_uri).items()
+            ))
+        return response
+
     # Build up context data for the links to switch between particular
     # parliamentary sessions and all current position holders:
     session_details = []
-    for s in [None] + list(possible_sessions):
-        if session != s:
+    possible_sessions = listing['sessions']
+    current_slug = session.slug if session else None
+    for s in [None] + possible_sessions:
+        s_slug = s and s['slug']
+        if current_slug != s_slug:
             params = request.GET.copy()
             if s is None:
                 session_filter = 'Current'
@@ -375,48 +407,18 @@ def position(request, pt_slug, ok_slug=None, o_slug=None):
                 else:
                     path = override.positions_url()
             else:
-                session_filter = s.name
-                params['session'] = s.slug
-                path = s.positions_url()
+                session_filter = s['name']
+                params['session'] = s_slug
+                path = s['positions_url']
             session_details.append({
                 'url': path + '?' + params.urlencode(),
                 'name': session_filter,
                 'session': s,
-                'should_link': session != s,
+                'should_link': current_slug != s_slug,
             })
 
-    # If a particular parliamentary session has been requested, only
-    # return positions that overlap with the period of that
-    # session. Otherwise only return currently active positions.
-    if session:
-        positions = title.position_set.overlapping_dates(
-            session.start_date, session.end_date
-        )
-    else:
-        positions = title.position_set.all().currently_active()
-    if ok_slug is not None:
-        positions = positions.filter(organisation__kind__slug=ok_slug)
-    if o_slug is not None:
-        positions = positions.filter(organisation__slug=o_slug)
-
-    # Order by place name unless ordering by person name is requested:
-    order = 'place'
-    if request.GET.get('order') == 'name':
-        order = 'person__sort_name'
-    positions = positions.order_by(order)
-
-    positions = positions.select_related('person',
-                                         'organisation',
-                                         'title',
-                                         'place',
-                                         'place__kind',
-                                         'place__parent_place')
-
-    place_slug = request.GET.get('place_slug')
-    if place_slug:
-        positions = positions.filter(
-            Q(place__slug=place_slug) | Q(place__parent_place__slug=place_slug)
-        )
+    positions = position_listing.ListedPositions(
+        [row['id'] for row in listing['rows']])
 
     # see if we should show the grid
     view = request.GET.get('view', 'list')
@@ -426,19 +428,7 @@ def position(request, pt_slug, ok_slug=None, o_slug=None):
         places   = [] # not relevant to this view
     else:
         template = 'core/position_detail.html'
-
-        # Collect all the places those positions refer to:
-        child_places = sorted(set(x.place for x in positions if x.place),
-                              key=lambda p: p.name)
-
-        # Extract the parents of those places as well:
-        parent_place_ids = [x.parent_place.id for x in child_places if (x and x.parent_place)]
-        parent_places = models.Place.objects.filter(id__in=parent_place_ids).select_related('kind')
-
-        # combine the places into a single list for the search drop down
-        places = []
-        places.extend(parent_places)
-        places.extend(child_places)
+        places = listing['places']
 
     return render_to_response(
         template,
@@ -446,7 +436,7 @@ def position(request, pt_slug, ok_slug=None, o_slug=None):
             'object':     title,
             'page_title': page_title,
             'positions':  positions,
-            'order':      request.GET.get('order'),
+            'order':      order,
             'places':     places,
             'place_slug': place_slug,
             'session': session,
@@ -508,11 +498,11 @@ class OrganisationKindList(SlugRedirectMixin, SingleObjectMixin, ListView):
 
     def get_queryset(self):
         self.object = self.get_object(queryset=self.model.objects.all())
+        # num_positions is kept up to date on each organisation:
         orgs = (
             self.object
                 .organisation_set
                 .all()
-                .annotate(num_positions = Count('position'))
                 .order_by('-num_positions', 'name')
         )
         return orgs
@@ -7,11 +7,12 @@ generated.
 
 
 from pombola.core import models
-from pombola.tasks.models import Task
+from pombola.tasks.regeneration import regenerate_tasks
+
+# See also the tasks_regenerate management command.
 
 task_related_models = [ models.Person, models.Contact ]
 
 for m in task_related_models:
-    for obj in m.objects.all():
-        Task.call_generate_tasks_on( obj )
+    regenerate_tasks( m )
 
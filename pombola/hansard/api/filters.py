@@ -0,0 +1,56 @@
+import datetime
+
+from rest_framework.exceptions import ParseError
+from rest_framework.filters import BaseFilterBackend
+
+
+def parse_date(value, parameter):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ParseError(
+            "'{0}' must be a date in the format YYYY-MM-DD".format(parameter))
+
+
+class HansardFilterBackend(BaseFilterBackend):
+    """Filter entries or sittings by venue, date range and speaker
+
+    The query parameters are:
+
+        venue     - the slug of the venue
+        date_from - sittings starting on or after this date (YYYY-MM-DD)
+        date_to   - sittings starting on or before this date
+        speaker   - the id or slug of a person who spoke
+
+    The view's sitting_lookup is the path from its model to the
+    sitting ('' for sittings), and speaker_lookup the path to the
+    speaker."""
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        sitting = view.sitting_lookup
+
+        venue = params.get('venue')
+        if venue:
+            queryset = queryset.filter(**{sitting + 'venue__slug': venue})
+
+        date_from = params.get('date_from')
+        if date_from:
+            queryset = queryset.filter(**{
+                sitting + 'start_date__gte': parse_date(date_from, 'date_from')})
+
+        date_to = params.get('date_to')
+        if date_to:
+            queryset = queryset.filter(**{
+                sitting + 'start_date__lte': parse_date(date_to, 'date_to')})
+
+        speaker = params.get('speaker')
+        if speaker:
+            speaker_field = 'id' if speaker.isdigit() else 'slug'
+            queryset = queryset.filter(**{
+                view.speaker_lookup + '__' + speaker_field: speaker})
+            if view.speaker_lookup != 'speaker':
+                # Going through the entries can repeat sittings:
+                queryset = queryset.distinct()
+
+        return queryset
@@ -0,0 +1,131 @@
+import operator
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import six
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination that lets clients ask for bigger pages
+
+    Unlike offset pagination, each page is found by filtering on the
+    ordering fields from where the previous page ended, so fetching a
+    page far into the results is as quick as fetching the first.
+
+    DRF's CursorPagination only puts the first ordering field in the
+    cursor, so rows that share its value can be skipped or repeated
+    between pages.  Here the cursor's position holds the values of all
+    the ordering fields, which should end with the primary key so that
+    every position is unique."""
+
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    position_separator = '|'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def _get_position_from_instance(self, instance, ordering):
+        return self.position_separator.join(
+            six.text_type(getattr(instance, order.lstrip('-')))
+            for order in ordering)
+
+    def get_position_filter(self, queryset, position, reverse):
+        """Return a Q matching the rows that come after position
+
+        For an ordering of (a, b) that's a > A or (a = A and b > B), with
+        the comparisons flipped for descending fields and for cursors
+        that go backwards."""
+        values = position.split(self.position_separator)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        opts = queryset.model._meta
+        equal_so_far = {}
+        conditions = []
+        for order, value in zip(self.ordering, values):
+            attr = order.lstrip('-')
+            try:
+                value = opts.get_field(attr).to_python(value)
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            descending = order.startswith('-') != reverse
+            lookup = attr + ('__lt' if descending else '__gt')
+            conditions.append(Q(**dict(equal_so_far, **{lookup: value})))
+            equal_so_far[attr] = value
+        return reduce(operator.or_, conditions)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # This follows CursorPagination.paginate_queryset, except for
+        # filtering on every ordering field rather than just the first.
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(queryset, current_position, reverse))
+
+        # Fetch an extra row to find out whether there's a following page:
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+
+class EntryPagination(KeysetPagination):
+    ordering = 'id'
+
+
+class SittingPagination(KeysetPagination):
+    ordering = ('start_date', 'id')
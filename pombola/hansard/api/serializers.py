@@ -43,20 +43,46 @@ class SittingSerializer(serializers.HyperlinkedModelSerializer):
     source = SourceSerializer(read_only=True)
 
 
-class SittingWithEntriesSerializer(serializers.HyperlinkedModelSerializer):
-    class Meta:
-        model = Sitting
-        fields = (
-            'id', 'url', 'source', 'venue',
-            'start_date', 'start_time',
-            'end_date', 'end_time',
-            'entries',
-        )
-    source = SourceSerializer(read_only=True)
-    entries = EntrySerializer(many=True, read_only=True, source='entry_set')
-
-
 class VenueSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Venue
         fields = ('id', 'url', 'name', 'slug')
+
+
+# Entries are also output straight from values() rows, without creating
+# model instances or going through a serializer, for a sitting's entries
+# and the bulk export.  These fields give the same output as
+# EntrySerializer, plus the sitting's details for the export.
+ENTRY_VALUES_FIELDS = (
+    'id', 'text_counter', 'type', 'speaker_name', 'speaker_title',
+    'speaker_id', 'speaker__legal_name', 'speaker__slug', 'content',
+    'sitting_id', 'sitting__start_date', 'sitting__venue__slug',
+)
+
+
+def entry_row_to_dict(row, entry_list_url, include_sitting=False):
+    """Convert a row of ENTRY_VALUES_FIELDS to a dictionary for output
+
+    entry_list_url is the URL of the entry list, which the entry's id is
+    appended to for its URL."""
+    result = {
+        'id': row['id'],
+        'url': '{0}{1}/'.format(entry_list_url, row['id']),
+        'text_counter': row['text_counter'],
+        'type': row['type'],
+        'speaker_name': row['speaker_name'],
+        'speaker_title': row['speaker_title'],
+        'speaker': None,
+        'content': row['content'],
+    }
+    if row['speaker_id'] is not None:
+        result['speaker'] = {
+            'id': row['speaker_id'],
+            'legal_name': row['speaker__legal_name'],
+            'slug': row['speaker__slug'],
+        }
+    if include_sitting:
+        result['sitting'] = row['sitting_id']
+        result['start_date'] = row['sitting__start_date']
+        result['venue'] = row['sitting__venue__slug']
+    return result
@@ -1,33 +1,88 @@
-from django.db.models import Prefetch
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 from rest_framework import viewsets
+from rest_framework.decorators import list_route
+from rest_framework.exceptions import ParseError
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
 from ..models import Entry, Sitting, Source, Venue
+from .filters import HansardFilterBackend
+from .pagination import EntryPagination, SittingPagination
 from .serializers import (
-    EntrySerializer, SittingSerializer, SittingWithEntriesSerializer,
-    SourceSerializer, VenueSerializer
+    ENTRY_VALUES_FIELDS, EntrySerializer, SittingSerializer,
+    SourceSerializer, VenueSerializer, entry_row_to_dict
 )
 
 
+EXPORT_BATCH_SIZE = 2000
+
+
+def iter_values_by_id(queryset, fields, after=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the values() rows of queryset in id order, a batch at a time
+
+    Each batch carries on from the last id of the one before, so the
+    database never has to skip over the rows already returned, and only
+    one batch is held in memory at a time."""
+    queryset = queryset.order_by('id')
+    while True:
+        batch_queryset = queryset
+        if after is not None:
+            batch_queryset = queryset.filter(id__gt=after)
+        batch = list(batch_queryset.values(*fields)[:batch_size])
+        if not batch:
+            return
+        for row in batch:
+            yield row
+        after = batch[-1]['id']
+
+
 class EntryViewSet(viewsets.ModelViewSet):
-    queryset = Entry.objects.order_by('id')
+    queryset = Entry.objects.order_by('id').select_related('speaker')
     serializer_class = EntrySerializer
+    pagination_class = EntryPagination
+    filter_backends = (HansardFilterBackend,)
+    sitting_lookup = 'sitting__'
+    speaker_lookup = 'speaker'
 
+    @list_route()
+    def export(self, request, *args, **kwargs):
+        """Stream all the (filtered) entries as newline-delimited JSON
 
-class SittingViewSet(viewsets.GenericViewSet):
+        Pass the id of the last entry received as 'after' to carry on
+        from where an earlier export stopped."""
+        after = request.query_params.get('after')
+        if after is not None:
+            if not after.isdigit():
+                raise ParseError("'after' must be the id of an entry")
+            after = int(after)
+        queryset = self.filter_queryset(Entry.objects.all())
+        entry_list_url = reverse('entry-list', request=request)
 
-    # FIXME: this is only needed because the GenericViewSet calls
-    # get_queryset when trying to construct a filter form.  However at
-    # the moment there's no filter backend, so it's not actually used.
-    # Including this class attribute stops the list view erroring,
-    # however.
-    queryset = Entry.objects.order_by('id')
+        lines = (
+            json.dumps(
+                entry_row_to_dict(row, entry_list_url, include_sitting=True),
+                cls=DjangoJSONEncoder,
+            ) + '\n'
+            for row in iter_values_by_id(queryset, ENTRY_VALUES_FIELDS, after)
+        )
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+
+class SittingViewSet(viewsets.GenericViewSet):
+    queryset = Sitting.objects.order_by('start_date', 'id') \
+        .select_related('source', 'venue')
+    pagination_class = SittingPagination
+    filter_backends = (HansardFilterBackend,)
+    sitting_lookup = ''
+    speaker_lookup = 'entry__speaker'
 
     def list(self, request, version=None):
-        queryset = Sitting.objects.order_by('id') \
-            .select_related('source', 'venue')
+        queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = SittingSerializer(
@@ -44,15 +99,17 @@ class SittingViewSet(viewsets.GenericViewSet):
         return Response(serializer.data)
 
     def retrieve(self, request, pk=None, version=None):
-        prefetch_qs = Entry.objects.select_related('speaker')
-        queryset = Sitting.objects.order_by('id') \
-            .select_related('source', 'venue') \
-            .prefetch_related(Prefetch('entry_set', queryset=prefetch_qs))
-        sitting = get_object_or_404(queryset, pk=pk)
-        serializer = SittingWithEntriesSerializer(
-            sitting, context={'request': request}
-        )
-        return Response(serializer.data)
+        sitting = get_object_or_404(self.get_queryset(), pk=pk)
+        data = SittingSerializer(sitting, context={'request': request}).data
+        # A sitting can have thousands of entries, so they're output
+        # straight from the values rather than through EntrySerializer:
+        entry_list_url = reverse('entry-list', request=request)
+        data['entries'] = [
+            entry_row_to_dict(row, entry_list_url)
+            for row in sitting.entry_set.order_by('text_counter')
+            .values(*ENTRY_VALUES_FIELDS)
+        ]
+        return Response(data)
 
 class SourceViewSet(viewsets.ModelViewSet):
     queryset = Source.objects.order_by('id')
@@ -9,6 +9,8 @@ from django.db import transaction
 from BeautifulSoup import BeautifulSoup, BeautifulStoneSoup, Tag
 
 from pombola.hansard.models import Sitting, Entry, Venue
+from pombola.hansard.signals import entries_created
+from pombola.search.index_updates import update_search_index
 
 
 # EXCEPTIONS
@@ -157,7 +159,11 @@ class KenyaParser():
 
 
     @classmethod
-    def convert_html_to_data(cls, html):
+    def convert_html_to_data(cls, html, create_venues=True):
+        """Parse the HTML from pdftohtml into a transcript and metadata
+
+        If create_venues is False, this doesn't touch the database, so
+        it's safe to call from worker processes."""
 
         # Clean out all the &nbsp; now. pdftohtml puts them to preserve the lines
         html = re.sub( r'&nbsp;', ' ', html )
@@ -364,7 +370,8 @@ class KenyaParser():
             last_speaker_title = ''
 
         hansard_data = {
-            'meta': cls.extract_meta_from_transcript( meaningful_content ),
+            'meta': cls.extract_meta_from_transcript(
+                meaningful_content, create_venues=create_venues),
             'transcript': meaningful_content,
         }
 
@@ -372,42 +379,44 @@ class KenyaParser():
 
 
     @classmethod
-    def extract_meta_from_transcript(cls, transcript):
+    def get_or_create_venues(cls):
+        """Make sure the National Assembly and Senate venues exist"""
+        for slug, name in (('national_assembly', 'National Assembly'),
+                           ('senate', 'Senate')):
+            Venue.objects.get_or_create(slug=slug, defaults={"name": name})
+
+
+    @classmethod
+    def extract_meta_from_transcript(cls, transcript, create_venues=True):
 
         # create the two venues
-        national_assembly, created = Venue.objects.get_or_create(
-            slug = 'national_assembly',
-            defaults = {"name": "National Assembly"},
-        )
-        senate, created = Venue.objects.get_or_create(
-            slug = 'senate',
-            defaults = {"name": "Senate"},
-        )
+        if create_venues:
+            cls.get_or_create_venues()
 
-        reg   = None
-        venue = None
+        reg        = None
+        venue_slug = None
 
         # work out which one we should use
         for line in transcript:
             text = line.get('text', '')
             if cls.na_reg.search(text):
                 reg = KenyaParser.na_reg
-                venue = national_assembly
+                venue_slug = 'national_assembly'
                 break
             elif cls.sen_reg.search(text):
                 reg = KenyaParser.sen_reg
-                venue = senate
+                venue_slug = 'senate'
                 break
             elif cls.joint_reg.search(text):
                 reg = KenyaParser.joint_reg
-                venue = national_assembly
+                venue_slug = 'national_assembly'
                 break
 
-        if venue is None:
+        if venue_slug is None:
             raise Exception, "Failed to find the Venue"
 
         results = {
-            'venue': venue.slug,
+            'venue': venue_slug,
         }
 
         for line in transcript:
@@ -527,13 +536,13 @@ class KenyaParser():
         )
         sitting.save()
 
+        # Build all the entries in memory and insert them at once. This
+        # bypasses the search signal processor, so the new entries are
+        # then queued for indexing together.
         with transaction.atomic():
-            counter = 0
-            for line in data['transcript']:
-
-                counter += 1
-
-                entry = Entry(
+            entries = []
+            for counter, line in enumerate(data['transcript'], 1):
+                entries.append(Entry(
                     sitting       = sitting,
                     type          = line['type'],
                     page_number   = line['page_number'],
@@ -541,10 +550,14 @@ class KenyaParser():
                     speaker_name  = line.get('speaker_name',  ''),
                     speaker_title = line.get('speaker_title', ''),
                     content       = line['text'],
-                )
-                entry.save()
+                ))
+            Entry.objects.bulk_create(entries, batch_size=1000)
+            update_search_index(
+                Entry, sitting.entry_set.values_list('id', flat=True))
 
             source.last_processing_success = datetime.datetime.now()
             source.save()
 
+        entries_created.send(sender=Sitting, sitting=sitting)
+
         return None
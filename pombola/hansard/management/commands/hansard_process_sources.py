@@ -1,18 +1,63 @@
+from collections import defaultdict
 import datetime
+from multiprocessing import Pool
+from optparse import make_option
+import time
+import traceback
 
-from django.core.management.base import NoArgsCommand
+from django.core.management.base import CommandError, NoArgsCommand
+from django.db import connections, transaction
 
 from pombola.hansard.models import Source
 from pombola.hansard.kenya_parser import KenyaParser
 
+
+def convert_and_parse_source(job):
+    """Convert a source's PDF to HTML and parse it, in a worker process
+
+    This mustn't use the database.  It returns a tuple of the source
+    ID, the parsed data (or None on failure), the formatted traceback
+    of any exception and a dictionary of the time spent in each stage."""
+
+    source_id, pdf_filename = job
+    timings = {}
+    try:
+        start = time.time()
+        with open(pdf_filename, 'r') as pdf:
+            html = KenyaParser.convert_pdf_to_html(pdf)
+        timings['convert'] = time.time() - start
+
+        start = time.time()
+        data = KenyaParser.convert_html_to_data(html, create_venues=False)
+        timings['parse'] = time.time() - start
+    except Exception:
+        return source_id, None, traceback.format_exc(), timings
+    return source_id, data, None, timings
+
+
 class Command(NoArgsCommand):
     help = 'Process all sources that have not been done'
     args = ''
 
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--processes',
+            type='int',
+            dest='processes',
+            default=0,
+            help='Convert and parse the PDFs in a pool of this many worker processes, '
+                 'continuing past any sources that fail'
+        ),
+    )
+
     def handle_noargs(self, **options):
 
         verbose = int(options.get('verbosity')) >= 2
 
+        if options['processes']:
+            self.process_sources_in_pool(options['processes'], verbose)
+            return
+
         for source in Source.objects.all().requires_processing():
 
             if verbose:
@@ -31,3 +76,86 @@ class Command(NoArgsCommand):
             except Exception as e:
                 print "There was an exception when parsing {0}".format(pdf)
                 raise
+
+    def process_sources_in_pool(self, processes, verbose):
+        """Process sources with PDF conversion and parsing in a worker pool
+
+        The files are fetched and the sittings and entries are
+        created in this process, so only one process writes to the
+        database.  A failure for one source is reported at the end
+        rather than stopping the others from being processed."""
+
+        timings = defaultdict(float)
+        failures = []
+        sources = {}
+        jobs = []
+
+        for source in Source.objects.all().requires_processing():
+            if verbose:
+                message = "{0}: Fetching {1}"
+                self.stdout.write(message.format(source.list_page, source))
+
+            source.last_processing_attempt = datetime.datetime.now()
+            source.save()
+
+            start = time.time()
+            try:
+                pdf = source.file()
+                pdf.close()
+            except Exception:
+                failures.append((source, 'fetch', traceback.format_exc()))
+                continue
+            finally:
+                timings['fetch'] += time.time() - start
+
+            sources[source.id] = source
+            jobs.append((source.id, pdf.name))
+
+        KenyaParser.get_or_create_venues()
+
+        # Don't share this process's database connections with the
+        # forked worker processes:
+        for connection in connections.all():
+            connection.close()
+
+        pool = Pool(processes=processes)
+        try:
+            results = pool.imap_unordered(convert_and_parse_source, jobs)
+            for source_id, data, error, source_timings in results:
+                source = sources[source_id]
+                for stage, seconds in source_timings.items():
+                    timings[stage] += seconds
+                if error:
+                    failures.append((source, 'convert/parse', error))
+                    continue
+
+                if verbose:
+                    message = "{0}: Creating entries for {1}"
+                    self.stdout.write(message.format(source.list_page, source))
+
+                start = time.time()
+                try:
+                    with transaction.atomic():
+                        KenyaParser.create_entries_from_data_and_source(data, source)
+                except Exception:
+                    failures.append((source, 'write', traceback.format_exc()))
+                finally:
+                    timings['write'] += time.time() - start
+        finally:
+            pool.close()
+            pool.join()
+
+        self.stdout.write(
+            "Processed {0} sources with {1} worker processes".format(
+                len(jobs), processes))
+        for stage in ('fetch', 'convert', 'parse', 'write'):
+            self.stdout.write(
+                "  {0}: {1:.1f}s".format(stage, timings[stage]))
+
+        if failures:
+            for source, stage, error in failures:
+                message = "Processing {0} ({1}) failed at the {2} stage:\n{3}"
+                self.stderr.write(
+                    message.format(source, source.id, stage, error))
+            raise CommandError(
+                "{0} sources could not be processed".format(len(failures)))
@@ -1,3 +1,4 @@
+from collections import defaultdict
 import re
 
 from django.db import models
@@ -11,18 +12,38 @@ from pombola.hansard.constants import NAME_SUBSTRING_MATCH, NAME_SET_INTERSECTIO
 
 class EntryQuerySet(models.query.QuerySet):
     def monthly_appearance_counts(self):
-        """Return an list of dictionaries for dates and counts for each month"""
-
-        # would prefer to do this as a single query but I can't seem to make the ORM do that.
-
-        dates = self.dates('sitting__start_date','month', 'DESC')
-        counts = []
-
-        for d in dates:
-            qs = self.filter(sitting__start_date__month=d.month, sitting__start_date__year=d.year)
-            counts.append(dict(date=d, count=qs.count()))
+        """Return an list of dictionaries for dates and counts for each month
+
+        The counts are found with a single query grouped by the sitting
+        date, and then totalled for each month here, since the ORM can't
+        truncate dates to months in a GROUP BY."""
+
+        daily_counts = (
+            self
+            # Clear the default ordering so that it's not in the GROUP BY:
+            .order_by()
+            .values_list('sitting__start_date')
+            .annotate(count=models.Count('id'))
+        )
 
-        return counts
+        monthly_counts = defaultdict(int)
+        for day, count in daily_counts:
+            monthly_counts[day.replace(day=1)] += count
+
+        return [
+            dict(date=month, count=monthly_counts[month])
+            for month in sorted(monthly_counts, reverse=True)
+        ]
+
+    def speaker_counts(self):
+        """Return a dictionary mapping speaker ids to their number of entries"""
+        return dict(
+            self
+            .filter(speaker__isnull=False)
+            .order_by()
+            .values_list('speaker_id')
+            .annotate(count=models.Count('id'))
+        )
 
     def unassigned_speeches(self):
         """All speeches that do not have a speaker assigned"""
@@ -83,30 +104,19 @@ class Entry(HansardModelBase):
 
     @classmethod
     def assign_speakers(cls, name_matching_algorithm=NAME_SET_INTERSECTION_MATCH):
-        """Go through all entries and assign speakers"""
-
-        entries = cls.objects.all().unassigned_speeches()
+        """Go through all entries and assign speakers
 
-        # create an in memory cache of speaker names and the sitting dates, to
-        # avoid hitting the db as badly with all the repeated requests
-        cache = {}
+        This resolves every unassigned speech in a single pass, using
+        in-memory indexes of the aliases and politicians (see
+        pombola.hansard.speaker_resolver), with the same results as
+        calling possible_matching_speakers(update_aliases=True) on
+        each of them."""
 
-        for entry in entries:
-            cache_key = "%s-%s" % (entry.sitting.start_date, entry.speaker_name)
+        # Imported here to avoid a circular import:
+        from pombola.hansard.speaker_resolver import SpeakerResolver
 
-            if cache_key in cache:
-                speakers = cache[cache_key]
-            else:
-                speakers = entry.possible_matching_speakers(
-                    update_aliases=True,
-                    name_matching_algorithm=name_matching_algorithm,
-                    )
-                cache[cache_key] = speakers
-
-            if speakers and len(speakers) == 1:
-                speaker = speakers[0]
-                entry.speaker = speaker
-                entry.save()
+        resolver = SpeakerResolver(name_matching_algorithm=name_matching_algorithm)
+        return resolver.assign_speakers(cls.objects.all().unassigned_speeches())
 
     def alias_match_score(self, name_one, name_two):
         """
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent when the entries for a sitting have been created in bulk (which
+# doesn't send post_save for each of them):
+entries_created = Signal(providing_args=['sitting'])
@@ -0,0 +1,260 @@
+"""Assign speakers to many hansard entries at once
+
+Entry.possible_matching_speakers looks up the alias and the
+politicians at the time of the sitting with fresh queries for every
+speaker name it's asked about, which is very slow when reprocessing a
+large backlog of entries.  SpeakerResolver instead loads the aliases,
+the politicians and their positions into memory once, indexes the
+politicians' names by token, and then works through every unassigned
+speech in a single pass, writing the results back with bulk updates.
+
+The results should be the same as calling possible_matching_speakers
+for each entry in turn, as Entry.assign_speakers used to do."""
+
+from collections import defaultdict
+import re
+
+from django.db import transaction
+
+from pombola.core.models import Position
+from pombola.hansard.constants import (
+    NAME_SUBSTRING_MATCH, NAME_SET_INTERSECTION_MATCH
+)
+from pombola.hansard.models import Alias, Entry
+
+
+def name_tokens(name):
+    """Return the set of tokens in a name, as used by Entry.alias_match_score"""
+    return set(
+        token for token in re.sub('[^A-Za-z]', ' ', name).split()
+        if len(token) > 1
+    )
+
+
+class Politician(object):
+
+    def __init__(self, person_id, title, legal_name, sort_name):
+        self.person_id = person_id
+        self.title = title
+        self.legal_name = legal_name
+        self.sort_name = sort_name
+        self.full_name = '%s %s' % (title, legal_name)
+        # The (active_from, active_until) dates of political positions:
+        self.political_periods = []
+        # The names of the titles of all positions:
+        self.position_title_names = set()
+
+    def is_politician(self, when):
+        return any(
+            active_from <= when <= active_until
+            for active_from, active_until in self.political_periods
+        )
+
+    def has_position_title_containing(self, s):
+        return any(s in name for name in self.position_title_names)
+
+
+class SpeakerResolver(object):
+
+    def __init__(self, name_matching_algorithm=NAME_SET_INTERSECTION_MATCH):
+        self.name_matching_algorithm = name_matching_algorithm
+        # An instance just for calling alias_match_score:
+        self.scoring_entry = Entry()
+
+        self.load_politicians()
+        self.load_aliases()
+
+        self.aliases_to_delete = set()
+        self.aliases_to_create = set()
+
+    def load_politicians(self):
+        """Load everyone who's ever had a political position into memory"""
+        self.politicians = {}
+        political_positions = Position.objects.political() \
+            .filter(person__hidden=False) \
+            .order_by() \
+            .values_list(
+                'person_id',
+                'person__title',
+                'person__legal_name',
+                'person__sort_name',
+                'active_from',
+                'active_until',
+            )
+        for (person_id, title, legal_name, sort_name,
+             active_from, active_until) in political_positions:
+            politician = self.politicians.get(person_id)
+            if politician is None:
+                politician = Politician(person_id, title, legal_name, sort_name)
+                self.politicians[person_id] = politician
+            politician.political_periods.append((active_from, active_until))
+
+        all_position_titles = Position.objects \
+            .filter(person__in=self.politicians.keys(), title__isnull=False) \
+            .order_by() \
+            .values_list('person_id', 'title__name') \
+            .distinct()
+        for person_id, title_name in all_position_titles:
+            self.politicians[person_id].position_title_names.add(title_name)
+
+        # An inverted index from each token in a politician's name to
+        # the IDs of politicians with that token in their names:
+        self.token_index = defaultdict(set)
+        for politician in self.politicians.values():
+            for token in name_tokens(politician.full_name):
+                self.token_index[token].add(politician.person_id)
+
+        self.sorted_politicians = sorted(
+            self.politicians.values(),
+            key=lambda p: (p.sort_name, p.person_id)
+        )
+
+    def load_aliases(self):
+        """Load every alias into a dictionary keyed on the alias"""
+        self.aliases = {}
+        for alias_id, alias, person_id, ignored in \
+                Alias.objects.values_list('id', 'alias', 'person_id', 'ignored'):
+            self.aliases[alias] = {
+                'id': alias_id,
+                'person_id': person_id,
+                'ignored': ignored,
+            }
+
+    def matching_politicians(self, name, sitting_date, venue_name, source_name):
+        """Return the politicians at sitting_date that might be called name
+
+        This does the same matching as the person_search part of
+        Entry.possible_matching_speakers, but in memory."""
+
+        if self.name_matching_algorithm == NAME_SUBSTRING_MATCH:
+            stripped_name = re.sub(r'^\w+\.\s', '', name).lower()
+            results = [
+                p for p in self.sorted_politicians
+                if stripped_name in p.legal_name.lower()
+                and p.is_politician(sitting_date)
+            ]
+            if len(results) > 1 and 'Joint Sitting' not in source_name:
+                if venue_name == 'Senate':
+                    title_substring = 'Senator'
+                else:
+                    title_substring = venue_name
+                current_house = [
+                    p for p in results
+                    if p.has_position_title_containing(title_substring)
+                ]
+                if current_house:
+                    results = current_house
+            return results
+
+        if self.name_matching_algorithm == NAME_SET_INTERSECTION_MATCH:
+            # A score of more than 1 needs at least two tokens in
+            # common, so only consider politicians who have that:
+            token_matches = defaultdict(int)
+            for token in name_tokens(name):
+                for person_id in self.token_index.get(token, ()):
+                    token_matches[person_id] += 1
+            candidates = sorted(
+                (
+                    self.politicians[person_id]
+                    for person_id, count in token_matches.items()
+                    if count > 1
+                ),
+                key=lambda p: (p.sort_name, p.person_id)
+            )
+            scored = []
+            for p in candidates:
+                if not p.is_politician(sitting_date):
+                    continue
+                score = self.scoring_entry.alias_match_score(p.full_name, name)
+                if score > 1:
+                    scored.append((score, p))
+            scored.sort(key=lambda t: t[0], reverse=True)
+            return [p for _, p in scored]
+
+        return [
+            p for p in self.sorted_politicians if p.is_politician(sitting_date)
+        ]
+
+    def possible_speaker_ids(self, speaker_name, sitting_date, venue_name, source_name):
+        """Return the IDs of people who might be the speaker
+
+        As with Entry.possible_matching_speakers(update_aliases=True),
+        this may delete unassigned aliases or create new ones, but
+        those changes are only recorded in memory until save_aliases
+        is called."""
+
+        name = Alias.clean_up_name(speaker_name)
+
+        alias = self.aliases.get(name)
+        if alias:
+            if alias['ignored']:
+                return []
+            elif alias['person_id']:
+                return [alias['person_id']]
+            # Otherwise the alias is unassigned, so check in case new
+            # people have been added since the last run.
+
+        results = self.matching_politicians(
+            name, sitting_date, venue_name, source_name)
+        found_one_result = len(results) == 1
+
+        if found_one_result and alias:
+            del self.aliases[name]
+            if alias['id'] is None:
+                self.aliases_to_create.discard(name)
+            else:
+                self.aliases_to_delete.add(alias['id'])
+
+        if not alias and not found_one_result and not Alias.can_ignore_name(name):
+            self.aliases[name] = {
+                'id': None,
+                'person_id': None,
+                'ignored': False,
+            }
+            self.aliases_to_create.add(name)
+
+        return [p.person_id for p in results]
+
+    def assign_speakers(self, entries):
+        """Find the speaker for each of entries, and save the results
+
+        Returns the number of entries a speaker was assigned to."""
+
+        speaker_ids_cache = {}
+        person_id_to_entry_ids = defaultdict(list)
+
+        entry_rows = entries.values_list(
+            'id',
+            'speaker_name',
+            'sitting__start_date',
+            'sitting__venue__name',
+            'sitting__source__name',
+        )
+        for entry_id, speaker_name, sitting_date, venue_name, source_name in entry_rows:
+            cache_key = (sitting_date, speaker_name)
+            if cache_key in speaker_ids_cache:
+                speaker_ids = speaker_ids_cache[cache_key]
+            else:
+                speaker_ids = self.possible_speaker_ids(
+                    speaker_name, sitting_date, venue_name, source_name)
+                speaker_ids_cache[cache_key] = speaker_ids
+            if len(speaker_ids) == 1:
+                person_id_to_entry_ids[speaker_ids[0]].append(entry_id)
+
+        with transaction.atomic():
+            self.save_aliases()
+            for person_id, entry_ids in person_id_to_entry_ids.items():
+                Entry.objects.filter(id__in=entry_ids).update(speaker=person_id)
+
+        return sum(len(ids) for ids in person_id_to_entry_ids.values())
+
+    def save_aliases(self):
+        if self.aliases_to_delete:
+            Alias.objects.filter(id__in=self.aliases_to_delete).delete()
+        if self.aliases_to_create:
+            Alias.objects.bulk_create([
+                Alias(alias=name, ignored=False, person=None)
+                for name in sorted(self.aliases_to_create)
+            ])
+        self.aliases_to_delete = set()
+        self.aliases_to_create = set()
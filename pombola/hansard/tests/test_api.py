@@ -0,0 +1,132 @@
+from datetime import date
+import json
+
+from django.test import TestCase
+
+from pombola.core.models import Person
+from pombola.hansard.models import Entry, Sitting, Source, Venue
+
+
+class HansardAPITest(TestCase):
+
+    def setUp(self):
+        source = Source.objects.create(
+            date=date(2014, 1, 1),
+            name='Test Source',
+        )
+        self.assembly = Venue.objects.create(
+            name='National Assembly',
+            slug='national-assembly',
+        )
+        self.senate = Venue.objects.create(
+            name='Senate',
+            slug='senate',
+        )
+        self.person = Person.objects.create(
+            legal_name='Jo Bloggs',
+            slug='jo-bloggs',
+        )
+        self.sittings = []
+        for i, venue in enumerate((self.assembly, self.senate, self.assembly)):
+            sitting = Sitting.objects.create(
+                source=source,
+                venue=venue,
+                start_date=date(2014, 1, 1 + i),
+            )
+            self.sittings.append(sitting)
+            for text_counter in range(3):
+                Entry.objects.create(
+                    sitting=sitting,
+                    type='speech',
+                    page_number=1,
+                    text_counter=text_counter,
+                    speaker_name='Jo Bloggs',
+                    speaker=self.person if text_counter == 0 else None,
+                    content='Entry {0}'.format(text_counter),
+                )
+
+    def get_json(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_entries_are_paginated_by_cursor(self):
+        ids = []
+        url = '/api/v0.1/hansard/entries/'
+        params = {'page_size': 4}
+        while url:
+            data = self.get_json(url, **params)
+            ids.extend(entry['id'] for entry in data['results'])
+            url, params = data['next'], {}
+        self.assertEqual(
+            ids,
+            list(Entry.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_sittings_on_the_same_date_are_paginated(self):
+        source = Source.objects.get()
+        for venue in (self.senate, self.assembly, self.senate):
+            Sitting.objects.create(
+                source=source,
+                venue=venue,
+                start_date=date(2014, 1, 2),
+            )
+        ids = []
+        url = '/api/v0.1/hansard/sittings/'
+        params = {'page_size': 2}
+        while url:
+            data = self.get_json(url, **params)
+            ids.extend(sitting['id'] for sitting in data['results'])
+            url, params = data['next'], {}
+        self.assertEqual(
+            ids,
+            list(Sitting.objects.order_by('start_date', 'id')
+                 .values_list('id', flat=True)))
+
+    def test_entry_filters(self):
+        data = self.get_json(
+            '/api/v0.1/hansard/entries/',
+            venue='national-assembly',
+            date_from='2014-01-02',
+        )
+        self.assertEqual(
+            set(entry['content'] for entry in data['results']),
+            set(['Entry 0', 'Entry 1', 'Entry 2']))
+        self.assertEqual(len(data['results']), 3)
+
+        data = self.get_json('/api/v0.1/hansard/entries/', speaker='jo-bloggs')
+        self.assertEqual(len(data['results']), 3)
+
+        response = self.client.get(
+            '/api/v0.1/hansard/entries/', {'date_to': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_sitting_list_filters(self):
+        data = self.get_json('/api/v0.1/hansard/sittings/', venue='national-assembly')
+        self.assertEqual(
+            [sitting['id'] for sitting in data['results']],
+            [self.sittings[0].id, self.sittings[2].id])
+
+    def test_sitting_detail_includes_entries(self):
+        sitting = self.sittings[1]
+        data = self.get_json('/api/v0.1/hansard/sittings/{0}/'.format(sitting.id))
+        self.assertEqual(
+            [entry['text_counter'] for entry in data['entries']],
+            [0, 1, 2])
+        self.assertEqual(
+            data['entries'][0]['speaker'],
+            {'id': self.person.id, 'legal_name': 'Jo Bloggs', 'slug': 'jo-bloggs'})
+        self.assertIsNone(data['entries'][1]['speaker'])
+
+    def test_export(self):
+        entries = list(Entry.objects.order_by('id'))
+        response = self.client.get(
+            '/api/v0.1/hansard/entries/export/', {'after': entries[2].id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [
+            json.loads(line)
+            for line in ''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual([row['id'] for row in rows], [e.id for e in entries[3:]])
+        self.assertEqual(rows[0]['venue'], 'senate')
+        self.assertEqual(rows[0]['start_date'], '2014-01-02')
@@ -2,7 +2,7 @@ from datetime import date
 
 from django.test import TestCase
 from pombola.core.models import Person, Place, PlaceKind, Position, PositionTitle
-from pombola.hansard.models import Source, Sitting, Venue, Entry
+from pombola.hansard.models import Alias, Source, Sitting, Venue, Entry
 from pombola.hansard.models.entry import NAME_SUBSTRING_MATCH
 
 
@@ -153,3 +153,74 @@ class HansardEntryTest(TestCase):
             self.mp,
             possible_speakers[0]
         )
+
+    def test_assign_speakers_substring_match(self):
+        self.na_sitting.save()
+        self.senate_sitting.save()
+        entries = []
+        for sitting in (self.na_sitting, self.senate_sitting):
+            for text_counter, speaker_name in enumerate(('Jones', 'Mr. Nobody')):
+                entries.append(Entry.objects.create(
+                    sitting       = sitting,
+                    type          = 'speech',
+                    page_number   = 12,
+                    text_counter  = text_counter,
+                    speaker_name  = speaker_name,
+                    content       = 'test',
+                ))
+
+        self.assertEqual(
+            2, Entry.assign_speakers(name_matching_algorithm=NAME_SUBSTRING_MATCH))
+
+        na_jones, na_nobody, senate_jones, senate_nobody = [
+            Entry.objects.get(pk=e.pk) for e in entries
+        ]
+        self.assertEqual(self.mp, na_jones.speaker)
+        self.assertEqual(self.senator, senate_jones.speaker)
+        self.assertIsNone(na_nobody.speaker)
+        self.assertIsNone(senate_nobody.speaker)
+        # An alias should have been created, just once, for the
+        # unmatched name:
+        self.assertEqual(
+            ['Mr. Nobody'],
+            list(Alias.objects.all().unassigned().values_list('alias', flat=True))
+        )
+
+    def test_monthly_appearance_counts(self):
+        sitting_dates = (
+            date(2011, 11, 15),
+            date(2011, 11, 16),
+            date(2011, 12, 1),
+            date(2012, 2, 29),
+        )
+        for sitting_date in sitting_dates:
+            sitting = Sitting.objects.create(
+                source     = self.source,
+                venue      = self.na_sitting.venue,
+                start_date = sitting_date,
+            )
+            for text_counter in range(2):
+                Entry.objects.create(
+                    sitting       = sitting,
+                    type          = 'speech',
+                    page_number   = 12,
+                    text_counter  = text_counter,
+                    speaker_name  = 'Jones',
+                    speaker       = self.mp,
+                    content       = 'test',
+                )
+
+        with self.assertNumQueries(1):
+            counts = Entry.objects.filter(speaker=self.mp).monthly_appearance_counts()
+        self.assertEqual(
+            [
+                dict(date=date(2012, 2, 1), count=2),
+                dict(date=date(2011, 12, 1), count=2),
+                dict(date=date(2011, 11, 1), count=4),
+            ],
+            counts
+        )
+        self.assertEqual(
+            {self.mp.id: 8},
+            Entry.objects.all().speaker_counts()
+        )
@@ -155,14 +155,12 @@ def person_summary(request, slug):
 
     lifetime_summary = entries_qs.monthly_appearance_counts()
 
-
-
     return render_to_response(
         'hansard/person_summary.html',
         {
             'person':           person,
             'entry_count':      entries_qs.count(),
-            'recent_entries':   entries_qs.all().order_by('-sitting__start_date')[0:5],
+            'recent_entries':   entries_qs.select_related('sitting__venue').order_by('-sitting__start_date')[0:5],
             'lifetime_summary': lifetime_summary,
         },
         context_instance=RequestContext(request)
@@ -192,6 +190,7 @@ class HansardPersonMixin(object):
 
     def get_context_data(self, **kwargs):
         context = super(HansardPersonMixin, self).get_context_data(**kwargs)
-        entries = Entry.objects.filter(speaker=self.object)
+        entries = Entry.objects.filter(speaker=self.object) \
+            .select_related('sitting__venue')
         context['hansard_entries'] = entries.order_by('-sitting__start_date')
         return context
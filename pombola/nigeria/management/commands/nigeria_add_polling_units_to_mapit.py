@@ -10,6 +10,8 @@ from django.core.management.base import BaseCommand
 
 from mapit import models
 
+from pombola.nigeria.polling_units import build_polling_unit_lookups
+
 
 class Command(BaseCommand):
 
@@ -44,6 +46,10 @@ class Command(BaseCommand):
         importer = PollUnitImporter(options)
         importer.process(atlas_filename)
 
+        # The precomputed PUN search lookups depend on these codes:
+        print "Rebuilding the polling unit lookups"
+        build_polling_unit_lookups()
+
 
 class PollUnitImporter(object):
 
@@ -0,0 +1,14 @@
+from django.core.management.base import NoArgsCommand
+
+from pombola.nigeria.polling_units import build_polling_unit_lookups
+
+
+class Command(NoArgsCommand):
+    help = 'Precompute the places each polling unit number is in, for PUN searches'
+
+    def handle_noargs(self, **options):
+        verbose = int(options['verbosity']) >= 2
+        count = build_polling_unit_lookups()
+        if verbose:
+            self.stdout.write(
+                "Created lookups for {0} polling unit numbers".format(count))
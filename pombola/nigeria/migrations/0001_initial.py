@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mapit', '0002_auto_20141218_1615'),
+        ('core', '0007_placeboundaryoverlap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollingUnitDistrict',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('district_type', models.CharField(max_length=3, choices=[(b'FED', b'Federal Constituency'), (b'SEN', b'Senatorial District')])),
+                ('rank', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'ordering': ['lookup', 'district_type', 'rank'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PollingUnitLookup',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('pun', models.CharField(unique=True, max_length=50)),
+                ('name', models.CharField(max_length=200)),
+                ('area', models.ForeignKey(related_name='+', to='mapit.Area')),
+                ('state', models.ForeignKey(related_name='+', blank=True, to='core.Place', null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='pollingunitdistrict',
+            name='lookup',
+            field=models.ForeignKey(related_name='districts', to='nigeria.PollingUnitLookup'),
+        ),
+        migrations.AddField(
+            model_name='pollingunitdistrict',
+            name='place',
+            field=models.ForeignKey(related_name='+', to='core.Place'),
+        ),
+    ]
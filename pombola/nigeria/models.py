@@ -0,0 +1,44 @@
+from django.db import models
+
+from mapit.models import Area
+
+from pombola.core.models import Place
+
+
+class PollingUnitLookup(models.Model):
+    """The places that a polling unit number prefix is in
+
+    There's one of these for every MapIt area with a 'poll_unit' code
+    (i.e. each state, LGA and ward), generated by the
+    nigeria_build_polling_unit_lookups management command, so that
+    NGSearchView doesn't need to do any spatial queries."""
+
+    pun = models.CharField(max_length=50, unique=True)
+    name = models.CharField(max_length=200)
+    area = models.ForeignKey(Area, related_name='+')
+    state = models.ForeignKey(Place, blank=True, null=True, related_name='+')
+
+    def __unicode__(self):
+        return u"{0} ({1})".format(self.pun, self.name)
+
+
+class PollingUnitDistrict(models.Model):
+    """A federal constituency or senatorial district that a PUN overlaps"""
+
+    district_type_choices = (
+        ('FED', 'Federal Constituency'),
+        ('SEN', 'Senatorial District'),
+    )
+
+    lookup = models.ForeignKey(PollingUnitLookup, related_name='districts')
+    district_type = models.CharField(max_length=3, choices=district_type_choices)
+    place = models.ForeignKey(Place, related_name='+')
+    # The districts of each type are ordered by how much they overlap
+    # with the polling unit's area, largest first:
+    rank = models.PositiveSmallIntegerField()
+
+    def __unicode__(self):
+        return u"{0}: {1} {2}".format(self.lookup.pun, self.district_type, self.place)
+
+    class Meta:
+        ordering = ['lookup', 'district_type', 'rank']
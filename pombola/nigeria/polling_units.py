@@ -0,0 +1,175 @@
+"""Look up the places a Nigerian polling unit number (PUN) is in
+
+Finding the federal constituencies and senatorial districts for a PUN
+means intersecting the polygons of its area with every district's, so
+build_polling_unit_lookups does that in advance for every MapIt area
+with a PUN and stores the results as PollingUnitLookup and
+PollingUnitDistrict objects.  lookup_polling_unit then resolves a PUN
+from those with two indexed queries."""
+
+import re
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from mapit.models import Area, Code, Name
+
+from pombola.core.models import Place
+from pombola.nigeria.models import PollingUnitDistrict, PollingUnitLookup
+
+
+def pun_prefixes(pun):
+    """Return pun and each shorter prefix of it, longest first
+
+    >>> pun_prefixes('ON:4:7')
+    ['ON:4:7', 'ON:4', 'ON']
+    >>> pun_prefixes('')
+    []
+    """
+    prefixes = []
+    while pun:
+        prefixes.append(pun)
+        # strip off last component
+        pun = re.sub(r'[^:]+$', '', pun)
+        pun = re.sub(r':$', '', pun)
+    return prefixes
+
+
+def find_matching_areas(code, polygons):
+    """Find MapIt areas of 'code' type that overlap with 'polygons'
+
+    Return every MapIt area of the specified type such that at
+    least 50% of polygons (a MultiPolygon) overlaps it; if there
+    are no such areas, just return the 5 MapIt areas of the right
+    type with the largest overlap
+    """
+
+    all_areas = Area.objects.filter(type__code=code, polygons__polygon__intersects=polygons).distinct()
+
+    area_of_original = polygons.area
+
+    size_of_overlap = {}
+
+    # calculate the overlap
+    for area in all_areas:
+        area_polygons = area.polygons.collect()
+        intersection = polygons.intersection(area_polygons)
+
+        size_of_overlap[area] = intersection.area / area_of_original
+
+    # Sort the results by the overlap size; largest overlap first
+    all_areas = sorted(all_areas,
+                       reverse=True,
+                       key=lambda a: size_of_overlap[a])
+
+    # get the most overlapping ones
+    likely_areas = [a for a in all_areas if size_of_overlap[a] > 0.5]
+
+    # If there are none display first five (better than nothing...)
+    if not likely_areas:
+        likely_areas = all_areas[:5]
+
+    return likely_areas
+
+
+def find_containing_area(area):
+    """Return area, or the nearest ancestor of it, that has polygons"""
+    area_for_polygons = area
+    while area_for_polygons and not area_for_polygons.polygons.exists():
+        area_for_polygons = area_for_polygons.parent_area
+    return area_for_polygons
+
+
+def build_polling_unit_lookups():
+    """Regenerate the PollingUnitLookup and PollingUnitDistrict tables
+
+    Returns the number of PollingUnitLookup objects created."""
+
+    area_id_to_code = dict(
+        Code.objects.filter(type__code='poll_unit').values_list('area_id', 'code'))
+    code_to_area_id = dict((code, area_id) for area_id, code in area_id_to_code.items())
+    area_id_to_name = dict(
+        Name.objects.filter(type__code='poll_unit').values_list('area_id', 'name'))
+    area_id_to_place_id = dict(
+        Place.objects.filter(mapit_area__isnull=False).values_list('mapit_area_id', 'id'))
+    areas = Area.objects.select_related('parent_area').in_bulk(area_id_to_code.keys())
+
+    # Many areas (e.g. wards without boundaries) share the polygons of
+    # a containing area, so the districts are only worked out once for
+    # each containing area:
+    districts_for_containing_area = {}
+
+    lookups = []
+    districts = {}
+    for area_id, pun in sorted(area_id_to_code.items(), key=lambda t: t[1]):
+        area = areas[area_id]
+        if ':' in pun:
+            state_area_id = code_to_area_id.get(pun.split(':')[0])
+        else:
+            state_area_id = area_id
+
+        lookups.append(PollingUnitLookup(
+            pun=pun,
+            name=area_id_to_name.get(area_id, area.name),
+            area=area,
+            state_id=area_id_to_place_id.get(state_area_id),
+        ))
+
+        containing_area = find_containing_area(area)
+        if containing_area is None:
+            continue
+        if containing_area.id not in districts_for_containing_area:
+            polygons = containing_area.polygons.collect()
+            districts_for_containing_area[containing_area.id] = dict(
+                (district_type, [
+                    area_id_to_place_id[a.id]
+                    for a in find_matching_areas(district_type, polygons)
+                    if a.id in area_id_to_place_id
+                ])
+                for district_type in ('FED', 'SEN')
+            )
+        districts[pun] = districts_for_containing_area[containing_area.id]
+
+    with transaction.atomic():
+        PollingUnitLookup.objects.all().delete()
+        PollingUnitLookup.objects.bulk_create(lookups, batch_size=1000)
+
+        # bulk_create doesn't set the IDs, so fetch them again:
+        pun_to_lookup_id = dict(
+            PollingUnitLookup.objects.values_list('pun', 'id'))
+        PollingUnitDistrict.objects.bulk_create(
+            [
+                PollingUnitDistrict(
+                    lookup_id=pun_to_lookup_id[pun],
+                    district_type=district_type,
+                    place_id=place_id,
+                    rank=rank,
+                )
+                for pun, pun_districts in districts.items()
+                for district_type, place_ids in pun_districts.items()
+                for rank, place_id in enumerate(place_ids)
+            ],
+            batch_size=1000,
+        )
+
+    return len(lookups)
+
+
+def lookup_polling_unit(pun):
+    """Return the PollingUnitLookup for the longest matching prefix of pun
+
+    Its districts are prefetched, ordered by how much they overlap
+    with the area.  If there's no match, this returns None."""
+    prefixes = pun_prefixes(pun)
+    if not prefixes:
+        return None
+    lookups = PollingUnitLookup.objects \
+        .filter(pun__in=prefixes) \
+        .select_related('area', 'state') \
+        .prefetch_related(Prefetch(
+            'districts',
+            queryset=PollingUnitDistrict.objects.select_related('place')))
+    # There's at most one lookup for each prefix, so just pick the
+    # longest in Python:
+    lookups = sorted(lookups, key=lambda l: len(l.pun), reverse=True)
+    return lookups[0] if lookups else None
@@ -1,7 +1,7 @@
 import unittest
 import doctest
 import re
-from . import views
+from . import polling_units, views
 
 from django.test import TestCase
 from django_webtest import WebTest
@@ -14,12 +14,15 @@ from info.models import InfoPage
 
 from pombola.core.models import (
     Place, PlaceKind, Person, Position, PositionTitle)
+from pombola.nigeria.polling_units import (
+    build_polling_unit_lookups, lookup_polling_unit)
 
 # Needed to run the doc tests in views.py
 
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(doctest.DocTestSuite(views))
+    suite.addTest(doctest.DocTestSuite(polling_units))
     return suite
 
 @attr(country='nigeria')
@@ -176,3 +179,22 @@ class NGSearchViewTest(WebTest):
             'Best match is the local government area "AKOKO SOUTH WEST" with poll unit number \'ON:4\'',
             response.content
         )
+
+    def test_lookup_polling_unit_uses_longest_prefix(self):
+        self.assertEqual(build_polling_unit_lookups(), 3)
+        with self.assertNumQueries(2):
+            lookup = lookup_polling_unit('ON:4:9')
+            self.assertEqual(lookup.pun, 'ON:4')
+            self.assertEqual(lookup.name, 'AKOKO SOUTH WEST')
+            self.assertEqual(lookup.area, self.mapit_test_lga)
+            self.assertEqual(lookup.state, self.place_state)
+            self.assertEqual(list(lookup.districts.all()), [])
+        self.assertIsNone(lookup_polling_unit('AB:1'))
+
+    def test_matching_ward_from_lookups(self):
+        build_polling_unit_lookups()
+        response = self.app.get("/search/?q=28/04/07")
+        self.assertIn(
+            'Best match is the ward "Test Ward" with poll unit number \'ON:4:7\'',
+            response.content
+        )
@@ -6,6 +6,9 @@ from info.models import InfoPage
 
 from pombola.core.models import Place
 from pombola.core.views import HomeView
+from pombola.nigeria.polling_units import (
+    find_containing_area, find_matching_areas, lookup_polling_unit
+)
 from pombola.search.views import SearchBaseView
 
 
@@ -142,6 +145,14 @@ class NGSearchView(SearchBaseView):
         query = tidy_up_pun(self.request.GET.get('q'))
         context['raw_query'] = query
         context['query'] = query
+
+        # Use the precomputed lookups if they've been built, since
+        # working out the districts involves slow spatial queries:
+        lookup = lookup_polling_unit(query)
+        if lookup:
+            self.add_context_from_lookup(context, lookup)
+            return context
+
         context['area'] = self.get_area_from_pun(query)
 
         # If area found find places of interest
@@ -180,6 +191,24 @@ class NGSearchView(SearchBaseView):
                 )
         return context
 
+    def add_context_from_lookup(self, context, lookup):
+        context['area'] = lookup.area
+        context['area_pun_code'] = lookup.pun
+        context['area_pun_name'] = lookup.name
+        context['state'] = lookup.state
+        context['area_pun_type'] = self.get_pun_type(lookup.pun)
+        context['governor'] = self.find_governor(lookup.state)
+
+        districts = lookup.districts.all()
+        context['federal_constituencies'] = self.get_district_data(
+            [d.place for d in districts if d.district_type == 'FED'],
+            "representative"
+        )
+        context['senatorial_districts'] = self.get_district_data(
+            [d.place for d in districts if d.district_type == 'SEN'],
+            "senator"
+        )
+
     def parse_params(self):
         super(NGSearchView, self).parse_params()
         tidied_as_if_pun = tidy_up_pun(self.query)
@@ -194,40 +223,10 @@ class NGSearchView(SearchBaseView):
         return super(NGSearchView, self).get(request, *args, **kwargs)
 
     def find_matching_places(self, code, polygons):
-        """Find MapIt areas of 'code' type that overlap with 'polygons'
-
-        Return every MapIt area of the specifiedE type such that at
-        least 50% of polygons (a MultiPolygon) overlaps it; if there
-        are no such areas, just return the 5 MapIt areas of the right
-        type with the largest overlap
-        """
-
-        all_areas = Area.objects.filter(type__code=code, polygons__polygon__intersects=polygons).distinct()
-
-        area_of_original = polygons.area
-
-        size_of_overlap = {}
-
-        # calculate the overlap
-        for area in all_areas:
-            area_polygons = area.polygons.collect()
-            intersection = polygons.intersection(area_polygons)
-
-            size_of_overlap[area] = intersection.area / area_of_original
-
-        # Sort the results by the overlap size; largest overlap first
-        all_areas = sorted(all_areas,
-                           reverse=True,
-                           key=lambda a: size_of_overlap[a])
-
-        # get the most overlapping ones
-        likely_areas = [a for a in all_areas if size_of_overlap[a] > 0.5]
-
-        # If there are none display first five (better than nothing...)
-        if not likely_areas:
-            likely_areas = all_areas[:5]
+        """Find places of 'code' type that overlap with 'polygons'
 
-        return self.convert_areas_to_places(likely_areas)
+        See find_matching_areas for which MapIt areas are returned."""
+        return self.convert_areas_to_places(find_matching_areas(code, polygons))
 
     def convert_areas_to_places(self, areas):
         places = []
@@ -278,10 +277,7 @@ class NGSearchView(SearchBaseView):
                 return governor[0][0]
 
     def find_containing_area(self, area):
-        area_for_polygons = area
-        while area_for_polygons and not area_for_polygons.polygons.exists():
-            area_for_polygons = area_for_polygons.parent_area
-        return area_for_polygons
+        return find_containing_area(area)
 
     def get_pun_type(self, pun):
         # use the length of the matched PUN to determine whether
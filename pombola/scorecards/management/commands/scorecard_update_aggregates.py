@@ -0,0 +1,23 @@
+from django.core.management.base import NoArgsCommand
+
+
+class Command(NoArgsCommand):
+    help = 'Recalculate the scorecard aggregates of every object with scorecard entries'
+    args = ''
+
+    def handle_noargs(self, **options):
+
+        from django.contrib.contenttypes.models import ContentType
+        from pombola.scorecards.models import Aggregate, Entry
+
+        verbose = int(options['verbosity']) >= 2
+
+        content_type_ids = set(
+            Entry.objects.order_by().values_list('content_type_id', flat=True).distinct())
+        content_type_ids.update(
+            Aggregate.objects.order_by().values_list('content_type_id', flat=True).distinct())
+
+        for content_type in ContentType.objects.filter(id__in=content_type_ids):
+            if verbose:
+                self.stdout.write("Updating aggregates for %s\n" % content_type)
+            Aggregate.update_for_objects(content_type)
@@ -10,7 +10,9 @@ class Command(NoArgsCommand):
     def handle_noargs(self, **options):
         # Imports are here to avoid an import loop created when the Hansard
         # search indexes are checked
+        from django.contrib.contenttypes.models import ContentType
         from pombola.core.models import Person
+        from pombola.hansard.models import Entry as HansardEntry
         from pombola.scorecards.models import Category, Entry
 
         # create the category
@@ -26,13 +28,23 @@ class Command(NoArgsCommand):
         duration_string = "six months"
         lower_limit = datetime.date.today() - datetime.timedelta(183)
 
+        # Count everyone's appearances, and find their existing entries, up front:
+        hansard_counts = HansardEntry.objects \
+            .filter(speaker__in=people, sitting__start_date__gte=lower_limit) \
+            .speaker_counts()
+        existing_entries = dict(
+            (entry.object_id, entry) for entry in Entry.objects.filter(
+                content_type=ContentType.objects.get_for_model(Person),
+                category=category,
+            # If there's more than one, use the most recent:
+            ).order_by('date')
+        )
+
         for person in people:
-            # NOTE: We could certainly do all this in a single query.
-            hansard_count = person.hansard_entries.filter(sitting__start_date__gte=lower_limit).count()
+            hansard_count = hansard_counts.get(person.id, 0)
 
-            try:
-                entry = person.scorecard_entries.get(category=category)
-            except Entry.DoesNotExist:
+            entry = existing_entries.get(person.id)
+            if entry is None:
                 entry = Entry(content_object=person, category=category)
 
             if hansard_count < 6:
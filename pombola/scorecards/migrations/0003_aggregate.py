@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def create_aggregates(apps, schema_editor):
+    Entry = apps.get_model('scorecards', 'Entry')
+    Aggregate = apps.get_model('scorecards', 'Aggregate')
+
+    aggregates = {}
+    for entry in Entry.objects.all():
+        key = (entry.content_type_id, entry.object_id, entry.category_id)
+        aggregate = aggregates.get(key)
+        if aggregate is None:
+            aggregate = aggregates[key] = Aggregate(
+                content_type_id=entry.content_type_id,
+                object_id=entry.object_id,
+                category_id=entry.category_id,
+                latest_date=entry.date,
+            )
+        if not entry.disabled:
+            aggregate.active_count += 1
+            aggregate.active_score_total += entry.score
+        if not (entry.disabled and entry.disabled_comment == ''):
+            aggregate.visible_count += 1
+        aggregate.latest_date = max(aggregate.latest_date, entry.date)
+
+    Aggregate.objects.bulk_create(aggregates.values(), batch_size=1000)
+
+
+def delete_aggregates(apps, schema_editor):
+    Aggregate = apps.get_model('scorecards', 'Aggregate')
+    Aggregate.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0001_initial'),
+        ('scorecards', '0002_datetimefield_remove_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Aggregate',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('object_id', models.PositiveIntegerField()),
+                ('active_count', models.PositiveIntegerField(default=0)),
+                ('active_score_total', models.IntegerField(default=0)),
+                ('visible_count', models.PositiveIntegerField(default=0)),
+                ('latest_date', models.DateField(null=True, blank=True)),
+                ('category', models.ForeignKey(to='scorecards.Category')),
+                ('content_type', models.ForeignKey(to='contenttypes.ContentType')),
+            ],
+            options={
+                'ordering': ('category',),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='aggregate',
+            unique_together=set([('content_type', 'object_id', 'category')]),
+        ),
+        migrations.RunPython(create_aggregates, delete_aggregates),
+    ]
@@ -1,3 +1,6 @@
+from __future__ import division
+
+from collections import defaultdict
 import datetime
 import dateutil.parser
 import csv
@@ -7,7 +10,10 @@ from django.contrib.contenttypes.fields import (
 )
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, IntegerField, Max, Sum, When
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 
 from markitup.fields import MarkupField
 
@@ -119,6 +125,8 @@ class Entry(models.Model):
     
         entries = []
         duplicate_catcher = {} # key is category_id-place_id-date, val is line number
+        # the objects whose aggregates need updating, keyed by content type id
+        changed_object_ids = defaultdict(set)
     
         # check that the headers are what we expect
     
@@ -218,10 +226,16 @@ class Entry(models.Model):
             entry['action'] = 'update' if obj.id else 'create'
     
             if save:
+                # the aggregates are updated once all the rows are saved
+                obj._skip_aggregate_update = True
                 obj.save()
+                changed_object_ids[obj.content_type_id].add(obj.object_id)
                 entry['action'] = 'saved'
                 
             entry['obj'] = obj
+
+        for content_type_id, object_ids in changed_object_ids.items():
+            Aggregate.update_for_objects(content_type_id, object_ids)
         
         error_count = sum( [ 1 if i['error'] else 0 for i in entries ] )
     
@@ -232,22 +246,150 @@ class Entry(models.Model):
         }
 
 
+class Aggregate(models.Model):
+    """Totals of the scorecard entries in a category for one object
+
+    These are kept up to date by the signal handlers below whenever an
+    Entry is saved or deleted, so that the overall scores can be found
+    without aggregating the entries each time they're shown.  Run the
+    scorecard_update_aggregates management command to rebuild them all
+    if entries have been changed without sending signals (e.g. with
+    QuerySet.update)."""
+
+    updated = models.DateTimeField(auto_now=True)
+
+    category = models.ForeignKey(Category)
+
+    content_type   = models.ForeignKey(ContentType)
+    object_id      = models.PositiveIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+
+    # The number of entries that aren't disabled, and their total score:
+    active_count       = models.PositiveIntegerField(default=0)
+    active_score_total = models.IntegerField(default=0)
+
+    # The number of entries that are shown - see visible_scorecards:
+    visible_count = models.PositiveIntegerField(default=0)
+
+    latest_date = models.DateField(blank=True, null=True)
+
+    class Meta():
+        ordering = ('category',)
+        unique_together = ('content_type', 'object_id', 'category')
+
+    def __unicode__(self):
+        return '%s for %s' % (self.category, self.content_object)
+
+    @property
+    def average_score(self):
+        if self.active_count:
+            return self.active_score_total / self.active_count
+
+    @classmethod
+    def update_for_objects(cls, content_type, object_ids=None):
+        """
+        Recalculate the aggregates of the objects of content_type (a
+        ContentType or its id) with the given ids, or of all of them if
+        object_ids is None.
+        """
+        content_type_id = getattr(content_type, 'id', content_type)
+        entries = Entry.objects.filter(content_type_id=content_type_id)
+        aggregates = cls.objects.filter(content_type_id=content_type_id)
+        if object_ids is not None:
+            object_ids = set(object_ids)
+            if not object_ids:
+                return
+            entries = entries.filter(object_id__in=object_ids)
+            aggregates = aggregates.filter(object_id__in=object_ids)
+
+        rows = (
+            entries
+            # Clear the default ordering so that it's not in the GROUP BY:
+            .order_by()
+            .values('object_id', 'category_id')
+            .annotate(
+                active_count=Sum(Case(
+                    When(disabled=False, then=1),
+                    default=0, output_field=IntegerField())),
+                active_score_total=Sum(Case(
+                    When(disabled=False, then='score'),
+                    default=0, output_field=IntegerField())),
+                visible_count=Sum(Case(
+                    When(disabled=True, disabled_comment='', then=0),
+                    default=1, output_field=IntegerField())),
+                latest_date=Max('date'),
+            )
+        )
+
+        with transaction.atomic():
+            aggregates.delete()
+            cls.objects.bulk_create(
+                [cls(content_type_id=content_type_id, **row) for row in rows],
+                batch_size=1000,
+            )
+
+    @classmethod
+    def for_objects(cls, objects):
+        """
+        Return a list of the aggregates of each of the objects, in the
+        same order as the objects, finding them all with one query.
+        """
+        keys = [
+            (ContentType.objects.get_for_model(o).id, o.pk) for o in objects]
+
+        ids_by_content_type = defaultdict(set)
+        for content_type_id, object_id in keys:
+            ids_by_content_type[content_type_id].add(object_id)
+
+        found = defaultdict(list)
+        if ids_by_content_type:
+            query = models.Q(pk__in=[])
+            for content_type_id, object_ids in ids_by_content_type.items():
+                query |= models.Q(
+                    content_type_id=content_type_id, object_id__in=object_ids)
+            for aggregate in cls.objects.filter(query).select_related('category'):
+                found[(aggregate.content_type_id, aggregate.object_id)].append(aggregate)
+
+        return [found[key] for key in keys]
+
+
+def prefetch_scorecard_aggregates(objects):
+    """
+    Fetch the scorecard aggregates of all the objects with one query,
+    so that their overall scores can be shown without any more queries
+    (e.g. in a list of constituencies).  Returns the objects as a list.
+    """
+    objects = list(objects)
+    for o, aggregates in zip(objects, Aggregate.for_objects(objects)):
+        o._prefetched_scorecard_aggregates = aggregates
+    return objects
+
+
 class ScorecardMixin(models.Model):
     """Mixin to add scorecard related methods to models"""
 
     # TODO - we should limit the scorecards to the newest in each category
 
     scorecard_entries = GenericRelation(Entry)
+    scorecard_aggregates = GenericRelation(Aggregate)
 
     # Show an overall score for this Item.
     # Set this to false in anything for which you only want the individual
     # scores and no average.
     is_overall_scorecard_score_applicable = True
 
+    def get_scorecard_aggregates(self):
+        """The aggregates for each category, from prefetch_scorecard_aggregates if used"""
+        try:
+            return self._prefetched_scorecard_aggregates
+        except AttributeError:
+            return list(self.scorecard_aggregates.select_related('category'))
+
     @property
     def show_overall_score(self):
         """Should we show an overall score? Yes if applicable and there are active scorecards"""
-        return self.is_overall_scorecard_score_applicable and self.active_scorecards().exists()
+        return self.is_overall_scorecard_score_applicable and \
+            any(a.active_count for a in self.get_scorecard_aggregates())
         
     def active_scorecards(self):
         return self.scorecard_entries.filter(disabled=False)
@@ -257,13 +399,13 @@ class ScorecardMixin(models.Model):
         return self.scorecard_entries.exclude(disabled=True, disabled_comment='')
 
     def scorecard_overall(self):
-        return self.active_scorecards().aggregate(models.Avg('score'))['score__avg']
+        return overall_score(self.get_scorecard_aggregates())
 
     def scorecard_overall_as_word(self):
         return Entry.score_to_word(self.scorecard_overall())
         
     def has_scorecards(self):
-        return self.visible_scorecards().exists()
+        return any(a.visible_count for a in self.get_scorecard_aggregates())
 
     def scorecards(self):
         return self.visible_scorecards()
@@ -272,6 +414,36 @@ class ScorecardMixin(models.Model):
        abstract = True
 
 
+def overall_score(aggregates):
+    """The average score of the active entries counted in the aggregates"""
+    count = sum(a.active_count for a in aggregates)
+    if count:
+        return sum(a.active_score_total for a in aggregates) / count
+
+
+@receiver(pre_save, sender=Entry)
+def note_previous_entry_object(sender, instance, raw, **kwargs):
+    # If an entry is moved to a different object, the aggregates of the
+    # object it was moved from need updating too:
+    instance._previous_object = None
+    if instance.pk and not raw:
+        instance._previous_object = sender.objects \
+            .filter(pk=instance.pk) \
+            .values_list('content_type_id', 'object_id') \
+            .first()
+
+
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+def update_entry_aggregates(sender, instance, **kwargs):
+    if getattr(instance, '_skip_aggregate_update', False):
+        return
+    current = (instance.content_type_id, instance.object_id)
+    previous = getattr(instance, '_previous_object', None)
+    for content_type_id, object_id in set([current, previous or current]):
+        Aggregate.update_for_objects(content_type_id, [object_id])
+
+
 
 # This is code to paste into the shell to create entries for all the
 # constiteuncies that do not have NTA data.
@@ -2,8 +2,103 @@
 Test that the scorecards works as expected
 """
 
+import datetime
+from StringIO import StringIO
+
 from django.test import TestCase
 
+from pombola.core.models import Place, PlaceKind
+from pombola.scorecards.models import (
+    Aggregate, Category, Entry, prefetch_scorecard_aggregates
+)
+
+
+class AggregateTest(TestCase):
+
+    def setUp(self):
+        kind = PlaceKind.objects.create(name='Constituency', slug='constituency')
+        self.places = [
+            Place.objects.create(
+                name='Place %d' % i, slug='place-%d' % i, kind=kind)
+            for i in range(3)
+        ]
+        self.category = Category.objects.create(
+            name='Test Category',
+            slug='test-category',
+            synopsis='Test synopsis',
+            description='Test description',
+        )
+
+    def add_entry(self, place, score, **kwargs):
+        return place.scorecard_entries.create(
+            category=self.category,
+            date=kwargs.pop('date', datetime.date(2014, 1, 1)),
+            remark='Test remark',
+            score=score,
+            **kwargs
+        )
+
+    def test_aggregates_follow_entry_changes(self):
+        place = self.places[0]
+        self.assertFalse(place.has_scorecards())
+        self.assertEqual(place.scorecard_overall(), None)
+
+        self.add_entry(place, 1)
+        entry = self.add_entry(place, -1, date=datetime.date(2014, 2, 1))
+        self.add_entry(place, 1, date=datetime.date(2014, 3, 1), disabled=True)
+
+        aggregate = Aggregate.objects.get(object_id=place.id)
+        self.assertEqual(aggregate.active_count, 2)
+        self.assertEqual(aggregate.visible_count, 2)
+        self.assertEqual(aggregate.latest_date, datetime.date(2014, 3, 1))
+        self.assertTrue(place.has_scorecards())
+        self.assertEqual(place.scorecard_overall(), 0)
+
+        entry.delete()
+        self.assertEqual(place.scorecard_overall(), 1)
+
+        # Moving an entry updates both objects' aggregates:
+        other_place = self.places[1]
+        entry = Entry.objects.get(object_id=place.id, disabled=False)
+        entry.content_object = other_place
+        entry.save()
+        self.assertFalse(place.has_scorecards())
+        self.assertEqual(other_place.scorecard_overall(), 1)
+
+    def test_prefetch_scorecard_aggregates(self):
+        self.add_entry(self.places[0], 1)
+        self.add_entry(self.places[1], -1)
+
+        places = list(
+            Place.objects.filter(id__in=[p.id for p in self.places]) \
+                .order_by('id'))
+        with self.assertNumQueries(1):
+            places = prefetch_scorecard_aggregates(places)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [p.scorecard_overall() for p in places],
+                [1, -1, None])
+            self.assertEqual(
+                [p.has_scorecards() for p in places],
+                [True, True, False])
+
+    def test_process_csv_updates_aggregates(self):
+        csv_file = StringIO(
+            'place_slug,category_slug,date,score,remark,extended_remark,'
+            'equivalent_remark,source_url,source_name\n'
+            'place-0,test-category,2014-01-01,1,Good,,,,\n'
+            'place-0,test-category,2014-02-01,0,Average,,,,\n'
+            'place-2,test-category,2014-01-01,-1,Bad,,,,\n'
+        )
+        results = Entry.process_csv(csv_file, save=True)
+        self.assertEqual(results['error_count'], 0)
+
+        self.assertEqual(self.places[0].scorecard_overall(), 0.5)
+        self.assertEqual(self.places[2].scorecard_overall(), -1)
+        self.assertEqual(
+            Aggregate.objects.get(object_id=self.places[0].id).latest_date,
+            datetime.date(2014, 2, 1))
+
 
 class DataTest(TestCase):
     pass
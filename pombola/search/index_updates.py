@@ -0,0 +1,30 @@
+from django.contrib.contenttypes.models import ContentType
+
+from pombola.search.models import IndexQueueItem
+from pombola.search.signals import is_indexed
+
+
+def update_search_index(model, object_ids):
+    """Queue many instances of model to be updated in the search index
+
+    This is for use after creating or changing objects in bulk
+    (e.g. with bulk_create or update) which bypasses the signal
+    processor.  The changes are added to the same queue as
+    QueuedSignalProcessor's, with a single insert, and are sent to the
+    search backend in batches by the search_process_index_queue
+    management command, so the caller never waits for the backend."""
+    object_ids = list(object_ids)
+    if not object_ids or not is_indexed(model):
+        return
+    content_type = ContentType.objects.get_for_model(model)
+    IndexQueueItem.objects.bulk_create(
+        [
+            IndexQueueItem(
+                content_type=content_type,
+                object_id=object_id,
+                action='update',
+            )
+            for object_id in object_ids
+        ],
+        batch_size=1000,
+    )
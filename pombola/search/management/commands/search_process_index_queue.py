@@ -0,0 +1,128 @@
+from collections import defaultdict
+from optparse import make_option
+import time
+
+from django.core.management.base import NoArgsCommand
+
+from haystack import connection_router, connections
+from haystack.exceptions import NotHandled
+
+from pombola.search.models import IndexQueueItem
+
+
+def process_queue_batch(batch_size):
+    """Send up to batch_size of the oldest queued changes to the search index
+
+    Only the most recent action for each object is applied, and each
+    model's updates are sent to the backend as a single request.
+    Returns a tuple of the number of queue items processed, the number
+    of objects updated and the number of objects removed."""
+
+    items = list(
+        IndexQueueItem.objects.select_related('content_type')[:batch_size]
+    )
+    if not items:
+        return 0, 0, 0
+
+    # The most recent action for each object; items are in the order
+    # they were queued:
+    latest_actions = {}
+    for item in items:
+        latest_actions[(item.content_type, item.object_id)] = item.action
+
+    to_update = defaultdict(set)
+    to_remove = defaultdict(set)
+    for (content_type, object_id), action in latest_actions.items():
+        if action == 'update':
+            to_update[content_type].add(object_id)
+        else:
+            to_remove[content_type].add(object_id)
+
+    updated = removed = 0
+    for content_type in set(to_update) | set(to_remove):
+        model = content_type.model_class()
+        if model is None:
+            continue
+        for using in connection_router.for_write(models=[model]):
+            try:
+                index = connections[using].get_unified_index().get_index(model)
+            except NotHandled:
+                continue
+            backend = connections[using].get_backend()
+
+            object_ids = to_update[content_type]
+            if object_ids:
+                objects = list(
+                    index.index_queryset(using=using).filter(pk__in=object_ids)
+                )
+                if objects:
+                    backend.update(index, objects)
+                updated += len(objects)
+                # Objects that were updated but are no longer in the
+                # index queryset (e.g. because they've been deleted
+                # since) should be removed:
+                found_ids = set(o.pk for o in objects)
+                to_remove[content_type] |= object_ids - found_ids
+
+            # Haystack backends have no bulk removal, so these are
+            # removed one at a time:
+            for object_id in to_remove[content_type]:
+                backend.remove('{0}.{1}.{2}'.format(
+                    content_type.app_label, content_type.model, object_id))
+                removed += 1
+
+    IndexQueueItem.objects.filter(id__in=[item.id for item in items]).delete()
+
+    return len(items), updated, removed
+
+
+class Command(NoArgsCommand):
+    help = 'Send queued changes from QueuedSignalProcessor to the search index'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--batch-size',
+            type='int',
+            dest='batch_size',
+            default=1000,
+            help='The number of queued changes to process at a time'
+        ),
+        make_option(
+            '--status',
+            action='store_true',
+            dest='status',
+            default=False,
+            help="Just report the queue's depth and lag, without processing it"
+        ),
+    )
+
+    def report_status(self):
+        lag = IndexQueueItem.objects.lag()
+        self.stdout.write("Queue depth: {0}".format(
+            IndexQueueItem.objects.depth()))
+        self.stdout.write("Queue lag: {0}".format(
+            "{0:.0f}s".format(lag.total_seconds()) if lag else "-"))
+
+    def handle_noargs(self, **options):
+        verbose = int(options['verbosity']) >= 2
+
+        if options['status']:
+            self.report_status()
+            return
+
+        start = time.time()
+        totals = [0, 0, 0]
+        while True:
+            counts = process_queue_batch(options['batch_size'])
+            if not counts[0]:
+                break
+            totals = [t + c for t, c in zip(totals, counts)]
+            if verbose:
+                self.stdout.write(
+                    "Processed {0} queued changes: {1} updated, {2} removed".format(
+                        *counts))
+
+        if verbose:
+            self.stdout.write(
+                "Processed {0} queued changes in {3:.1f}s: {1} updated, {2} removed".format(
+                    *(totals + [time.time() - start])))
@@ -0,0 +1,46 @@
+import datetime
+
+from django.db import models
+
+from django.contrib.contenttypes.models import ContentType
+
+
+class IndexQueueItemQuerySet(models.query.QuerySet):
+    def depth(self):
+        """The number of changes waiting to be sent to the search index"""
+        return self.count()
+
+    def lag(self):
+        """How long the oldest queued change has been waiting
+
+        Returns a datetime.timedelta, or None if the queue is empty."""
+        oldest = self.aggregate(oldest=models.Min('queued'))['oldest']
+        if oldest is None:
+            return None
+        return datetime.datetime.now() - oldest
+
+
+class IndexQueueItem(models.Model):
+    """A change to an object that should be reflected in the search index
+
+    These are created by QueuedSignalProcessor when indexed objects
+    are saved or deleted, and processed in batches by the
+    search_process_index_queue management command."""
+
+    action_choices = (
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+    )
+
+    content_type = models.ForeignKey(ContentType)
+    object_id    = models.PositiveIntegerField()
+    action       = models.CharField(max_length=10, choices=action_choices)
+    queued       = models.DateTimeField(auto_now_add=True)
+
+    objects = IndexQueueItemQuerySet.as_manager()
+
+    def __unicode__(self):
+        return "%s %s.%s" % (self.action, self.content_type, self.object_id)
+
+    class Meta:
+        ordering = ['id']
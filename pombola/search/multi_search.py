@@ -0,0 +1,80 @@
+"""Run several SearchQuerySets in a single request to Elasticsearch
+
+Each SearchQuerySet normally makes its own request to the search
+backend when it's counted and another when it's sliced, so a page
+that shows results from several queries makes many round trips.
+run_searches instead sends all of the queries, with the slices that
+are needed from each, as one Elasticsearch multi-search request, and
+returns the results and hit count for each of them.  For backends
+without multi-search support it falls back to running the queries one
+at a time."""
+
+from haystack.models import SearchResult
+
+
+def run_searches_separately(searches):
+    responses = []
+    for sqs, start, end in searches:
+        responses.append({
+            'results': list(sqs[start:end]) if end > start else [],
+            'hits': sqs.count(),
+        })
+    return responses
+
+
+def run_searches(searches):
+    """Return the results and hit count for each search in searches
+
+    searches should be a list of (sqs, start, end) tuples; for each
+    of these, a dictionary with 'results' (the results from start to
+    end, which may be the same to get just the count) and 'hits' (the
+    total number of matching documents) is returned."""
+
+    if not searches:
+        return []
+
+    backend = searches[0][0].query.backend
+    if not all(sqs.query.backend.connection_alias == backend.connection_alias
+               for sqs, start, end in searches):
+        return run_searches_separately(searches)
+    if not (hasattr(backend, 'build_search_kwargs') and
+            hasattr(getattr(backend, 'conn', None), 'msearch')):
+        return run_searches_separately(searches)
+
+    if not backend.setup_complete:
+        backend.setup()
+
+    body = []
+    search_params = []
+    for sqs, start, end in searches:
+        query_string = sqs.query.build_query()
+        params = sqs.query.build_params()
+        search_kwargs = backend.build_search_kwargs(query_string, **params)
+        search_kwargs['from'] = start
+        search_kwargs['size'] = end - start
+        body.append({})
+        body.append(search_kwargs)
+        search_params.append(params)
+
+    raw_responses = backend.conn.msearch(
+        body=body,
+        index=backend.index_name,
+        doc_type='modelresult',
+    )['responses']
+
+    responses = []
+    for raw_results, params in zip(raw_responses, search_params):
+        if 'error' in raw_results:
+            if not backend.silently_fail:
+                raise Exception(
+                    u"Elasticsearch multi-search failed: {0}".format(
+                        raw_results['error']))
+            backend.log.error(
+                "Failed to query Elasticsearch: %s", raw_results['error'])
+            raw_results = {}
+        responses.append(backend._process_results(
+            raw_results,
+            highlight=params.get('highlight'),
+            result_class=params.get('result_class') or SearchResult,
+        ))
+    return responses
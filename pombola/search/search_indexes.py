@@ -1,16 +1,18 @@
 from django.conf import settings
+from django.utils.html import format_html
 
 from haystack import indexes
+from sorl.thumbnail import get_thumbnail
 
 from pombola.core import models as core_models
 
-# TODO - currently this uses the realtime search index - which is possibly a bad
-# idea if the site gets heavy load. Switch to a queue as suggested in the docs:
+# Changes to these indexes are queued by QueuedSignalProcessor (in
+# pombola.search.signals) and applied in batches, as suggested here:
 #   http://docs.haystacksearch.org/dev/best_practices.html#use-of-a-queue-for-a-better-user-experience
 
-# TODO - all the search result html could be cached to save db access when
-# displaying results: Not done initially as the templates will keep changing
-# until the design is stable.
+# The fields needed to display autocomplete and search results for the
+# core models are stored in the index, so that they can be rendered
+# from the SearchResult without loading each object from the database:
 #   http://docs.haystacksearch.org/dev/best_practices.html#avoid-hitting-the-database
 
 # Note - these indexes could be specified in the individual apps, which might
@@ -19,27 +21,101 @@ from pombola.core import models as core_models
 class BaseIndex(indexes.SearchIndex):
     text = indexes.CharField(document=True, use_template=True)
 
-class PersonIndex(BaseIndex, indexes.Indexable):
+class CoreModelIndex(BaseIndex):
+    """An index that stores the fields needed to display a result"""
+
     name_auto = indexes.EdgeNgramField(model_attr='name')
+
+    url = indexes.CharField(indexed=False)
+    display_name = indexes.CharField(model_attr='name', indexed=False)
+    css_class = indexes.CharField(indexed=False)
+    show_active = indexes.BooleanField(indexed=False)
+    # The 16x16 thumbnail for autocomplete, and the 90x90 thumbnail
+    # for search results:
+    autocomplete_image_url = indexes.CharField(indexed=False)
+    image_url = indexes.CharField(indexed=False, null=True)
+    extra_autocomplete_data = indexes.CharField(indexed=False, null=True)
+
+    def prepare_url(self, obj):
+        return obj.get_absolute_url()
+
+    def prepare_css_class(self, obj):
+        return obj.css_class()
+
+    def prepare_show_active(self, obj):
+        return bool(obj.show_active)
+
+    def primary_image(self, obj):
+        if hasattr(obj, 'primary_image'):
+            return obj.primary_image()
+
+    def prepare_autocomplete_image_url(self, obj):
+        image = self.primary_image(obj)
+        if image:
+            return get_thumbnail(image, '16x16', crop="center").url
+        return "/static/images/" + obj.css_class() + "-16x16.jpg"
+
+    def prepare_image_url(self, obj):
+        image = self.primary_image(obj)
+        if image:
+            return get_thumbnail(image, '90x90', crop="center").url
+
+    def prepare_extra_autocomplete_data(self, obj):
+        return getattr(obj, 'extra_autocomplete_data', None)
+
+class PersonIndex(CoreModelIndex, indexes.Indexable):
     hidden = indexes.BooleanField(model_attr='hidden')
+    # The first few currently active positions, as HTML, and the
+    # total number of them:
+    active_positions = indexes.MultiValueField(indexed=False)
+    active_positions_count = indexes.IntegerField(indexed=False)
 
     def get_model(self):
         return core_models.Person
 
-class PlaceIndex(BaseIndex, indexes.Indexable):
-    name_auto = indexes.EdgeNgramField(model_attr='name')
+    def prepare_active_positions(self, obj):
+        positions = obj.position_set.all().currently_active() \
+            .select_related('title', 'organisation')[:4]
+        result = []
+        for position in positions:
+            title_name = position.title.name if position.title else ''
+            if position.organisation and position.organisation.name:
+                result.append(format_html(
+                    u'<strong>{0}</strong> of {1};',
+                    title_name, position.organisation.name))
+            else:
+                result.append(format_html(u'<strong>{0}</strong>', title_name))
+        return result
+
+    def prepare_active_positions_count(self, obj):
+        return obj.position_set.all().currently_active().count()
+
+class PlaceIndex(CoreModelIndex, indexes.Indexable):
+    kind_name = indexes.CharField(model_attr='kind__name', indexed=False)
+    summary = indexes.CharField(indexed=False)
+    session_name = indexes.CharField(indexed=False, null=True)
+    # Used to pick the newest of places with the same name in
+    # autocomplete results:
+    session_end_date = indexes.DateField(
+        model_attr='parliamentary_session__end_date', indexed=False, null=True)
 
     def get_model(self):
         return core_models.Place
 
-class OrganisationIndex(BaseIndex, indexes.Indexable):
-    name_auto = indexes.EdgeNgramField(model_attr='name')
+    def prepare_summary(self, obj):
+        return unicode(obj.summary)
+
+    def prepare_session_name(self, obj):
+        if obj.parliamentary_session:
+            return unicode(obj.parliamentary_session)
+
+class OrganisationIndex(CoreModelIndex, indexes.Indexable):
+    kind_name = indexes.CharField(model_attr='kind__name', indexed=False)
 
     def get_model(self):
         return core_models.Organisation
 
-class PositionTitleIndex(BaseIndex, indexes.Indexable):
-    name_auto = indexes.EdgeNgramField(model_attr='name')
+class PositionTitleIndex(CoreModelIndex, indexes.Indexable):
 
     def get_model(self):
         return core_models.PositionTitle
@@ -51,16 +127,22 @@ if settings.ENABLED_FEATURES['hansard']:
         start_date = indexes.DateTimeField(null=True)
         sitting_start_date = indexes.DateField(model_attr='sitting__start_date')
 
+        url = indexes.CharField(indexed=False)
+        sitting_name = indexes.CharField(model_attr='sitting__name', indexed=False)
+
         def get_model(self):
             return hansard_models.Entry
 
         def index_queryset(self, using=None):
             """Used when the entire index for model is updated."""
-            return self.get_model().objects.select_related('sitting')
+            return self.get_model().objects.select_related('sitting__venue')
 
         def prepare_start_date(self, obj):
             return obj.sitting.start_date
 
+        def prepare_url(self, obj):
+            return obj.get_absolute_url()
+
 if 'info' in settings.INSTALLED_APPS:
     from info.models import InfoPage
 
@@ -0,0 +1,69 @@
+from django.db import models
+
+from haystack import connection_router, connections
+from haystack.exceptions import NotHandled
+from haystack.signals import BaseSignalProcessor
+
+
+def is_indexed(model):
+    """Return True if model has a search index on any write connection"""
+    for using in connection_router.for_write(models=[model]):
+        try:
+            connections[using].get_unified_index().get_index(model)
+        except NotHandled:
+            continue
+        return True
+    return False
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """Queue changes to indexed objects instead of updating the index
+
+    RealtimeSignalProcessor sends a request to the search backend for
+    every save or delete, within the request that made the change.
+    This instead just records the change in the IndexQueueItem table,
+    and the search_process_index_queue management command sends the
+    queued changes to the search backend in batches."""
+
+    def setup(self):
+        models.signals.post_save.connect(self.handle_save)
+        models.signals.post_delete.connect(self.handle_delete)
+
+    def teardown(self):
+        models.signals.post_save.disconnect(self.handle_save)
+        models.signals.post_delete.disconnect(self.handle_delete)
+
+    def related_objects(self, sender, instance):
+        """Return (model, pk) for other objects whose index data includes instance
+
+        The search results for people show their current positions,
+        so the person should be reindexed when one of them changes."""
+        from pombola.core.models import Person, Position
+
+        if sender is Position and instance.person_id:
+            return [(Person, instance.person_id)]
+        return []
+
+    def enqueue(self, model, object_id, action):
+        # Import here to avoid loading models while the app registry
+        # is being populated:
+        from django.contrib.contenttypes.models import ContentType
+        from pombola.search.models import IndexQueueItem
+
+        if not is_indexed(model):
+            return
+        IndexQueueItem.objects.create(
+            content_type=ContentType.objects.get_for_model(model),
+            object_id=object_id,
+            action=action,
+        )
+
+    def handle_save(self, sender, instance, **kwargs):
+        self.enqueue(sender, instance.pk, 'update')
+        for model, object_id in self.related_objects(sender, instance):
+            self.enqueue(model, object_id, 'update')
+
+    def handle_delete(self, sender, instance, **kwargs):
+        self.enqueue(sender, instance.pk, 'delete')
+        for model, object_id in self.related_objects(sender, instance):
+            self.enqueue(model, object_id, 'update')
@@ -6,6 +6,8 @@ from django.utils import unittest
 from django.utils.text import slugify
 from django.core.urlresolvers import reverse
 from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from pombola.core.models import Person
 
@@ -88,3 +90,27 @@ class AutocompleteTest(unittest.TestCase):
                 set(expected_output),
                 msg="\n\nTesting input: '%s'" % test_input
             )
+
+    def test_autocomplete_uses_stored_fields(self):
+        c = Client()
+
+        # Everything needed for the response should come from the
+        # fields stored in the search index:
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get(reverse('autocomplete'), {'term': 'bob'})
+        self.assertEqual(len(queries), 0)
+
+        bobby = Person.objects.get(slug='bobby-smith')
+        self.assertEqual(
+            json.loads(response.content),
+            [
+                {
+                    'url': bobby.get_absolute_url(),
+                    'name': 'Bobby Smith',
+                    'image_url': '/static/images/person-16x16.jpg',
+                    'extra_data': None,
+                    'type': 'person',
+                    'value': 'Bobby Smith',
+                },
+            ]
+        )
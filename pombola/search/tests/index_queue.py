@@ -0,0 +1,114 @@
+import datetime
+from StringIO import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from haystack import connection_router, connections
+from mock import patch
+
+from django_date_extensions.fields import ApproximateDate
+
+from pombola.core.models import Person, Position, PositionTitle
+from pombola.search.index_updates import update_search_index
+from pombola.search.management.commands.search_process_index_queue import (
+    process_queue_batch
+)
+from pombola.search.models import IndexQueueItem
+from pombola.search.signals import QueuedSignalProcessor
+
+
+class QueuedSignalProcessorTest(TestCase):
+
+    def setUp(self):
+        self.signal_processor = QueuedSignalProcessor(
+            connections, connection_router)
+
+    def tearDown(self):
+        self.signal_processor.teardown()
+
+    def test_changes_are_queued_and_batched(self):
+        backend_class = type(connections['default'].get_backend())
+        with patch.object(backend_class, 'update'), \
+                patch.object(backend_class, 'remove'):
+            alice = Person.objects.create(
+                legal_name='Alice Smith', slug='alice-smith')
+            bob = Person.objects.create(
+                legal_name='Bob Jones', slug='bob-jones')
+            alice.legal_name = 'Alice Jones'
+            alice.save()
+            bob_id = bob.id
+            bob.delete()
+
+        self.assertEqual(
+            list(IndexQueueItem.objects.values_list('object_id', 'action')),
+            [
+                (alice.id, 'update'),
+                (bob_id, 'update'),
+                (alice.id, 'update'),
+                (bob_id, 'delete'),
+            ]
+        )
+        self.assertEqual(IndexQueueItem.objects.depth(), 4)
+        self.assertIsNotNone(IndexQueueItem.objects.lag())
+
+        with patch.object(backend_class, 'update') as mock_update, \
+                patch.object(backend_class, 'remove') as mock_remove:
+            self.assertEqual(process_queue_batch(100), (4, 1, 1))
+
+        # The two updates to Alice were sent in a single request:
+        self.assertEqual(mock_update.call_count, 1)
+        self.assertEqual(
+            [p.id for p in mock_update.call_args[0][1]], [alice.id])
+        mock_remove.assert_called_once_with(
+            'core.person.{0}'.format(bob_id))
+
+        self.assertEqual(IndexQueueItem.objects.depth(), 0)
+        self.assertIsNone(IndexQueueItem.objects.lag())
+
+    def test_bulk_changes_are_queued(self):
+        people = [
+            Person(legal_name='Person {0}'.format(i), slug='person-{0}'.format(i))
+            for i in range(3)
+        ]
+        Person.objects.bulk_create(people)
+        person_ids = list(Person.objects.values_list('id', flat=True))
+
+        backend_class = type(connections['default'].get_backend())
+        with patch.object(backend_class, 'update') as mock_update:
+            update_search_index(Person, person_ids)
+        # Nothing is sent to the backend until the queue is processed:
+        self.assertFalse(mock_update.called)
+        self.assertEqual(
+            sorted(IndexQueueItem.objects.values_list('object_id', 'action')),
+            [(person_id, 'update') for person_id in sorted(person_ids)]
+        )
+
+        with patch.object(backend_class, 'update') as mock_update:
+            self.assertEqual(process_queue_batch(100), (3, 3, 0))
+        self.assertEqual(mock_update.call_count, 1)
+
+    def test_people_whose_positions_ended_are_queued_daily(self):
+        title = PositionTitle.objects.create(name='Member', slug='member')
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        people = []
+        for i, end_date in enumerate((yesterday, datetime.date(2010, 1, 1))):
+            person = Person.objects.create(
+                legal_name='Person {0}'.format(i), slug='person-{0}'.format(i))
+            Position.objects.create(
+                person=person,
+                title=title,
+                category='political',
+                start_date=ApproximateDate(2000, 1, 1),
+                end_date=ApproximateDate(end_date.year, end_date.month, end_date.day))
+            people.append(person)
+        IndexQueueItem.objects.all().delete()
+
+        call_command(
+            'core_refresh_position_active_dates', commit=True, stdout=StringIO())
+
+        # Only the person whose position ended yesterday has different
+        # current positions today:
+        self.assertEqual(
+            list(IndexQueueItem.objects.values_list('object_id', 'action')),
+            [(people[0].id, 'update')])
@@ -174,3 +174,22 @@ class SearchPaginationTest(TestCase):
         self.assertEqual(paginator._count, 3)
         self.assertEqual(paginator._num_pages, 2)
         self.assertEqual(page.number, 1)
+
+
+class FetchedSearchResultsTest(unittest.TestCase):
+    def test_pagination(self):
+        from django.core.paginator import Paginator
+        from pombola.search.views import FetchedSearchResults
+
+        # The second page of 5 results, where there are 12 in total:
+        results = FetchedSearchResults(['f', 'g', 'h', 'i', 'j'], 12, 5)
+        paginator = Paginator(results, 5)
+
+        self.assertEqual(paginator.count, 12)
+        self.assertEqual(paginator.num_pages, 3)
+        page = paginator.page(2)
+        self.assertEqual(list(page), ['f', 'g', 'h', 'i', 'j'])
+        self.assertEqual(page.start_index(), 6)
+        self.assertTrue(page.has_next())
+        # Pages that weren't fetched are empty:
+        self.assertEqual(results[0:5], [])
@@ -1,8 +1,11 @@
 from datetime import datetime
+import hashlib
+import math
 import re
 import sys
 import simplejson
 
+from django.core.cache import cache
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.conf import settings
@@ -14,8 +17,34 @@ from pombola.core import models
 from haystack.query import SearchQuerySet
 from haystack.inputs import AutoQuery
 
-from sorl.thumbnail import get_thumbnail
 from .geocoder import geocoder
+from .multi_search import run_searches
+
+
+class FetchedSearchResults(object):
+    """A page of search results that have already been fetched
+
+    This can be passed to a Paginator in place of a SearchQuerySet;
+    'offset' is the index of the first of 'results' in all 'hits'
+    results, and slicing outside the fetched page returns nothing."""
+
+    def __init__(self, results, hits, offset):
+        self.results = results
+        self.hits = hits
+        self.offset = offset
+
+    def count(self):
+        return self.hits
+
+    def __len__(self):
+        return self.hits
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice):
+            raise TypeError("FetchedSearchResults can only be sliced")
+        start = (k.start or 0) - self.offset
+        stop = (self.hits if k.stop is None else k.stop) - self.offset
+        return self.results[max(start, 0):max(stop, 0)]
 
 
 class SearchBaseView(TemplateView):
@@ -138,29 +167,15 @@ class SearchBaseView(TemplateView):
             results = paginator.page(paginator.num_pages)
         return results
 
-    def get_global_context(self, context):
+    def get_global_search_query(self):
+        """Return the query over all sections used for global search"""
         # Find all the models to search over...
         models = set(
             self.search_sections[section]['model']
             for section in self.search_sections
         )
 
-        show_top_hits = (self.page == '1' or not self.page)
-
-        top_hits_ids = []
-
-        if show_top_hits:
-            context['top_hits'] = []
-            for section, max_for_top_hits in SearchBaseView.top_hits_under.items():
-                data = self.get_section_data(section)
-                if data['results_count'] <= max_for_top_hits:
-                    context['top_hits'] += data['results']
-            top_hits_ids = set(r.id for r in context['top_hits'])
-
         sqs = SearchQuerySet().models(*list(models))
-        # Exclude anything that will already have been shown in the top hits:
-        for top_hit_id in top_hits_ids:
-            sqs = sqs.exclude(id=top_hit_id)
         sqs = sqs. \
             exclude(hidden=True). \
             filter(content=AutoQuery(self.query)). \
@@ -175,8 +190,125 @@ class SearchBaseView(TemplateView):
         if self.order == 'date':
             sqs = sqs.order_by('-start_date')
 
-        context['paginator'] = Paginator(sqs, self.results_per_page)
-        context['page_obj'] = self.get_paginated_results(context['paginator'])
+        return sqs
+
+    def get_global_search_cache_key(self, page_number, show_top_hits):
+        key_data = [
+            self.__class__.__name__,
+            re.sub(r'\s+', ' ', self.query).strip().lower(),
+            self.order,
+            self.start_date_range,
+            self.end_date_range,
+            page_number,
+            show_top_hits,
+        ]
+        return 'search:global:' + hashlib.md5(
+            repr(key_data).encode('utf-8')).hexdigest()
+
+    def get_global_search_data(self, page_number, show_top_hits):
+        """Find the section counts, top hits and a page of global results
+
+        All the searches needed are sent to the search backend as a
+        single multi-search request, and the results are cached for
+        SEARCH_RESULTS_CACHE_TIMEOUT seconds."""
+
+        cache_key = self.get_global_search_cache_key(page_number, show_top_hits)
+        data = cache.get(cache_key)
+        if data is not None:
+            return data
+
+        sections = [s for s in self.section_ordering if s in self.search_sections]
+        top_hits_sections = []
+        if show_top_hits:
+            top_hits_sections = [
+                s for s in SearchBaseView.top_hits_under.keys()
+                if s in self.search_sections
+            ]
+
+        searches = []
+        for section in sections:
+            searches.append((
+                self.get_section_query(section).highlight(),
+                0,
+                SearchBaseView.top_hits_under.get(section, 0) \
+                    if section in top_hits_sections else 0,
+            ))
+
+        # Anything shown in the top hits is excluded from the global
+        # results, and there can be at most max_top_hits of them, so
+        # fetch enough extra results to fill the page without them:
+        max_top_hits = sum(
+            SearchBaseView.top_hits_under[s] for s in top_hits_sections)
+        start = (page_number - 1) * self.results_per_page
+        searches.append((
+            self.get_global_search_query(),
+            start,
+            start + self.results_per_page + max_top_hits,
+        ))
+
+        responses = run_searches(searches)
+
+        data = {
+            'section_counts': {},
+            'top_hits': [],
+        }
+        for section, response in zip(sections, responses):
+            data['section_counts'][section] = response['hits']
+            if section in top_hits_sections and \
+                    response['hits'] <= SearchBaseView.top_hits_under[section]:
+                data['top_hits'] += response['results']
+
+        top_hits_ids = set(r.id for r in data['top_hits'])
+        global_response = responses[-1]
+        data['results'] = [
+            r for r in global_response['results'] if r.id not in top_hits_ids
+        ][:self.results_per_page]
+        # Every top hit also matches the global query:
+        data['hits'] = global_response['hits'] - len(top_hits_ids)
+
+        cache.set(cache_key, data, settings.SEARCH_RESULTS_CACHE_TIMEOUT)
+        return data
+
+    def get_global_context(self, context):
+        try:
+            page_number = int(self.page or 1)
+        except ValueError:
+            page_number = 1
+        page_number = max(page_number, 1)
+
+        show_top_hits = (page_number == 1)
+        data = self.get_global_search_data(page_number, show_top_hits)
+
+        num_pages = max(
+            1, int(math.ceil(data['hits'] / float(self.results_per_page))))
+        if page_number > num_pages:
+            # The page requested is past the end of the results, so
+            # show the last page instead:
+            page_number = num_pages
+            show_top_hits = (page_number == 1)
+            data = self.get_global_search_data(page_number, show_top_hits)
+
+        # Show the number of results in each section in the form:
+        context['form_options'] = [
+            (section, title, selected) if section not in data['section_counts']
+            else (section,
+                  u'{0} ({1})'.format(title, data['section_counts'][section]),
+                  selected)
+            for section, title, selected in context['form_options']
+        ]
+
+        if show_top_hits:
+            context['top_hits'] = data['top_hits']
+
+        context['paginator'] = Paginator(
+            FetchedSearchResults(
+                data['results'],
+                data['hits'],
+                (page_number - 1) * self.results_per_page,
+            ),
+            self.results_per_page,
+        )
+        context['page_obj'] = context['paginator'].page(page_number)
         return context
 
     def get_section_context(self, context, section):
@@ -221,7 +353,7 @@ class SearchBaseView(TemplateView):
         else:
             return self.get_global_context(context)
 
-    def get_section_data(self, section):
+    def get_section_query(self, section):
         defaults = self.search_sections[section]
         extra_filter = defaults.get('filter', {})
         filter_args = extra_filter.get('args', [])
@@ -245,8 +377,11 @@ class SearchBaseView(TemplateView):
         if self.order == 'date':
             query = query.order_by('-start_date')
 
-        result = defaults.copy()
-        result['results'] = query.highlight()
+        return query
+
+    def get_section_data(self, section):
+        result = self.search_sections[section].copy()
+        result['results'] = self.get_section_query(section).highlight()
         result['results_count'] = result['results'].count()
         result['section'] = section
         result['section_dashes'] = section.replace('_', '-')
@@ -349,13 +484,13 @@ known_kinds = {
     'place':  models.Place,
 }
 
-def places_ordered_by_session(place_a, place_b):
-    """Return True if both places have sessions and place_b's is later"""
-    a_session = place_a.parliamentary_session
-    b_session = place_b.parliamentary_session
-    if not (a_session and b_session):
+def places_ordered_by_session(result_a, result_b):
+    """Return True if both places have sessions and result_b's is later"""
+    a_session_end_date = getattr(result_a, 'session_end_date', None)
+    b_session_end_date = getattr(result_b, 'session_end_date', None)
+    if not (a_session_end_date and b_session_end_date):
         return False
-    return a_session.end_date < b_session.end_date
+    return a_session_end_date < b_session_end_date
 
 def remove_duplicate_places(response_data):
     """Remove all but the newest of places with indistinguishable labels
@@ -375,10 +510,10 @@ def remove_duplicate_places(response_data):
 
     for i, result in enumerate(response_data):
         this_label = (result['name'], result['extra_data'])
-        this_object = result['object']
-        if (this_label in previous_label_index) and type(this_object) == models.Place:
+        this_result = result['result']
+        if (this_label in previous_label_index) and this_result.model == models.Place:
             previous_i = previous_label_index[this_label]
-            if places_ordered_by_session(response_data[previous_i]['object'], this_object):
+            if places_ordered_by_session(response_data[previous_i]['result'], this_result):
                 indices_to_remove.append(previous_i)
                 previous_label_index[this_label] = i
             else:
@@ -429,40 +564,25 @@ def autocomplete(request):
                 models.PositionTitle,
             )
 
-        # collate the results into json for the autocomplete js
+        # collate the results into json for the autocomplete js; this
+        # only uses the fields stored in the index, so that no objects
+        # need to be loaded from the database:
         for result in sqs.all()[0:10]:
-
-            o = result.object
-            css_class = o.css_class()
-
-            extra_autocomplete_data = None
-            if hasattr(o, 'extra_autocomplete_data'):
-                extra_autocomplete_data = o.extra_autocomplete_data
-
-            image_url = None
-            if hasattr(o, 'primary_image'):
-                image = o.primary_image()
-                if image:
-                    image_url = get_thumbnail(image, '16x16', crop="center").url
-
-            if not image_url:
-                image_url = "/static/images/" + css_class + "-16x16.jpg"
-
             response_data.append({
-                'url': o.get_absolute_url(),
-                'name': o.name,
-                'image_url': image_url,
-                'extra_data': extra_autocomplete_data,
-                'type': css_class,
-                'value': o.name,
-                'object': o
+                'url': result.url,
+                'name': result.display_name,
+                'image_url': result.autocomplete_image_url,
+                'extra_data': result.extra_autocomplete_data,
+                'type': result.css_class,
+                'value': result.display_name,
+                'result': result
             })
 
     remove_duplicate_places(response_data)
 
-    # Remove the 'object' elements before returning the response:
+    # Remove the 'result' elements before returning the response:
     for d in response_data:
-        del d['object']
+        del d['result']
 
     # send back the results as JSON
     return HttpResponse(
@@ -163,6 +163,16 @@ else:
     CACHE_MIDDLEWARE_SECONDS = 60 * 20 # twenty minutes
 CACHE_MIDDLEWARE_KEY_PREFIX = config.get('POMBOLA_DB_NAME')
 
+# How long the fragments of pages cached with {% cachefragment %} are
+# kept for.  They're invalidated when the objects they depend on change
+# (see pombola/core/fragment_cache.py), so this can be long.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How long the position listing pages' rows and place filters are
+# cached for; they're invalidated when positions or the objects they
+# refer to change (see pombola/core/position_listing.py).
+POSITION_LISTING_CACHE_TIMEOUT = 60 * 60 * 24
+
 # Always use the TemporaryFileUploadHandler as it allows us to access the
 # uploaded file on disk more easily. Currently used by the CSV upload in
 # scorecards admin.
@@ -304,7 +314,12 @@ HAYSTACK_CONNECTIONS = {
     },
 }
 
-HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
+# Changes to indexed objects are queued, and sent to the search index
+# in batches by the search_process_index_queue management command:
+HAYSTACK_SIGNAL_PROCESSOR = 'pombola.search.signals.QueuedSignalProcessor'
+
+# How long (in seconds) the results of a global search are cached for:
+SEARCH_RESULTS_CACHE_TIMEOUT = 60
 
 # Admin autocomplete
 AJAX_LOOKUP_CHANNELS = {
@@ -1,6 +1,3 @@
-import errno
-import os
-
 from .base import *  # noqa
 from .south_africa_base import *  # noqa
 
@@ -27,25 +24,3 @@ PIPELINE_CSS.update(COUNTRY_CSS)
 PIPELINE_JS.update(COUNTRY_JS)
 
 EXCLUDE_FROM_SEARCH = ('places', 'info_pages');
-
-PMG_API_CACHE_PATH = os.path.join(root_dir, 'pmg_api_cache')
-
-if 'ON_HEROKU' in os.environ:
-    CACHES['pmg_api'] = {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'pmg-api-in-memory-cache',
-    }
-else:
-    try:
-        os.makedirs(PMG_API_CACHE_PATH)
-    except OSError as exception:
-        if exception.errno != errno.EEXIST:
-            raise
-    CACHES['pmg_api'] = {
-        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': PMG_API_CACHE_PATH,
-        'OPTIONS': {
-            'MAX_ENTRIES': 10000,
-            },
-        'TIMEOUT': 60*60*24,
-    }
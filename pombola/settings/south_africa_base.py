@@ -33,6 +33,10 @@ MAP_BOUNDING_BOX_WEST = 16.30
 
 MAPIT_COUNTRY = 'ZA'
 
+# How long to cache the representatives found near each location for
+# the address lookup pages, in seconds:
+NEARBY_REPRESENTATIVES_CACHE_TIMEOUT = 60 * 60
+
 COUNTRY_CSS = {
     'south-africa': {
         'source_filenames': (
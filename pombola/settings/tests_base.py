@@ -30,3 +30,13 @@ MAP_BOUNDING_BOX_WEST = None
 # assets, as suggested here:
 #   https://github.com/cyberdelia/django-pipeline/issues/277
 STATICFILES_STORAGE = 'pipeline.storage.PipelineStorage'
+
+# The tests expect changes to be reflected in the search index
+# immediately, rather than waiting for the queue to be processed:
+HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
+
+# Don't let cached search results, page fragments or position listings
+# from one test affect another:
+SEARCH_RESULTS_CACHE_TIMEOUT = 0
+FRAGMENT_CACHE_TIMEOUT = 0
+POSITION_LISTING_CACHE_TIMEOUT = 0
@@ -21,10 +21,5 @@ ENABLED_FEATURES = make_enabled_features(INSTALLED_APPS, ALL_OPTIONAL_APPS)
 
 NOSE_ARGS += ['-a', 'country=south_africa']
 
-# For testing purposes we need a cache that we can put stuff in
-# to avoid external calls, and generally to avoid polluting the
-# cache proper.
-CACHES['pmg_api'] = {
-    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    'LOCATION': 'pmg_api_test',
-    }
+# Don't cache the representatives near locations between tests:
+NEARBY_REPRESENTATIVES_CACHE_TIMEOUT = 0
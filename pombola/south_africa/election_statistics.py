@@ -0,0 +1,160 @@
+"""Work out the statistics shown on the election statistics page
+
+For each party, the page shows how many current members of the
+National Assembly there are and how many of them are candidates in the
+election, and it lists the candidates who have been members of more
+than one party.  compute_election_statistics finds all of that with a
+fixed number of queries, however many parties and people there are,
+and the results are stored for each election year as an
+ElectionStatistics object."""
+
+from __future__ import division
+
+from collections import defaultdict
+import re
+
+from django.db.models import Count, Q
+
+from pombola.core.models import Organisation, Person, Position
+from pombola.south_africa.models import ElectionStatistics
+
+
+ELECTION_LIST_SLUG_RE = re.compile(r'-election-list-(\d{4})$')
+
+
+def percentage(part, whole):
+    return 100 * part / whole if whole else 0
+
+
+def compute_election_statistics(election_year):
+    election_list_suffix = 'election-list-' + election_year
+
+    current_mp_ids = set(
+        Position.objects
+        .filter(organisation__slug='national-assembly')
+        .currently_active()
+        .values_list('person_id', flat=True)
+        )
+
+    # The people on the national list, or a regional part of it:
+    rerunning_ids = current_mp_ids.intersection(
+        Position.objects
+        .filter(
+            Q(organisation__slug__contains='national-' + election_list_suffix) |
+            (Q(organisation__slug__contains=election_list_suffix) &
+             Q(organisation__slug__contains='regional')))
+        .values_list('person_id', flat=True)
+        )
+
+    party_id_to_mp_ids = defaultdict(set)
+    for person_id, party_id in Position.objects \
+            .filter(person__in=current_mp_ids, organisation__kind__slug='party') \
+            .values_list('person_id', 'organisation_id'):
+        party_id_to_mp_ids[party_id].add(person_id)
+
+    byparty = []
+    for party in Organisation.objects.filter(kind__slug='party').order_by('name'):
+        current = len(party_id_to_mp_ids[party.id])
+        if current:
+            rerunning = len(party_id_to_mp_ids[party.id] & rerunning_ids)
+            byparty.append({
+                'party': {'name': party.name, 'slug': party.slug},
+                'current': current,
+                'rerunning': rerunning,
+                'percent_rerunning': percentage(rerunning, current),
+            })
+
+    return {
+        'current_mps': {
+            'all': {
+                'current': len(current_mp_ids),
+                'rerunning': len(rerunning_ids),
+                'percent_rerunning': percentage(len(rerunning_ids), len(current_mp_ids)),
+            },
+            'byparty': byparty,
+        },
+        'people_new_party': find_people_new_party(election_list_suffix),
+    }
+
+
+def find_people_new_party(election_list_suffix):
+    """Find candidates who appear to have switched party
+
+    These are the candidates on any of the year's election lists who
+    have been a member of more than one party."""
+
+    party_memberships = Position.objects \
+        .filter(organisation__kind__slug='party', title__slug='member')
+    switcher_ids = [
+        row['person_id'] for row in
+        party_memberships
+        # Clear the default ordering so that it's not in the GROUP BY:
+        .order_by()
+        .values('person_id')
+        .annotate(num_parties=Count('id'))
+        .filter(num_parties__gt=1)
+    ]
+
+    person_id_to_lists = defaultdict(list)
+    for position in Position.objects \
+            .filter(
+                person__in=switcher_ids,
+                organisation__slug__contains=election_list_suffix) \
+            .select_related('organisation'):
+        person_id_to_lists[position.person_id].append(position.organisation.name)
+
+    party_positions = Position.objects \
+        .filter(
+            person__in=person_id_to_lists.keys(),
+            organisation__kind__slug='party') \
+        .select_related('organisation')
+    person_id_to_current = defaultdict(list)
+    for position in party_positions.currently_active():
+        person_id_to_current[position.person_id].append(position.organisation.name)
+    person_id_to_former = defaultdict(list)
+    for position in party_positions.currently_inactive():
+        person_id_to_former[position.person_id].append(position.organisation.name)
+
+    return [
+        {
+            'person': {'name': person.name, 'url': person.get_absolute_url()},
+            'person_list': person_id_to_lists[person.id],
+            'current_positions': person_id_to_current[person.id],
+            'former_positions': person_id_to_former[person.id],
+        }
+        for person in Person.objects.filter(id__in=person_id_to_lists.keys())
+    ]
+
+
+def update_election_statistics(election_year):
+    statistics, _ = ElectionStatistics.objects.get_or_create(
+        election_year=election_year)
+    statistics.results = compute_election_statistics(election_year)
+    statistics.save()
+    return statistics
+
+
+def get_election_statistics(election_year):
+    """Return the stored statistics for the year, computing them if needed
+
+    Statistics are only computed (and stored) for the years there are
+    election lists for; for any other year None is returned."""
+    try:
+        statistics = ElectionStatistics.objects.get(election_year=election_year)
+    except ElectionStatistics.DoesNotExist:
+        if election_year not in find_election_years():
+            return None
+        statistics = update_election_statistics(election_year)
+    return statistics.results
+
+
+def find_election_years():
+    """Return the years of all the election lists, most recent first"""
+    years = set()
+    for slug in Organisation.objects \
+            .filter(kind__slug='election-list') \
+            .values_list('slug', flat=True):
+        match = ELECTION_LIST_SLUG_RE.search(slug)
+        if match:
+            years.add(match.group(1))
+    return sorted(years, reverse=True)
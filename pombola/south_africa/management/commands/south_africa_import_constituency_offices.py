@@ -44,6 +44,7 @@ from pombola.core.models import (OrganisationKind, Organisation, PlaceKind,
                          ContactKind, OrganisationRelationshipKind,
                          OrganisationRelationship, Identifier, Position,
                          PositionTitle, Person)
+from pombola.tasks.regeneration import defer_task_generation
 
 from ..helpers import (
     fix_province_name, LocationNotFound,
@@ -85,6 +86,8 @@ class Command(LabelCommand):
             dest='commit',
             help='Actually update the database'),)
 
+    # Regenerate the tasks for the new contacts all at once at the end:
+    @defer_task_generation()
     def handle_label(self, input_filename, **options):
 
         if options['test']:
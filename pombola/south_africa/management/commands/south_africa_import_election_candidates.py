@@ -19,6 +19,9 @@ from django_date_extensions.fields import ApproximateDate
 
 from haystack.query import SearchQuerySet
 
+from pombola.south_africa.election_statistics import update_election_statistics
+from pombola.tasks.regeneration import defer_task_generation
+
 party_to_object = {}
 list_to_object = {}
 position_to_object = {}
@@ -302,6 +305,8 @@ class Command(NoArgsCommand):
             help="Actually commit person changes to the database (new positions/orgs always created)" ),
     )
 
+    # Regenerate the tasks for the new people all at once at the end:
+    @defer_task_generation()
     def handle_noargs(self, **options):
         global YEAR, COMMIT
         YEAR = options['year']
@@ -336,3 +341,6 @@ class Command(NoArgsCommand):
             for row in candidiates:
                 if not search(row[3], row[4], row[0], row[2], row[1]):
                     add_new_person(row[0], row[2], row[1], row[3], row[4])
+
+        # The statistics pages show who's on the new candidate lists:
+        update_election_statistics(YEAR)
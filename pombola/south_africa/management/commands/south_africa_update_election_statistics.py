@@ -0,0 +1,32 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from pombola.south_africa.election_statistics import (
+    find_election_years, update_election_statistics
+)
+
+
+class Command(NoArgsCommand):
+    help = 'Recalculate the stored statistics for the election statistics pages'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--year', '-y',
+            dest='year',
+            help='Only update the statistics for this election year'
+        ),
+    )
+
+    def handle_noargs(self, **options):
+        verbose = int(options['verbosity']) >= 2
+
+        if options['year']:
+            years = [options['year']]
+        else:
+            years = find_election_years()
+
+        for year in years:
+            update_election_statistics(year)
+            if verbose:
+                self.stdout.write("Updated the statistics for {0}".format(year))
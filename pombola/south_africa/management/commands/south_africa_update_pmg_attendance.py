@@ -0,0 +1,101 @@
+import datetime
+from optparse import make_option
+
+from django.core.management.base import CommandError, NoArgsCommand
+from django.utils import timezone
+
+from pombola.south_africa.models import PMGAPIData
+from pombola.south_africa.pmg_api import (
+    ATTENDANCE_SUMMARY_URL, PMGAPIError, current_members,
+    get_member_attendance_url, member_attendance_urls, refresh_pmg_api_data,
+    store_or_get_pmg_member_id
+)
+
+
+class Command(NoArgsCommand):
+    help = 'Refresh the stored PMG attendance data for all current and former members'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--max-age',
+            type='float',
+            dest='max_age',
+            default=0,
+            help='Skip data that was refreshed less than this many hours ago'
+        ),
+        make_option(
+            '--former-max-age',
+            type='float',
+            dest='former_max_age',
+            default=24 * 7,
+            help='Skip data for people who are no longer members that was '
+                 'refreshed less than this many hours ago (default: a week)'
+        ),
+    )
+
+    def handle_noargs(self, **options):
+        verbose = int(options['verbosity']) >= 2
+
+        def fresh_after(max_age):
+            if max_age:
+                return timezone.now() - datetime.timedelta(hours=max_age)
+
+        current_fresh_after = fresh_after(options['max_age'])
+        former_fresh_after = fresh_after(options['former_max_age'])
+
+        urls = {ATTENDANCE_SUMMARY_URL: current_fresh_after}
+        failures = []
+        for person in current_members():
+            try:
+                store_or_get_pmg_member_id(person)
+            except PMGAPIError as e:
+                failures.append((person.slug, unicode(e)))
+                continue
+            url = get_member_attendance_url(person)
+            if url:
+                urls[url] = current_fresh_after
+            elif verbose:
+                self.stdout.write(
+                    "No PMG member found for {0}".format(person.slug))
+
+        # Former members' past attendance is still shown on their
+        # pages, but it rarely changes, so it's refreshed less often:
+        for url in member_attendance_urls().values():
+            urls.setdefault(url, former_fresh_after)
+
+        # Refresh the data that was last fetched longest ago first:
+        fetched = dict(
+            PMGAPIData.objects.filter(url__in=urls.keys())
+            .values_list('url', 'fetched'))
+        ordered_urls = sorted(
+            urls, key=lambda u: fetched.get(u) or datetime.datetime.min)
+
+        updated = unchanged = skipped = 0
+        for url in ordered_urls:
+            if urls[url] and fetched.get(url) and fetched[url] > urls[url]:
+                skipped += 1
+                continue
+            try:
+                changed = refresh_pmg_api_data(url)
+            except PMGAPIError as e:
+                failures.append((url, unicode(e)))
+                continue
+            if changed:
+                updated += 1
+            else:
+                unchanged += 1
+            if verbose:
+                self.stdout.write("{0} {1}".format(
+                    'Updated' if changed else 'Unchanged', url))
+
+        if verbose:
+            self.stdout.write(
+                "{0} updated, {1} unchanged, {2} skipped, {3} failed".format(
+                    updated, unchanged, skipped, len(failures)))
+
+        if failures:
+            for what, error in failures:
+                self.stderr.write(u"{0}: {1}".format(what, error))
+            raise CommandError(
+                "{0} PMG API refreshes failed; any previous data was kept".format(
+                    len(failures)))
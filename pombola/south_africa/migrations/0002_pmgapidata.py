@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('south_africa', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PMGAPIData',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('url', models.CharField(unique=True, max_length=500)),
+                ('results_json', models.TextField(default='[]')),
+                ('etag', models.CharField(max_length=200, blank=True)),
+                ('last_modified', models.CharField(max_length=200, blank=True)),
+                ('fetched', models.DateTimeField(db_index=True, null=True, blank=True)),
+                ('last_attempt', models.DateTimeField(null=True, blank=True)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name_plural': 'PMG API data',
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('south_africa', '0002_pmgapidata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ElectionStatistics',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('election_year', models.CharField(unique=True, max_length=4)),
+                ('results_json', models.TextField(default='{}')),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'election statistics',
+            },
+        ),
+    ]
@@ -1,3 +1,7 @@
+import json
+
+from django.db import models
+
 from pombola.core.models import Place, Position, Organisation
 
 class ZAPlace(Place):
@@ -23,4 +27,62 @@ class ZAPlace(Place):
                 org_rels_as_a__organisation_b=self.organisation,
                 kind__slug='party',
                 )
-            
+
+
+class PMGAPIData(models.Model):
+    """The combined results of every page of a PMG API endpoint
+
+    These are refreshed in the background by the
+    south_africa_update_pmg_attendance management command, so that
+    views never have to wait for the PMG API.  If a refresh fails,
+    the previous results are kept, and the error is recorded."""
+
+    url = models.CharField(max_length=500, unique=True)
+    results_json = models.TextField(default='[]')
+    # For conditional requests for the first page:
+    etag = models.CharField(max_length=200, blank=True)
+    last_modified = models.CharField(max_length=200, blank=True)
+    # When results_json was last known to be up to date:
+    fetched = models.DateTimeField(blank=True, null=True, db_index=True)
+    last_attempt = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    def __unicode__(self):
+        return self.url
+
+    @property
+    def results(self):
+        return json.loads(self.results_json)
+
+    @results.setter
+    def results(self, value):
+        self.results_json = json.dumps(value)
+
+    class Meta:
+        verbose_name_plural = 'PMG API data'
+
+
+class ElectionStatistics(models.Model):
+    """The statistics shown on the election statistics page for a year
+
+    These are computed by pombola.south_africa.election_statistics, and
+    refreshed by the south_africa_update_election_statistics management
+    command (which is also run after importing candidate lists)."""
+
+    election_year = models.CharField(max_length=4, unique=True)
+    results_json = models.TextField(default='{}')
+    updated = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return self.election_year
+
+    @property
+    def results(self):
+        return json.loads(self.results_json)
+
+    @results.setter
+    def results(self, value):
+        self.results_json = json.dumps(value)
+
+    class Meta:
+        verbose_name_plural = 'election statistics'
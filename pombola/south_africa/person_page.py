@@ -0,0 +1,216 @@
+"""Load everything shown on the South African person page in bulk
+
+SAPersonDetail used to look up each kind of contact, each release's
+information sources, each entry's line items and each speech's
+sections with separate queries, so the number of queries grew with the
+size of a person's record.  PersonPageData loads all of that with a
+fixed number of queries, however many contacts, positions, interests
+and speeches the person has."""
+
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+
+from speeches.models import Section, Speech
+
+from pombola.core import models
+from pombola.interests_register.models import Release
+
+
+def prefetch_section_ancestors(speeches):
+    """Load the ancestors of the speeches' sections with one query
+
+    Otherwise the speech list template's calls to Section.get_path
+    and Section.parent would each need a query for every speech."""
+    sections = [s.section for s in speeches if s.section_id]
+    if not sections:
+        return
+
+    section_ids = tuple(set(s.id for s in sections))
+    all_sections = dict(
+        (s.id, s) for s in Section.objects.raw(
+            """WITH RECURSIVE cte AS (
+                SELECT speeches_section.* FROM speeches_section WHERE id IN %s
+                UNION
+                SELECT s.* FROM cte JOIN speeches_section s ON cte.parent_id = s.id
+            )
+            SELECT * FROM cte""",
+            [section_ids]
+        )
+    )
+
+    for section in sections:
+        ancestors = [section]
+        parent_id = section.parent_id
+        while parent_id:
+            parent = all_sections[parent_id]
+            ancestors.insert(0, parent)
+            parent_id = parent.parent_id
+        # SayIt caches the result of Section.get_ancestors in the
+        # instance's __dict__ under the same name:
+        section.__dict__['get_ancestors'] = ancestors
+        if section.parent_id:
+            section.parent = ancestors[-2]
+
+
+def tabulate_interests(entries, sources_by_release_id):
+    """Arrange register of interests entries into a table for each category
+
+    Returns a list of (release_data, release_date) tuples, most recent
+    release first."""
+
+    tabulated = {}
+    release_dates = {}
+
+    for entry in entries:
+        release = entry.release
+        category = entry.category
+
+        if release.id not in tabulated:
+            tabulated[release.id] = {
+                'name': release.name,
+                'categories': {},
+                'informationsource': sources_by_release_id.get(release.id, []),
+            }
+            release_dates[release.id] = release.date
+
+        categories = tabulated[release.id]['categories']
+        if category.id not in categories:
+            categories[category.id] = {
+                'name': category.name,
+                'headings': [],
+                'headingindex': {},
+                'headingcount': 1,
+                'entries': []
+            }
+        table = categories[category.id]
+
+        #create row list
+        table['entries'].append([''] * (table['headingcount'] - 1))
+
+        #loop through each 'cell' in the row
+        for entrylistitem in entry.line_items.all():
+            #if the heading for the column does not yet exist, create it
+            if entrylistitem.key not in table['headingindex']:
+                table['headingindex'][entrylistitem.key] = table['headingcount'] - 1
+                table['headingcount'] += 1
+                table['headings'].append(entrylistitem.key)
+
+                #loop through each row that already exists to ensure lists are the same size
+                for line in table['entries']:
+                    line.append('')
+
+            #record the 'cell' in the correct position in the row list
+            table['entries'][-1][table['headingindex'][entrylistitem.key]] = entrylistitem.value
+
+    ret = [
+        (release_data, release_dates[release_id])
+        for release_id, release_data in tabulated.items()
+    ]
+    ret.sort(key=lambda x: x[1], reverse=True)
+
+    return ret
+
+
+class PersonPageData(object):
+    """The data for a person's page, loaded with a fixed number of queries"""
+
+    important_org_kind_slugs = ('national-executive', 'parliament', 'provincial-legislature')
+
+    def __init__(self, person, sayit_speaker):
+        self.person = person
+        self.sayit_speaker = sayit_speaker
+
+        # Contacts are ordered by kind slug, as they were when they
+        # were fetched for each kind separately:
+        self.contacts_by_kind = defaultdict(list)
+        for kind_slug, value in self.person.contacts \
+                .order_by('kind__slug', 'id') \
+                .values_list('kind__slug', 'value'):
+            self.contacts_by_kind[kind_slug].append(value)
+
+    def list_contacts(self, kind_slugs):
+        return [
+            value
+            for kind_slug in sorted(kind_slugs)
+            for value in self.contacts_by_kind[kind_slug]
+        ]
+
+    def get_important_organisations(self):
+        """Return the current and former organisations of political positions"""
+        orgs_from_important_positions = models.Organisation.objects.filter(
+            kind__slug__in=self.important_org_kind_slugs,
+            position__in=self.person.politician_positions(),
+            )
+
+        former_important_positions = (
+            self.person.position_set
+            .all()
+            .political()
+            .previous()
+            .filter(organisation__kind__slug__in=self.important_org_kind_slugs)
+            )
+
+        former_orgs_from_important_positions = models.Organisation.objects.filter(
+            position__in=former_important_positions,
+            ).exclude(id__in=orgs_from_important_positions)
+
+        return (
+            list(orgs_from_important_positions.distinct()),
+            list(former_orgs_from_important_positions.distinct()),
+        )
+
+    def get_positions(self):
+        """Return the person's current and past political positions"""
+        positions = self.person.position_set.all().political() \
+            .select_related('title', 'organisation__kind')
+        return (
+            list(positions.currently_active()),
+            list(positions.currently_inactive()),
+        )
+
+    def get_recent_speeches(self, tags, limit=5):
+        if not self.sayit_speaker:
+            # Without a speaker we can't find any speeches
+            return []
+
+        speeches = Speech.objects \
+            .filter(tags__name__in=tags, speaker=self.sayit_speaker) \
+            .order_by('-start_date', '-start_time') \
+            .select_related('section')
+
+        if limit:
+            speeches = speeches[:limit]
+
+        return list(speeches)
+
+    def get_speeches_by_section(self, sections):
+        """Return the recent speeches for each of sections
+
+        sections should be a dictionary mapping a name to a (tags,
+        limit) tuple, and the result maps the same names to lists of
+        speeches."""
+        result = dict(
+            (name, self.get_recent_speeches(tags, limit))
+            for name, (tags, limit) in sections.items()
+        )
+        prefetch_section_ancestors(
+            [speech for speeches in result.values() for speech in speeches])
+        return result
+
+    def get_tabulated_interests(self):
+        entries = self.person.interests_register_entries \
+            .select_related('release', 'category') \
+            .prefetch_related('line_items')
+        entries = list(entries)
+        if not entries:
+            return []
+
+        release_ids = set(entry.release_id for entry in entries)
+        sources_by_release_id = defaultdict(list)
+        for source in models.InformationSource.objects.filter(
+                content_type=ContentType.objects.get_for_model(Release),
+                object_id__in=release_ids):
+            sources_by_release_id[source.object_id].append(source)
+
+        return tabulate_interests(entries, sources_by_release_id)
@@ -0,0 +1,174 @@
+"""Keep local copies of attendance data from the PMG API
+
+The PMG API's attendance endpoints are paginated, so fetching them
+inside a request could mean waiting on many slow requests.  Instead,
+refresh_pmg_api_data downloads every page of an endpoint and stores the
+combined results as PMGAPIData, using a conditional request for the
+first page so that unchanged data isn't downloaded again.  The
+south_africa_update_pmg_attendance management command does this for
+the attendance summary and for everyone with a PMG member ID (current
+members of parliament often, former members less often), and the
+views only ever read the stored results."""
+
+import json
+import logging
+import urllib
+
+import requests
+
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+from pombola.core.models import Identifier, Person, Position
+from pombola.south_africa.models import PMGAPIData
+from pombola.south_africa.representatives import API_REQUESTS_TIMEOUT
+
+
+logger = logging.getLogger(__name__)
+
+PMG_MEMBER_SCHEME = 'za.org.pmg.api/member'
+
+MEMBER_SEARCH_URL_FORMAT = "https://api.pmg.org.za/member/?filter[pa_link]={}"
+MEMBER_ATTENDANCE_URL_FORMAT = "http://api.pmg.org.za/member/{}/attendance/"
+ATTENDANCE_SUMMARY_URL = 'https://api.pmg.org.za/committee-meeting-attendance/summary/'
+
+
+class PMGAPIError(Exception):
+    pass
+
+
+def get_json(url, headers=None):
+    try:
+        resp = requests.get(url, headers=headers, timeout=API_REQUESTS_TIMEOUT)
+        if resp.status_code == 304:
+            return resp, None
+        resp.raise_for_status()
+        return resp, json.loads(resp.text)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise PMGAPIError(u"Fetching {0} failed: {1}".format(url, e))
+
+
+def find_pmg_member_id(person):
+    """Search the PMG API for the member ID of a person
+
+    Returns None if there's no unique match."""
+    pa_link = urllib.quote(
+        "http://www.pa.org.za/person/{}/".format(person.slug))
+    _, search_data = get_json(MEMBER_SEARCH_URL_FORMAT.format(pa_link))
+
+    if not search_data.get('count'):
+        return None
+
+    if search_data['count'] > 1:
+        logger.error(
+            'Duplicate members at PMG with slug {} - SKIPPING'.format(person.slug))
+        return None
+
+    return search_data['results'][0]['id']
+
+
+def store_or_get_pmg_member_id(person):
+    identifier = person.get_identifier(PMG_MEMBER_SCHEME)
+
+    if not identifier:
+        identifier = find_pmg_member_id(person)
+        if identifier:
+            Identifier.objects.create(
+                scheme=PMG_MEMBER_SCHEME,
+                identifier=identifier,
+                content_object=person,
+                )
+
+    return identifier
+
+
+def get_member_attendance_url(person):
+    """Return the PMG API attendance URL for a person, or None
+
+    This only uses an identifier that's already been stored, so never
+    makes a request to the PMG API."""
+    identifier = person.get_identifier(PMG_MEMBER_SCHEME)
+    if identifier:
+        return MEMBER_ATTENDANCE_URL_FORMAT.format(identifier)
+
+
+def member_attendance_urls():
+    """Return a dictionary mapping person IDs to their PMG attendance URLs
+
+    This includes everyone with a stored PMG member ID, whether or not
+    they're still a member of parliament."""
+    return dict(
+        (person_id, MEMBER_ATTENDANCE_URL_FORMAT.format(identifier))
+        for person_id, identifier in Identifier.objects
+        .filter(
+            scheme=PMG_MEMBER_SCHEME,
+            content_type=ContentType.objects.get_for_model(Person))
+        .values_list('object_id', 'identifier')
+    )
+
+
+def get_stored_results(url):
+    """Return the stored results for url, or None if it's never been fetched"""
+    try:
+        data = PMGAPIData.objects.get(url=url, fetched__isnull=False)
+    except PMGAPIData.DoesNotExist:
+        return None
+    return data.results
+
+
+def refresh_pmg_api_data(url):
+    """Fetch every page of url and store the combined results
+
+    If the first page hasn't changed since the last successful fetch,
+    the stored results are kept.  Returns True if the results changed.
+    On failure, PMGAPIError is raised and the error is recorded
+    without replacing the previous results."""
+
+    data, _ = PMGAPIData.objects.get_or_create(url=url)
+    data.last_attempt = timezone.now()
+
+    headers = {}
+    if data.fetched:
+        if data.etag:
+            headers['If-None-Match'] = data.etag
+        if data.last_modified:
+            headers['If-Modified-Since'] = data.last_modified
+
+    try:
+        resp, page = get_json(url, headers)
+        if page is None:
+            # The first page hasn't changed, and since the results are
+            # most recent first, nor have any of the others.
+            changed = False
+        else:
+            etag = resp.headers.get('ETag', '')
+            last_modified = resp.headers.get('Last-Modified', '')
+            results = list(page.get('results'))
+            next_url = page.get('next')
+            while next_url:
+                _, page = get_json(next_url)
+                results.extend(page.get('results'))
+                next_url = page.get('next')
+            changed = results != data.results
+            data.results = results
+            data.etag = etag
+            data.last_modified = last_modified
+    except PMGAPIError as e:
+        data.last_error = unicode(e)
+        data.save()
+        raise
+
+    data.fetched = data.last_attempt
+    data.last_error = ''
+    data.save()
+    return changed
+
+
+def current_members():
+    """Return everyone who's currently a member of a house of parliament"""
+    positions = Position.objects \
+        .filter(
+            title__slug__in=('member', 'delegate'),
+            organisation__kind__slug='parliament') \
+        .currently_active()
+    return Person.objects.filter(position__in=positions).distinct()
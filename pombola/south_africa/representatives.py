@@ -0,0 +1,327 @@
+"""Find the representatives near a location, for the address lookup pages
+
+Looking up the MPs and MPLs with constituency offices near a point,
+and the ward councillor for it, used to take several queries for each
+constituency contact and two requests to external APIs on every page
+view.  Here the data for a location is built with a fixed number of
+queries, as plain dictionaries that can be cached and serialized to
+JSON, and then cached for the grid cell that the location is in.
+
+Locations are snapped to a grid of LOCATION_DECIMAL_PLACES decimal
+places (about 100m), which is the precision that the geocoder
+returns, so nearby searches share cache entries."""
+
+from collections import defaultdict
+
+import requests
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.core.cache import cache
+from django.db.models import Prefetch, Q
+
+from images.models import Image
+from sorl.thumbnail import get_thumbnail
+
+from pombola.core.models import (
+    Contact, Organisation, OrganisationRelationship, Person, Position
+)
+from pombola.south_africa.models import ZAPlace
+
+
+LOCATION_DECIMAL_PLACES = 3
+
+# For requests to external APIs, timeout after 3 seconds:
+API_REQUESTS_TIMEOUT = 3.05
+
+# In the short term, until we have a list of constituency offices and
+# addresses from DA, let's bundle these together.
+CONSTITUENCY_OFFICE_PLACE_KIND_SLUGS = (
+    'constituency-office',
+    'constituency-area', # specific to DA party
+)
+
+# The codes used here should match the party slugs, and the names of the
+# icon files in .../static/images/party-map-icons/
+PARTY_SLUGS_THAT_HAVE_LOGOS = set((
+    'adcp', 'anc', 'apc', 'azapo', 'cope', 'da', 'ff', 'id', 'ifp', 'mf',
+    'pac', 'sacp', 'ucdp', 'udm', 'agang', 'aic', 'eff'
+))
+
+
+class WardCouncillorAPIDown(Exception):
+    pass
+
+
+def snap_to_grid(lat, lon):
+    """Return lat and lon rounded to the centre of their grid cell
+
+    >>> snap_to_grid(-33.92487, 18.42406)
+    (-33.925, 18.424)
+    """
+    return (
+        round(lat, LOCATION_DECIMAL_PLACES),
+        round(lon, LOCATION_DECIMAL_PLACES),
+    )
+
+
+def get_cache_key(prefix, lat, lon, *args):
+    lat, lon = snap_to_grid(lat, lon)
+    parts = [prefix, '{0:.{2}f},{1:.{2}f}'.format(lat, lon, LOCATION_DECIMAL_PLACES)]
+    parts.extend(unicode(a) for a in args)
+    return ':'.join(parts)
+
+
+def get_party_data(party):
+    if party is None:
+        return None
+    return {
+        'name': party.name,
+        'slug': party.slug,
+        'url': party.get_absolute_url(),
+    }
+
+
+def get_person_data(person, image):
+    """Return the details of a person needed for the lookup pages"""
+    image_url = None
+    if image:
+        image_url = get_thumbnail(image, '58x58', crop='center').url
+    return {
+        'id': person.id,
+        'slug': person.slug,
+        'url': person.get_absolute_url(),
+        'image_url': image_url,
+    }
+
+
+def get_position_data(position):
+    return {
+        'title': {'name': position.title.name},
+        'organisation': {
+            'name': position.organisation.name,
+            'slug': position.organisation.slug,
+        },
+    }
+
+
+def get_office_data(office_place, postal_addresses):
+    organisation = office_place.organisation
+    return {
+        'id': organisation.id,
+        'name': organisation.name,
+        'url': organisation.get_absolute_url(),
+        'lat': office_place.location.y,
+        'lon': office_place.location.x,
+        'distance_km': office_place.distance.km,
+        'postal_addresses': postal_addresses,
+    }
+
+
+def find_nearby_representatives(lat, lon, radius):
+    """Return the MPs and MPLs with offices within radius km of a point
+
+    This returns a dictionary with 'mp_data' and 'mpl_data' lists of
+    the constituency contacts for each ongoing office, nearest first.
+    All the data is fetched with the same number of queries however
+    many offices and people there are."""
+
+    location = Point(lon, lat)
+
+    nearest_office_places = [
+        office_place for office_place in
+        ZAPlace.objects
+        .filter(kind__slug__in=CONSTITUENCY_OFFICE_PLACE_KIND_SLUGS)
+        .distance(location)
+        .filter(location__distance_lte=(location, D(km=radius)))
+        .order_by('distance')
+        .select_related('organisation')
+        .prefetch_related(Prefetch(
+            'organisation__contacts',
+            queryset=Contact.objects.filter(kind__slug='address'),
+            to_attr='postal_address_contacts'))
+        if office_place.organisation.is_ongoing()
+    ]
+    organisation_ids = [p.organisation_id for p in nearest_office_places]
+
+    # Find the party for each office; as before, if there are several
+    # the last one wins:
+    organisation_id_to_party = {}
+    for org_rel in OrganisationRelationship.objects \
+            .filter(organisation_b__in=organisation_ids, kind__name='has_office') \
+            .select_related('organisation_a') \
+            .order_by('id'):
+        organisation_id_to_party[org_rel.organisation_b_id] = org_rel.organisation_a
+
+    organisation_id_to_contact_positions = defaultdict(list)
+    contact_positions = Position.objects \
+        .filter(organisation__in=organisation_ids, title__slug='constituency-contact') \
+        .currently_active() \
+        .select_related('person')
+    for position in contact_positions:
+        organisation_id_to_contact_positions[position.organisation_id].append(position)
+    person_ids = set(p.person_id for p in contact_positions)
+
+    person_id_to_mp_positions = defaultdict(list)
+    person_id_to_mpl_positions = defaultdict(list)
+    legislature_positions = Position.objects \
+        .filter(person__in=person_ids, title__slug='member') \
+        .filter(
+            Q(organisation__slug='national-assembly') |
+            Q(organisation__kind__slug='provincial-legislature')) \
+        .currently_active() \
+        .select_related('title', 'organisation__kind')
+    for position in legislature_positions:
+        if position.organisation.slug == 'national-assembly':
+            person_id_to_mp_positions[position.person_id].append(position)
+        else:
+            person_id_to_mpl_positions[position.person_id].append(position)
+
+    # The first email address and phone number of each person, in the
+    # default ordering of contacts:
+    person_content_type = ContentType.objects.get_for_model(Person)
+    person_contacts = defaultdict(dict)
+    for object_id, kind_slug, value in Contact.objects \
+            .filter(
+                content_type=person_content_type,
+                object_id__in=person_ids,
+                kind__slug__in=('email', 'voice')) \
+            .values_list('object_id', 'kind__slug', 'value'):
+        person_contacts[object_id].setdefault(kind_slug, value)
+
+    person_id_to_image = dict(
+        (image.object_id, image.image) for image in
+        Image.objects.filter(
+            content_type=person_content_type,
+            object_id__in=person_ids,
+            is_primary=True)
+    )
+
+    mp_data = []
+    mpl_data = []
+    for office_place in nearest_office_places:
+        organisation = office_place.organisation
+        party = organisation_id_to_party.get(organisation.id)
+        office_data = get_office_data(
+            office_place,
+            [c.value for c in organisation.postal_address_contacts])
+        # Find all the constituency contacts:
+        for i, position in enumerate(
+                organisation_id_to_contact_positions[organisation.id]):
+            person = position.person
+            person_data = {
+                'name': person.legal_name,
+                'person': get_person_data(
+                    person, person_id_to_image.get(person.id)),
+                'email': person_contacts[person.id].get('email'),
+                'phone': person_contacts[person.id].get('voice'),
+                'postal_addresses': office_data['postal_addresses'],
+                'party': get_party_data(party),
+                'has_party_logo': bool(party) and party.slug in PARTY_SLUGS_THAT_HAVE_LOGOS,
+                'office_place': office_data,
+                'element_id': 'constituency-contact-{office_id}-{i}'.format(
+                    office_id=organisation.id, i=i
+                ),
+            }
+
+            mp_positions = person_id_to_mp_positions[person.id]
+            if mp_positions:
+                mp_data.append(dict(
+                    person_data,
+                    positions=[get_position_data(p) for p in mp_positions],
+                    is_mp=True,
+                ))
+            mpl_positions = person_id_to_mpl_positions[person.id]
+            if mpl_positions:
+                mpl_data.append(dict(
+                    person_data,
+                    positions=[get_position_data(p) for p in mpl_positions],
+                    is_mpl=True,
+                ))
+
+    return {
+        'mp_data': mp_data,
+        'mpl_data': mpl_data,
+    }
+
+
+def get_nearby_representatives(lat, lon, radius):
+    """Like find_nearby_representatives, but cached for the grid cell"""
+    lat, lon = snap_to_grid(lat, lon)
+    key = get_cache_key('nearby-representatives', lat, lon, radius)
+    result = cache.get(key)
+    if result is None:
+        result = find_nearby_representatives(lat, lon, radius)
+        cache.set(key, result, settings.NEARBY_REPRESENTATIVES_CACHE_TIMEOUT)
+    return result
+
+
+def find_ward_councillors(lat, lon):
+    # Look up the ward on MapIt:
+    url = 'http://mapit.code4sa.org/point/4326/{lon},{lat}?type=WD'.format(
+        lon=lon, lat=lat
+    )
+    try:
+        r = requests.get(url, timeout=API_REQUESTS_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        raise WardCouncillorAPIDown(u"MapIt request failed: {0}".format(e))
+    mapit_json = r.json()
+    if not mapit_json:
+        return []
+    ward_id = mapit_json.values()[0]['name']
+    # Then find the ward councillor from that ward ID. There
+    # should only be one at the moment, but make it a list in case
+    # we support broader lookups in the future:
+    url_fmt = 'http://nearby.code4sa.org/councillor/ward-{ward_id}.json'
+    try:
+        r = requests.get(
+            url_fmt.format(ward_id=ward_id),
+            timeout=API_REQUESTS_TIMEOUT)
+        r.raise_for_status()
+        ward_result = r.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise WardCouncillorAPIDown(unicode(e))
+    councillor_data = ward_result['councillor']
+    party = Organisation.objects.filter(
+        name__icontains=councillor_data['PartyDetail']['Name'].lower(),
+        kind__slug='party'
+    ).first()
+    has_party_logo = bool(party) and (party.slug in PARTY_SLUGS_THAT_HAVE_LOGOS)
+
+    return [
+        {
+            'name': councillor_data['Name'],
+            'person': None,
+            'email': councillor_data['custom_contact_details'].get('email', ''),
+            'phone': councillor_data['custom_contact_details'].get('phone', ''),
+            'postal_addresses': [],
+            'party': get_party_data(party),
+            'has_party_logo': has_party_logo,
+            'ward_data': ward_result,
+            'ward_mapit_area_id': mapit_json.values()[0]['id'],
+            'positions': [
+                {
+                    'title': {'name': 'Ward Councillor'}
+                }
+            ],
+            'element_id': 'ward-councillor-{ward_id}-0'.format(
+                ward_id=ward_id
+            ),
+        }
+    ]
+
+
+def get_ward_councillors(lat, lon):
+    """Like find_ward_councillors, but cached for the grid cell
+
+    Failures to reach the external APIs aren't cached, so they'll be
+    retried on the next request."""
+    lat, lon = snap_to_grid(lat, lon)
+    key = get_cache_key('ward-councillors', lat, lon)
+    result = cache.get(key)
+    if result is None:
+        result = find_ward_councillors(lat, lon)
+        cache.set(key, result, settings.NEARBY_REPRESENTATIVES_CACHE_TIMEOUT)
+    return result
@@ -2,7 +2,7 @@ from __future__ import division
 
 import re
 import os
-from datetime import date, time
+from datetime import date, datetime, time
 from StringIO import StringIO
 from urlparse import urlparse
 
@@ -13,9 +13,8 @@ from mock import patch, MagicMock
 from django.contrib.gis.geos import Polygon, Point
 from django.test import TestCase
 from django.test.client import Client
-from django.test.utils import override_settings
-
-from django.core.cache import caches
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.db import connection
 
 from django.core.urlresolvers import reverse, resolve
 from django.core.management import call_command
@@ -34,6 +33,10 @@ from info.models import InfoPage
 
 from pombola.core import models
 from pombola import south_africa
+from pombola.south_africa.election_statistics import compute_election_statistics
+from pombola.south_africa.models import ElectionStatistics, PMGAPIData
+from pombola.south_africa.pmg_api import PMGAPIError, refresh_pmg_api_data
+from pombola.south_africa.representatives import find_nearby_representatives
 from pombola.south_africa.views import SAPersonDetail
 from pombola.core.views import PersonSpeakerMappingsMixin
 from instances.models import Instance
@@ -188,6 +191,64 @@ class ConstituencyOfficesTestCase(WebTest):
         assert len(content_boxes[0].findAll('li')) == 2, 'Box 0 should contain two sections, each with a party office.'
         assert len(content_boxes[1].findAll('li')) == 1, 'Box 1 should contain one sections, as the other party office is outside the box.'
 
+    def add_constituency_contact(self, office_slug, person_slug):
+        title_contact, _ = models.PositionTitle.objects.get_or_create(
+            name='Constituency Contact', slug='constituency-contact')
+        title_member, _ = models.PositionTitle.objects.get_or_create(
+            name='Member', slug='member')
+        org_kind_parliament, _ = models.OrganisationKind.objects.get_or_create(
+            name='Parliament', slug='parliament')
+        national_assembly, _ = models.Organisation.objects.get_or_create(
+            name='National Assembly', slug='national-assembly',
+            kind=org_kind_parliament)
+        contact_kind_email, _ = models.ContactKind.objects.get_or_create(
+            name='Email', slug='email')
+        person = models.Person.objects.create(
+            legal_name=person_slug.title(), slug=person_slug)
+        models.Position.objects.create(
+            person=person,
+            organisation=models.Organisation.objects.get(slug=office_slug),
+            title=title_contact)
+        models.Position.objects.create(
+            person=person, organisation=national_assembly, title=title_member)
+        person.contacts.create(
+            kind=contact_kind_email, value=person_slug + '@example.org')
+        return person
+
+    def test_nearby_representatives_query_count_is_fixed(self):
+        self.add_constituency_contact('party1-office1', 'mp-one')
+        # Make sure the content types are cached before counting:
+        find_nearby_representatives(-29.1, 17.1, 25)
+        with CaptureQueriesContext(connection) as one_contact:
+            find_nearby_representatives(-29.1, 17.1, 25)
+
+        self.add_constituency_contact('party1-office2', 'mp-two')
+        self.add_constituency_contact('party1-office2', 'mp-three')
+        with CaptureQueriesContext(connection) as three_contacts:
+            result = find_nearby_representatives(-29.1, 17.1, 25)
+
+        self.assertEqual(len(one_contact), len(three_contacts))
+        self.assertEqual(
+            sorted(d['name'] for d in result['mp_data']),
+            ['Mp-One', 'Mp-Three', 'Mp-Two'])
+        # The nearest office's contact comes first:
+        self.assertEqual(result['mp_data'][0]['name'], 'Mp-One')
+        self.assertEqual(result['mp_data'][0]['email'], 'mp-one@example.org')
+        self.assertEqual(result['mp_data'][0]['party']['slug'], 'party1')
+        self.assertEqual(result['mpl_data'], [])
+
+    @patch('pombola.south_africa.views.get_ward_councillors', return_value=[])
+    def test_latlon_json(self, mocked_get_ward_councillors):
+        self.add_constituency_contact('party1-office1', 'mp-one')
+        response = self.app.get('/place/latlon/-29.1,17.1/json/')
+        data = json.loads(response.content)
+        self.assertEqual(data['province']['slug'], 'test_province')
+        self.assertEqual(data['ward_councillors'], [])
+        self.assertEqual(len(data['mps']), 1)
+        self.assertEqual(data['mps'][0]['person']['url'], '/person/mp-one/')
+        self.assertEqual(
+            data['mps'][0]['office_place']['name'], 'Party1: Office1')
+
     def tearDown(self):
         settings.MAPIT_AREA_SRID = self.old_srid
         settings.HAYSTACK_SIGNAL_PROCESSOR = self.old_HAYSTACK_SIGNAL_PROCESSOR
@@ -307,14 +368,6 @@ class SAPersonDetailViewTest(PersonSpeakerMappingsMixin, TestCase):
         # Make sure there are SayIt speakers for all Pombola
         call_command('pombola_sayit_sync_pombola_to_popolo')
 
-        # Put blank attendance data in the cache to stop us fetching from
-        # the live PMG API
-        pmg_api_cache = caches['pmg_api']
-        pmg_api_cache.set(
-            "http://api.pmg.org.za/member/moomin-finn/attendance/",
-            [],
-            )
-
     def _setup_positions_test_data(self):
         parliament = models.OrganisationKind.objects.create(
             name='Parliament',
@@ -485,6 +538,78 @@ class SAPersonDetailViewTest(PersonSpeakerMappingsMixin, TestCase):
             len(expected[1]['categories'][2]['entries'][0])
         )
 
+    def _add_person_page_records(self, person, n):
+        kinds = [
+            models.ContactKind.objects.get_or_create(slug=slug, name=slug)[0]
+            for slug in ('email', 'twitter', 'voice', 'address')
+        ]
+        party_kind, _ = models.OrganisationKind.objects.get_or_create(
+            slug='party', name='Party')
+        pt_member, _ = models.PositionTitle.objects.get_or_create(
+            slug='member', name='Member')
+        category, _ = Category.objects.get_or_create(
+            name=u"Test Category", sort_order=1)
+        for i in range(n):
+            for kind in kinds:
+                models.Contact.objects.create(
+                    content_object=person,
+                    kind=kind,
+                    value='{0}-{1}-{2}'.format(kind.slug, person.slug, i),
+                    preferred=False,
+                    )
+            party = models.Organisation.objects.create(
+                slug='party-{0}-{1}'.format(person.slug, i),
+                name='Party {0}'.format(i),
+                kind=party_kind,
+                )
+            person.position_set.create(
+                title=pt_member, category='political', organisation=party)
+            person.position_set.create(
+                title=pt_member, category='political', organisation=party,
+                end_date=ApproximateDate(year=1999),
+                )
+            release = Release.objects.create(
+                name=u'Release {0} {1}'.format(person.slug, i),
+                date=date(2000 + i, 1, 1),
+                )
+            models.InformationSource.objects.create(
+                content_object=release,
+                source='Register {0}'.format(i),
+                )
+            entry = Entry.objects.create(
+                person=person, release=release, category=category, sort_order=i)
+            EntryLineItem.objects.create(entry=entry, key=u'Field1', value=u'Value')
+            EntryLineItem.objects.create(entry=entry, key=u'Field2', value=u'Value')
+
+    def _count_person_page_queries(self, slug):
+        url = reverse('person', args=(slug,))
+        # Make sure that anything cached after the first request
+        # (e.g. ContentTypes) doesn't affect the count:
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_person_page_query_count_is_fixed(self):
+        small = models.Person.objects.get(slug='moomin-finn')
+        large = models.Person.objects.create(
+            legal_name='Snufkin', slug='snufkin')
+        models.Identifier.objects.create(
+            scheme='za.org.pmg.api/member',
+            identifier=large.slug,
+            content_object=large,
+            )
+        call_command('pombola_sayit_sync_pombola_to_popolo')
+
+        self._add_person_page_records(small, 1)
+        self._add_person_page_records(large, 5)
+
+        self.assertEqual(
+            self._count_person_page_queries('snufkin'),
+            self._count_person_page_queries('moomin-finn'),
+            )
+
     def test_attendance_data(self):
         test_data_path = os.path.join(
             os.path.dirname(os.path.realpath(__file__)),
@@ -493,10 +618,10 @@ class SAPersonDetailViewTest(PersonSpeakerMappingsMixin, TestCase):
         with open(test_data_path) as f:
             raw_data = json.load(f)
 
-        pmg_api_cache = caches['pmg_api']
-        pmg_api_cache.set(
-            "http://api.pmg.org.za/member/moomin-finn/attendance/",
-            raw_data['results'],
+        PMGAPIData.objects.create(
+            url="http://api.pmg.org.za/member/moomin-finn/attendance/",
+            results_json=json.dumps(raw_data['results']),
+            fetched=datetime.now(),
             )
 
         context = self.client.get(reverse('person', args=('moomin-finn',))).context
@@ -527,21 +652,19 @@ class SAPersonDetailViewTest(PersonSpeakerMappingsMixin, TestCase):
             )
 
     @patch('requests.get', side_effect=connection_error)
-    def test_attendance_data_requests_errors(self, m):
-        # Check context if identifier exists, cache lookup misses
-        # and the PMG API is unavailable.
-        pmg_api_cache = caches['pmg_api']
-        pmg_api_cache.clear()
-
+    def test_attendance_data_not_yet_fetched(self, m):
+        # Check context if identifier exists but the attendance data
+        # hasn't been fetched from the PMG API yet.
         context = self.client.get(reverse('person', args=('moomin-finn',))).context
         assert context['attendance'] == 'UNAVAILABLE'
 
-        # Get rid of identifiers so that we do the mocked url fetch
-        # to find the identifier.
+        # Without an identifier, the person isn't known to PMG, and
+        # the page shouldn't try to look them up.
         models.Identifier.objects.all().delete()
 
         context = self.client.get(reverse('person', args=('moomin-finn',))).context
-        assert context['attendance'] == 'UNAVAILABLE'
+        assert context['attendance'] == []
+        assert not m.called
 
     def _setup_example_positions(self, past, current):
         parliament = models.OrganisationKind.objects.create(
@@ -709,6 +832,66 @@ class SAAttendanceDataTest(TestCase):
         self.assertEqual(raw_stats, expected)
 
 
+def fake_pmg_response(status_code=200, data=None, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = json.dumps(data)
+    response.headers = headers or {}
+    return response
+
+
+@attr(country='south_africa')
+class PMGAPIDataTest(TestCase):
+    url = 'http://api.pmg.org.za/member/moomin-finn/attendance/'
+
+    @patch('requests.get')
+    def test_refresh_combines_pages(self, mocked_get):
+        mocked_get.side_effect = [
+            fake_pmg_response(
+                data={'results': [1, 2], 'next': self.url + '?page=1'},
+                headers={'ETag': '"abc"'}),
+            fake_pmg_response(data={'results': [3], 'next': None}),
+        ]
+        self.assertTrue(refresh_pmg_api_data(self.url))
+
+        data = PMGAPIData.objects.get(url=self.url)
+        self.assertEqual(data.results, [1, 2, 3])
+        self.assertEqual(data.etag, '"abc"')
+        self.assertIsNotNone(data.fetched)
+
+    @patch('requests.get')
+    def test_refresh_uses_conditional_request(self, mocked_get):
+        PMGAPIData.objects.create(
+            url=self.url,
+            results_json='[1, 2, 3]',
+            etag='"abc"',
+            fetched=datetime(2015, 1, 1))
+        mocked_get.return_value = fake_pmg_response(status_code=304)
+
+        self.assertFalse(refresh_pmg_api_data(self.url))
+
+        self.assertEqual(
+            mocked_get.call_args[1]['headers'], {'If-None-Match': '"abc"'})
+        data = PMGAPIData.objects.get(url=self.url)
+        self.assertEqual(data.results, [1, 2, 3])
+        self.assertGreater(data.fetched, datetime(2015, 1, 1))
+
+    @patch('requests.get', side_effect=connection_error)
+    def test_failed_refresh_keeps_stale_data(self, mocked_get):
+        PMGAPIData.objects.create(
+            url=self.url,
+            results_json='[1, 2, 3]',
+            fetched=datetime(2015, 1, 1))
+
+        with self.assertRaises(PMGAPIError):
+            refresh_pmg_api_data(self.url)
+
+        data = PMGAPIData.objects.get(url=self.url)
+        self.assertEqual(data.results, [1, 2, 3])
+        self.assertEqual(data.fetched, datetime(2015, 1, 1))
+        self.assertNotEqual(data.last_error, '')
+
+
 @attr(country='south_africa')
 class SAPersonProfileSubPageTest(WebTest):
     def setUp(self):
@@ -776,11 +959,8 @@ class SAPersonProfileSubPageTest(WebTest):
             end_date='2014-04-01',
         )
 
-        # Make some identifiers for these people so we avoid
-        # looking them up with PMG, and put blank attendance data
-        # in the cache to stop us fetching from the live PMG API.
-        pmg_api_cache = caches['pmg_api']
-
+        # Make some identifiers for these people, as if they had
+        # been looked up with PMG.
         for person in (self.deceased, self.former_mp):
             models.Identifier.objects.create(
                 scheme='za.org.pmg.api/member',
@@ -788,11 +968,6 @@ class SAPersonProfileSubPageTest(WebTest):
                 content_object=person,
                 )
 
-            pmg_api_cache.set(
-                "http://api.pmg.org.za/member/{}/attendance/".format(person.slug),
-                [],
-                )
-
 
     def get_person_summary(self, soup):
         return soup.find('div', class_='person-summary')
@@ -840,6 +1015,40 @@ class SAPersonProfileSubPageTest(WebTest):
 
         self.assertRegexpMatches(former_pos_list, r'Member\s+at National Assembly \(Parliament\)')
 
+    @patch('requests.get')
+    def test_former_mp_attendance(self, mocked_get):
+        test_data_path = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)),
+            'data/test/attendance_587.json',
+            )
+        with open(test_data_path) as f:
+            raw_data = json.load(f)
+        former_mp_url = 'http://api.pmg.org.za/member/former-mp/attendance/'
+
+        def fake_get(url, **kwargs):
+            if url == former_mp_url:
+                return fake_pmg_response(
+                    data={'results': raw_data['results'], 'next': None})
+            return fake_pmg_response(data={'results': [], 'next': None})
+        mocked_get.side_effect = fake_get
+
+        # The former MP isn't a current member, but their attendance
+        # should still be refreshed, since it's shown on their page:
+        call_command('south_africa_update_pmg_attendance')
+        requested_urls = [c[0][0] for c in mocked_get.call_args_list]
+        self.assertIn(former_mp_url, requested_urls)
+
+        response = self.app.get('/person/former-mp/')
+        self.assertEqual(
+            response.context['attendance'][0],
+            {'total': 28, 'percentage': 89.28571428571429, 'attended': 25, 'year': 2015})
+
+        # Then it's not refreshed again until it's a week old:
+        mocked_get.reset_mock()
+        call_command('south_africa_update_pmg_attendance')
+        requested_urls = [c[0][0] for c in mocked_get.call_args_list]
+        self.assertNotIn(former_mp_url, requested_urls)
+
 
 @attr(country='south_africa')
 class SAOrganisationPartySubPageTest(TestCase):
@@ -2025,3 +2234,106 @@ class SAUrlRoutingTest(TestCase):
     def test_za_home(self):
         match = resolve('/')
         self.assertEqual(match.func.func_name, 'SAHomeView')
+
+
+@attr(country='south_africa')
+class SAElectionStatisticsTest(TestCase):
+
+    def setUp(self):
+        party_kind = models.OrganisationKind.objects.create(
+            name='Party', slug='party')
+        election_list_kind = models.OrganisationKind.objects.create(
+            name='Election List', slug='election-list')
+        parliament_kind = models.OrganisationKind.objects.create(
+            name='Parliament', slug='parliament')
+        models.PlaceKind.objects.create(name='Province', slug='province')
+
+        national_assembly = models.Organisation.objects.create(
+            name='National Assembly', slug='national-assembly', kind=parliament_kind)
+        self.anc = models.Organisation.objects.create(
+            name='ANC', slug='anc', kind=party_kind)
+        da = models.Organisation.objects.create(
+            name='DA', slug='da', kind=party_kind)
+        anc_list = models.Organisation.objects.create(
+            name='ANC National Election List 2014',
+            slug='anc-national-election-list-2014',
+            kind=election_list_kind)
+        models.Organisation.objects.create(
+            name='DA National Election List 2014',
+            slug='da-national-election-list-2014',
+            kind=election_list_kind)
+
+        member = models.PositionTitle.objects.create(name='Member', slug='member')
+        candidate = models.PositionTitle.objects.create(
+            name='1st Candidate', slug='1st_candidate')
+
+        alice = models.Person.objects.create(legal_name='Alice', slug='alice')
+        alice.position_set.create(organisation=national_assembly, title=member)
+        alice.position_set.create(organisation=self.anc, title=member)
+        alice.position_set.create(organisation=anc_list, title=candidate)
+
+        bob = models.Person.objects.create(legal_name='Bob', slug='bob')
+        bob.position_set.create(organisation=national_assembly, title=member)
+        bob.position_set.create(organisation=da, title=member)
+
+        carol = models.Person.objects.create(legal_name='Carol', slug='carol')
+        carol.position_set.create(
+            organisation=da, title=member,
+            end_date=ApproximateDate(year=2010))
+        carol.position_set.create(organisation=self.anc, title=member)
+        carol.position_set.create(organisation=anc_list, title=candidate)
+
+    def test_compute_election_statistics(self):
+        statistics = compute_election_statistics('2014')
+        self.assertEqual(
+            statistics['current_mps'],
+            {
+                'all': {'current': 2, 'rerunning': 1, 'percent_rerunning': 50},
+                'byparty': [
+                    {
+                        'party': {'name': 'ANC', 'slug': 'anc'},
+                        'current': 1,
+                        'rerunning': 1,
+                        'percent_rerunning': 100,
+                    },
+                    {
+                        'party': {'name': 'DA', 'slug': 'da'},
+                        'current': 1,
+                        'rerunning': 0,
+                        'percent_rerunning': 0,
+                    },
+                ],
+            })
+        self.assertEqual(
+            statistics['people_new_party'],
+            [{
+                'person': {'name': 'Carol', 'url': '/person/carol/'},
+                'person_list': ['ANC National Election List 2014'],
+                'current_positions': ['ANC'],
+                'former_positions': ['DA'],
+            }])
+
+    def test_statistics_view_uses_stored_statistics(self):
+        url = reverse('sa-election-statistics-year', args=('2014',))
+        response = self.client.get(url)
+        self.assertEqual(response.context['current_mps']['all']['current'], 2)
+        self.assertContains(response, '<a href="/person/carol/">Carol</a>', html=True)
+
+        dave = models.Person.objects.create(legal_name='Dave', slug='dave')
+        dave.position_set.create(
+            organisation=models.Organisation.objects.get(slug='national-assembly'),
+            title=models.PositionTitle.objects.get(slug='member'))
+
+        # The stored statistics are used until they're updated:
+        response = self.client.get(url)
+        self.assertEqual(response.context['current_mps']['all']['current'], 2)
+
+        call_command('south_africa_update_election_statistics')
+        response = self.client.get(url)
+        self.assertEqual(response.context['current_mps']['all']['current'], 3)
+
+    def test_statistics_view_unknown_year(self):
+        url = reverse('sa-election-statistics-year', args=('1066',))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(ElectionStatistics.objects.exists())
@@ -4,24 +4,18 @@ from collections import defaultdict
 import datetime
 import dateutil
 import json
-import logging
 import re
 import string
-import urllib
 from urlparse import urlsplit
 import warnings
 
-import requests
-
 from django.contrib.gis.geos import Point
-from django.contrib.gis.measure import D
-from django.http import Http404
+from django.http import Http404, HttpResponse
 from django.db.models import Count, Min, Max
-from django.core.cache import caches
 from django.core.exceptions import ObjectDoesNotExist
 from django.shortcuts import redirect
 from django.core.urlresolvers import reverse
-from django.views.generic import RedirectView, TemplateView
+from django.views.generic import RedirectView, TemplateView, View
 from django.shortcuts import get_object_or_404
 from django import forms
 from django.utils.http import urlquote
@@ -52,36 +46,27 @@ from pombola.core.views import (HomeView, BasePlaceDetailView, PlaceDetailView,
     OrganisationDetailSub, CommentArchiveMixin, PersonSpeakerMappingsMixin)
 from pombola.search.views import GeocoderView, SearchBaseView
 
+from pombola.south_africa.election_statistics import get_election_statistics
 from pombola.south_africa.models import ZAPlace
+from pombola.south_africa.person_page import PersonPageData
+from pombola.south_africa.pmg_api import (
+    ATTENDANCE_SUMMARY_URL, get_member_attendance_url, get_stored_results
+)
+from pombola.south_africa.representatives import (
+    CONSTITUENCY_OFFICE_PLACE_KIND_SLUGS, PARTY_SLUGS_THAT_HAVE_LOGOS,
+    WardCouncillorAPIDown,
+    get_nearby_representatives, get_ward_councillors
+)
 
 from pombola.interests_register.models import Release, Category, Entry
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django_date_extensions.fields import ApproximateDate
 
 
-# For requests to external APIs, timeout after 3 seconds:
-API_REQUESTS_TIMEOUT = 3.05
-
-
-logger = logging.getLogger('django.request')
-
-
 class AttendanceAPIDown(Exception):
     pass
 
 
-class WardCouncillorAPIDown(Exception):
-    pass
-
-
-# In the short term, until we have a list of constituency offices and
-# addresses from DA, let's bundle these together.
-CONSTITUENCY_OFFICE_PLACE_KIND_SLUGS = (
-    'constituency-office',
-    'constituency-area', # specific to DA party
-)
-
-
 class SAHomeView(HomeView):
 
     def get_context_data(self, **kwargs):
@@ -132,179 +117,58 @@ class SAGeocoderView(GeocoderView):
 class LocationSearchForm(SearchForm):
     q = forms.CharField(required=False, label=_('Search'), widget=forms.TextInput(attrs={'placeholder': 'Your address'}))
 
-class LatLonDetailBaseView(BasePlaceDetailView):
+class LatLonDetailMixin(object):
 
     # Using 25km as the default, as that's what's used on MyReps.
     constituency_office_search_radius = 25
 
-    # The codes used here should match the party slugs, and the names of the
-    # icon files in .../static/images/party-map-icons/
-    party_slugs_that_have_logos = set((
-        'adcp', 'anc', 'apc', 'azapo', 'cope', 'da', 'ff', 'id', 'ifp', 'mf',
-        'pac', 'sacp', 'ucdp', 'udm', 'agang', 'aic', 'eff'
-    ));
+    party_slugs_that_have_logos = PARTY_SLUGS_THAT_HAVE_LOGOS
 
-    def get_object(self):
+    def get_location(self):
         # FIXME - handle bad args better.
         lat = float(self.kwargs['lat'])
         lon = float(self.kwargs['lon'])
+        return Point(lon, lat)
 
-        self.location = Point(lon, lat)
-
-        areas = mapit.models.Area.objects.by_location(self.location)
+    def get_province(self, location):
+        areas = mapit.models.Area.objects.by_location(location)
 
         try:
             # FIXME - Handle getting more than one province.
-            province = models.Place.objects.get(mapit_area__in=areas, kind__slug='province')
+            return models.Place.objects.get(mapit_area__in=areas, kind__slug='province')
         except models.Place.DoesNotExist:
             raise Http404
 
-        return province
+    def get_representatives_data(self, location):
+        """Return the ward councillors, MPs and MPLs near location
 
-    def get_ward_councillors(self, location):
-        # Look up the ward on MapIt:
-        url = 'http://mapit.code4sa.org/point/4326/{lon},{lat}?type=WD'.format(
-            lon=location.x, lat=location.y
-        )
-        try:
-            r = requests.get(url, timeout=API_REQUESTS_TIMEOUT)
-        except requests.exceptions.RequestException as e:
-            raise WardCouncillorAPIDown(u"MapIt request failed: {0}".format(e))
-        mapit_json = r.json()
-        if not mapit_json:
-            return []
-        ward_id = mapit_json.values()[0]['name']
-        # Then find the ward councillor from that ward ID. There
-        # should only be one at the moment, but make it a list in case
-        # we support broader lookups in the future:
-        url_fmt = 'http://nearby.code4sa.org/councillor/ward-{ward_id}.json'
+        These come from the cache for location's grid cell if they
+        can; see pombola.south_africa.representatives."""
+        data = {}
         try:
-            r = requests.get(
-                url_fmt.format(ward_id=ward_id),
-                timeout=API_REQUESTS_TIMEOUT)
-            r.raise_for_status()
-            ward_result = r.json()
-        except (requests.exceptions.RequestException, ValueError) as e:
-            raise WardCouncillorAPIDown(unicode(e))
-        councillor_data = ward_result['councillor']
-        party = models.Organisation.objects.filter(
-            name__icontains=councillor_data['PartyDetail']['Name'].lower(),
-            kind__slug='party'
-        ).first()
-        has_party_logo = party and (party.slug in self.party_slugs_that_have_logos)
-
-        return [
-            {
-                'name': councillor_data['Name'],
-                'person': None,
-                'email': councillor_data['custom_contact_details'].get('email', ''),
-                'phone': councillor_data['custom_contact_details'].get('phone', ''),
-                'postal_addresses': [],
-                'party': party,
-                'has_party_logo': has_party_logo,
-                'ward_data': ward_result,
-                'ward_mapit_area_id': mapit_json.values()[0]['id'],
-                'positions': [
-                    {
-                        'title': {'name': 'Ward Councillor'}
-                    }
-                ],
-                'element_id': 'ward-councillor-{ward_id}-0'.format(
-                    ward_id=ward_id
-                ),
-            }
-        ]
+            data['ward_data'] = get_ward_councillors(location.y, location.x)
+        except WardCouncillorAPIDown as e:
+            data['ward_data'] = []
+            data['ward_data_not_available'] = u"The error was: {0}".format(e)
+        data.update(get_nearby_representatives(
+            location.y, location.x, self.constituency_office_search_radius))
+        return data
+
+
+class LatLonDetailBaseView(LatLonDetailMixin, BasePlaceDetailView):
+
+    def get_object(self):
+        self.location = self.get_location()
+        return self.get_province(self.location)
 
     def get_context_data(self, **kwargs):
         context = super(LatLonDetailBaseView, self).get_context_data(**kwargs)
 
-        try:
-            context['ward_data'] = self.get_ward_councillors(self.location)
-        except WardCouncillorAPIDown as e:
-            context['ward_data'] = []
-            context['ward_data_not_available'] = u"The error was: {0}".format(e)
+        context.update(self.get_representatives_data(self.location))
 
         context['location'] = self.location
         context['office_search_radius'] = self.constituency_office_search_radius
 
-        nearest_office_places = (
-            ZAPlace.objects
-            .filter(kind__slug__in=CONSTITUENCY_OFFICE_PLACE_KIND_SLUGS)
-            .distance(self.location)
-            .filter(location__distance_lte=(self.location, D(km=self.constituency_office_search_radius)))
-            .order_by('distance')
-            .select_related('organisation')
-            .prefetch_related('organisation__org_rels_as_b')
-            .prefetch_related('organisation__position_set')
-        )
-
-        context['mp_data'] = mp_data = []
-        context['mpl_data'] = mpl_data = []
-
-        for office_place in nearest_office_places:
-            organisation = office_place.organisation
-            if not organisation.is_ongoing():
-                continue
-            # Get the party and party logo:
-            party = None
-            has_party_logo = False
-            for org_rel in organisation.org_rels_as_b.all():
-                if org_rel.kind.name == 'has_office':
-                    party = org_rel.organisation_a
-                    if party.slug in self.party_slugs_that_have_logos:
-                       has_party_logo = True
-            # Find all the constituency contacts:
-            for i, position in enumerate(
-                    organisation.position_set.filter(
-                        title__slug='constituency-contact'
-                    ).currently_active()
-            ):
-                person = position.person
-                element_id = 'constituency-contact-{office_id}-{i}'.format(
-                    office_id=position.organisation.id, i=i
-                )
-                mp_positions = person.position_set \
-                    .filter(
-                        organisation__slug='national-assembly',
-                        title__slug='member'
-                    ) \
-                    .currently_active()
-                mpl_positions = person.position_set \
-                    .filter(
-                        organisation__kind__slug='provincial-legislature',
-                        title__slug='member'
-                    ) \
-                    .currently_active()
-                email, phone = None, None
-                email_contact = person.contacts.filter(kind__slug='email').first()
-                if email_contact:
-                    email = email_contact.value
-                phone_contact = person.contacts.filter(kind__slug='voice').first()
-                if phone_contact:
-                    phone = phone_contact.value
-                person_data = {
-                    'name': person.legal_name,
-                    'person': person,
-                    'email': email,
-                    'phone': phone,
-                    'postal_addresses': [
-                        pa.value for pa in office_place.postal_addresses()
-                        ],
-                    'party': party,
-                    'has_party_logo': has_party_logo,
-                    'office_place': office_place,
-                    'element_id': element_id,
-                    }
-
-                if mp_positions:
-                    person_data['positions'] = mp_positions
-                    person_data['is_mp'] = True
-                    mp_data.append(person_data)
-                if mpl_positions:
-                    person_data['positions'] = mpl_positions
-                    person_data['is_mpl'] = True
-                    mpl_data.append(person_data)
-
         context['form'] = LocationSearchForm(
             initial={'q': self.request.GET.get('q')}
         )
@@ -315,6 +179,32 @@ class LatLonDetailLocalView(LatLonDetailBaseView):
     template_name = 'south_africa/latlon_local_view.html'
 
 
+class LatLonDetailJSONView(LatLonDetailMixin, View):
+    """Return the representatives near a location as JSON"""
+
+    def get(self, request, *args, **kwargs):
+        location = self.get_location()
+        province = self.get_province(location)
+        data = self.get_representatives_data(location)
+        result = {
+            'location': {'lat': location.y, 'lon': location.x},
+            'province': {
+                'name': province.name,
+                'slug': province.slug,
+                'url': province.get_absolute_url(),
+            },
+            'office_search_radius': self.constituency_office_search_radius,
+            'ward_councillors': data['ward_data'],
+            'mps': data['mp_data'],
+            'mpls': data['mpl_data'],
+        }
+        if 'ward_data_not_available' in data:
+            result['ward_councillors_error'] = data['ward_data_not_available']
+        return HttpResponse(
+            json.dumps(result),
+            content_type='application/json',
+        )
+
 
 class SAPlaceDetailView(PlaceDetailView):
 
@@ -591,91 +481,18 @@ class SAOrganisationDetailSubPeople(SAOrganisationDetailSub):
             context['membertitle'] = 'member'
 
 class SAPersonDetail(PersonSpeakerMappingsMixin, PersonDetail):
-    important_org_kind_slugs = ('national-executive', 'parliament', 'provincial-legislature')
-
-    def get_recent_speeches_for_section(self, tags, limit=5):
-        pombola_person = self.object
-        sayit_speaker = self.pombola_person_to_sayit_speaker(pombola_person)
-
-        if not sayit_speaker:
-            # Without a speaker we can't find any speeches
-            return Speech.objects.none()
-
-        speeches = Speech.objects \
-            .filter(tags__name__in=tags, speaker=sayit_speaker) \
-            .order_by('-start_date', '-start_time')
-
-        if limit:
-            speeches = speeches[:limit]
-
-        return speeches
-
-
-    def get_tabulated_interests(self):
-        interests = self.object.interests_register_entries.all()
-        tabulated = {}
-
-        release_content_type = ContentType.objects.get_for_model(Release)
-
-        for entry in interests:
-            release = entry.release
-            category = entry.category
-
-            if release.id not in tabulated:
-                sources = models.InformationSource.objects.filter(
-                    content_type=release_content_type,
-                    object_id=release.id
-                )
-
-                tabulated[release.id] = {
-                    'name': release.name,
-                    'categories': {},
-                    'informationsource': sources
-                }
-
-            if category.id not in tabulated[release.id]['categories']:
-                tabulated[release.id]['categories'][category.id] = {
-                    'name': category.name,
-                    'headings': [],
-                    'headingindex': {},
-                    'headingcount': 1,
-                    'entries': []
-                }
-
-            #create row list
-            tabulated[release.id]['categories'][category.id]['entries'].append(
-                ['']*(tabulated[entry.release.id]['categories'][entry.category.id]['headingcount']-1)
-            )
-
-            #loop through each 'cell' in the row
-            for entrylistitem in entry.line_items.all():
-                #if the heading for the column does not yet exist, create it
-                if entrylistitem.key not in tabulated[entry.release.id]['categories'][entry.category.id]['headingindex']:
-                    tabulated[release.id]['categories'][category.id]['headingindex'][entrylistitem.key] = tabulated[entry.release.id]['categories'][entry.category.id]['headingcount']-1
-                    tabulated[release.id]['categories'][category.id]['headingcount']+=1
-                    tabulated[release.id]['categories'][category.id]['headings'].append(entrylistitem.key)
-
-                    #loop through each row that already exists to ensure lists are the same size
-                    for (key, line) in enumerate(tabulated[release.id]['categories'][category.id]['entries']):
-                        tabulated[entry.release.id]['categories'][entry.category.id]['entries'][key].append('')
-
-                #record the 'cell' in the correct position in the row list
-                tabulated[release.id]['categories'][category.id]['entries'][-1][tabulated[release.id]['categories'][category.id]['headingindex'][entrylistitem.key]] = entrylistitem.value
-
-        ret = []
+    important_org_kind_slugs = PersonPageData.important_org_kind_slugs
 
-        for release_id, release_data in tabulated.items():
-            release = Release.objects.get(pk=release_id)
+    # The name, tags and maximum number of the recent speeches to show:
+    recent_speech_sections = {
+        'hansard': (('hansard',), 2),
+        'committee': (('committee',), 5),
+        'question': (('question', 'answer'), 3),
+    }
 
-            ret.append((release_data, release.date))
-
-        ret.sort(key=lambda x: x[1], reverse=True)
-
-        return ret
-
-    def list_contacts(self, kind_slugs):
-        return self.object.contacts.filter(kind__slug__in=kind_slugs).values_list(
-            'value', flat=True)
+    def get_page_data(self):
+        return PersonPageData(
+            self.object, self.pombola_person_to_sayit_speaker(self.object))
 
     def get_former_parties(self, person):
         former_party_memberships = (
@@ -690,67 +507,20 @@ class SAPersonDetail(PersonSpeakerMappingsMixin, PersonDetail):
         )
         return models.Organisation.objects.filter(position__in=former_party_memberships).distinct()
 
-    def store_or_get_pmg_member_id(self, scheme='za.org.pmg.api/member'):
-        identifier = self.object.get_identifier(scheme)
-
-        if not identifier:
-            # First find the id of the person
-            pa_link = urllib.quote(
-                "http://www.pa.org.za/person/{}/".format(self.object.slug))
-
-            url_fmt = "https://api.pmg.org.za/member/?filter[pa_link]={}"
-            api_search_url = url_fmt.format(pa_link)
-            try:
-                search_resp = requests.get(
-                    api_search_url, timeout=API_REQUESTS_TIMEOUT)
-            except requests.exceptions.RequestException:
-                raise AttendanceAPIDown
-            search_data = json.loads(search_resp.text)
-
-            if not search_data.get('count'):
-                return None
-
-            if search_data['count'] > 1:
-                logger.error(
-                    'Duplicate members at PMG with slug {} - SKIPPING'.format(self.object.slug))
-                return None
-
-            identifier = search_data['results'][0]['id']
-
-            models.Identifier.objects.create(
-                scheme=scheme,
-                identifier=identifier,
-                content_object=self.object,
-                )
-
-        return identifier
-
-    def get_attendance_data_url(self, attendance_url_template="http://api.pmg.org.za/member/{}/attendance/"):
-        identifier = self.store_or_get_pmg_member_id()
-
-        if identifier:
-            return attendance_url_template.format(identifier)
-
     def download_attendance_data(self):
-        attendance_url = next_url = self.get_attendance_data_url()
-
-        cache = caches['pmg_api']
-        results = cache.get(attendance_url)
+        """Return the stored PMG attendance data for this person
+
+        This data is refreshed by the south_africa_update_pmg_attendance
+        management command rather than being fetched here.  If the
+        person isn't known to PMG, there's no data; if their data
+        hasn't been fetched yet, AttendanceAPIDown is raised."""
+        attendance_url = get_member_attendance_url(self.object)
+        if not attendance_url:
+            return []
 
+        results = get_stored_results(attendance_url)
         if results is None:
-            results = []
-            while next_url:
-                try:
-                    resp = requests.get(next_url, timeout=API_REQUESTS_TIMEOUT)
-                except requests.exceptions.RequestException:
-                    raise AttendanceAPIDown
-
-                data = json.loads(resp.text)
-                results.extend(data.get('results'))
-
-                next_url = data.get('next')
-
-            cache.set(attendance_url, results)
+            raise AttendanceAPIDown
 
         # Results are returned from the API most recent first, which
         # is convenient for us.
@@ -837,50 +607,34 @@ class SAPersonDetail(PersonSpeakerMappingsMixin, PersonDetail):
 
     def get_context_data(self, **kwargs):
         context = super(SAPersonDetail, self).get_context_data(**kwargs)
-        context['twitter_contacts'] = self.list_contacts(('twitter',))
-        context['facebook_contacts'] = self.list_contacts(('facebook',))
-        context['linkedin_contacts'] = self.list_contacts(('linkedin',))
-        context['youtube_contacts'] = self.list_contacts(('youtube',))
-        context['whoswhosa_contacts'] = self.list_contacts(('whos-who-sa',))
+        page_data = self.get_page_data()
+        context['twitter_contacts'] = page_data.list_contacts(('twitter',))
+        context['facebook_contacts'] = page_data.list_contacts(('facebook',))
+        context['linkedin_contacts'] = page_data.list_contacts(('linkedin',))
+        context['youtube_contacts'] = page_data.list_contacts(('youtube',))
+        context['whoswhosa_contacts'] = page_data.list_contacts(('whos-who-sa',))
         # The email attribute of the person might also be duplicated
         # in a contact of type email, so create a set of email
         # addresses:
-        context['email_contacts'] = set(self.list_contacts(('email',)))
+        context['email_contacts'] = set(page_data.list_contacts(('email',)))
         if self.object.email:
             context['email_contacts'].add(self.object.email)
-        context['phone_contacts'] = self.list_contacts(('cell', 'voice'))
-        context['fax_contacts'] = self.list_contacts(('fax',))
-        context['address_contacts'] = self.list_contacts(('address',))
-
-        orgs_from_important_positions = models.Organisation.objects.filter(
-            kind__slug__in=self.important_org_kind_slugs,
-            position__in=self.object.politician_positions(),
-            )
-
-        former_important_positions = (
-            self.object.position_set
-            .all()
-            .political()
-            .previous()
-            .filter(organisation__kind__slug__in=self.important_org_kind_slugs)
-            )
+        context['phone_contacts'] = page_data.list_contacts(('cell', 'voice'))
+        context['fax_contacts'] = page_data.list_contacts(('fax',))
+        context['address_contacts'] = page_data.list_contacts(('address',))
 
-        former_orgs_from_important_positions = models.Organisation.objects.filter(
-            position__in=former_important_positions,
-            ).exclude(id__in=orgs_from_important_positions)
+        context['organizations_from_important_positions'], \
+            context['organizations_from_former_important_positions'] = \
+            page_data.get_important_organisations()
 
-        context['organizations_from_important_positions'] = \
-            orgs_from_important_positions.distinct()
-
-        context['organizations_from_former_important_positions'] = \
-            former_orgs_from_important_positions.distinct()
+        context['current_positions'], context['past_positions'] = \
+            page_data.get_positions()
 
         # FIXME - the titles used here will need to be checked and fixed.
-        context['hansard']   = self.get_recent_speeches_for_section(('hansard',), limit=2)
-        context['committee'] = self.get_recent_speeches_for_section(('committee',), limit=5)
-        context['question']  = self.get_recent_speeches_for_section(('question', 'answer'), limit=3)
+        context.update(
+            page_data.get_speeches_by_section(self.recent_speech_sections))
 
-        context['interests'] = self.get_tabulated_interests()
+        context['interests'] = page_data.get_tabulated_interests()
         if self.object.date_of_death != None:
             context['former_parties'] = self.get_former_parties(self.object)
 
@@ -1381,10 +1135,14 @@ class SAElectionOverviewMixin(TemplateView):
             if not party_slug in running_parties:
                 running_parties.append(party_slug)
 
-        # I am so sorry for this.
-        context['running_party_list'] = []
-        for running_party in running_parties:
-            context['running_party_list'].append(models.Organisation.objects.get(slug=running_party))
+        # Fetch all the running parties with one query:
+        slug_to_party = dict(
+            (o.slug, o) for o in
+            models.Organisation.objects.filter(slug__in=running_parties))
+        context['running_party_list'] = [
+            slug_to_party[slug] for slug in running_parties
+            if slug in slug_to_party
+        ]
 
         return context
 
@@ -1397,75 +1155,11 @@ class SAElectionStatisticsView(SAElectionOverviewMixin):
 
     def get_context_data(self, **kwargs):
         context = super(SAElectionStatisticsView, self).get_context_data(**kwargs)
-
-        context['current_mps'] = {'all': {}, 'byparty': []}
-
-        election_2014_query = (
-            Q(person__position__organisation__slug__contains='national-election-list-2014') |
-            (Q(person__position__organisation__slug__contains='election-list-2014') &
-             Q(person__position__organisation__slug__contains='regional'))
-            )
-
-        current_na_positions = (
-            models.Organisation.objects
-            .get(slug='national-assembly')
-            .position_set.all()
-            .currently_active()
-            )
-
-        context['current_mps']['all']['current'] = (
-            current_na_positions
-            .order_by('person__id')
-            .distinct('person__id')
-            .count()
-            )
-        context['current_mps']['all']['rerunning'] = (
-            current_na_positions
-            .filter(election_2014_query)
-            .order_by('person__id')
-            .distinct('person__id')
-            .count()
-            )
-        context['current_mps']['all']['percent_rerunning'] = 100 * context['current_mps']['all']['rerunning'] / context['current_mps']['all']['current']
-
-        #find the number of current MPs running for office per party
-        for p in context['party_list']:
-            party = models.Organisation.objects.get(slug=p.slug)
-            current = (
-                current_na_positions
-                .filter(person__position__organisation__slug=p.slug)
-                .order_by('person__id')
-                .distinct('person__id')
-                .count()
-                )
-            rerunning = (
-                current_na_positions
-                .filter(person__position__organisation__slug=p.slug)
-                .filter(election_2014_query)
-                .order_by('person__id')
-                .distinct('person__id')
-                .count()
-                )
-            if current:
-                percent = 100 * rerunning / current
-                context['current_mps']['byparty'].append({'party': party, 'current': current, 'rerunning': rerunning, 'percent_rerunning': percent})
-
-
-        #find individuals who appear to have switched party
-        context['people_new_party'] = []
-        people = models.Person.objects.filter(position__organisation__kind__slug='party', position__title__slug='member').annotate(num_parties=Count('position')).filter(num_parties__gt=1)
-
-        for person in people:
-            #check whether the person is a candidate - there is probably be a cleaner way to do this in the initial query
-            person_list = person.position_set.all().filter(organisation__slug__contains='election-list-2014')
-            if person_list:
-                context['people_new_party'].append({
-                    'person': person,
-                    'current_positions': person.position_set.all().filter(organisation__kind__slug='party').currently_active(),
-                    'former_positions': person.position_set.all().filter(organisation__kind__slug='party').currently_inactive(),
-                    'person_list': person_list
-                })
-
+        # These are recalculated by south_africa_update_election_statistics:
+        statistics = get_election_statistics(self.kwargs['election_year'])
+        if statistics is None:
+            raise Http404
+        context.update(statistics)
         return context
 
 class SAElectionNationalView(SAElectionOverviewMixin):
@@ -2117,25 +1811,8 @@ class SAMpAttendanceView(TemplateView):
         return int("{:.0f}".format(num / total * 100))
 
     def download_attendance_data(self):
-        attendance_url = next_url = 'https://api.pmg.org.za/committee-meeting-attendance/summary/'
-
-        cache = caches['pmg_api']
-        results = cache.get(attendance_url)
-
-        if results is None:
-            results = []
-            while next_url:
-                resp = requests.get(next_url, timeout=API_REQUESTS_TIMEOUT)
-                data = json.loads(resp.text)
-                results.extend(data.get('results'))
-
-                next_url = data.get('next')
-
-            cache.set(attendance_url, results)
-
-        # Results are returned from the API most recent first, which
-        # is convenient for us.
-        return results
+        """Return the stored PMG attendance summary, most recent first"""
+        return get_stored_results(ATTENDANCE_SUMMARY_URL) or []
 
     def get_context_data(self, **kwargs):
         data = self.download_attendance_data()
@@ -2152,8 +1829,11 @@ class SAMpAttendanceView(TemplateView):
         depart_early_codes = ['DE', 'LDE']
 
         context = {}
-        context['year'] = str(
-            dateutil.parser.parse(data[0]['end_date']).year)
+        if data:
+            context['year'] = str(
+                dateutil.parser.parse(data[0]['end_date']).year)
+        else:
+            context['year'] = ''
         context['party'] = ''
 
         for key in ('year', 'party'):
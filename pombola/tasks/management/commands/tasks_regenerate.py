@@ -0,0 +1,54 @@
+from optparse import make_option
+
+from django.apps import apps
+from django.core.management.base import CommandError, NoArgsCommand
+
+from pombola.tasks.regeneration import DEFAULT_BATCH_SIZE, regenerate_tasks
+
+
+class Command(NoArgsCommand):
+    help = 'Regenerate the tasks for every object of the models that have them'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--model',
+            action='append',
+            dest='models',
+            default=[],
+            help='Only regenerate tasks for this model, e.g. core.Person (can be repeated)'
+        ),
+        make_option(
+            '--batch-size',
+            type='int',
+            dest='batch_size',
+            default=DEFAULT_BATCH_SIZE,
+            help='How many objects to regenerate the tasks of at once'
+        ),
+    )
+
+    def handle_noargs(self, **options):
+        verbose = int(options['verbosity']) >= 2
+
+        if options['models']:
+            try:
+                models = [apps.get_model(label) for label in options['models']]
+            except (LookupError, ValueError) as e:
+                raise CommandError(unicode(e))
+        else:
+            models = [
+                m for m in apps.get_models()
+                if hasattr(m, 'generate_tasks') and not m._meta.proxy
+            ]
+
+        for model in models:
+            label = '{0}.{1}'.format(
+                model._meta.app_label, model._meta.object_name)
+            if not hasattr(model, 'generate_tasks'):
+                raise CommandError(
+                    "{0} doesn't have a generate_tasks method".format(label))
+            created, deleted = regenerate_tasks(
+                model, batch_size=options['batch_size'])
+            if verbose:
+                self.stdout.write(
+                    "{0}: created {1} tasks, deleted {2}".format(
+                        label, created, deleted))
@@ -96,35 +96,9 @@ class Task(models.Model):
     @classmethod
     def update_for_object(cls, obj, slug_list):
         """Create specified tasks for this objects, delete ones that are missing"""
-
-        # get the details needed to create a generic
-        content_type = ContentType.objects.get_for_model(obj)
-        object_id    = obj.pk
-
-        # note all tasks seen so we can delete redundant existing ones
-        seen_tasks = []
-
-        # check that we have tasks for all codes requested
-        for slug in slug_list:
-
-            category, created = TaskCategory.objects.get_or_create(slug=slug)
-
-            task, created = Task.objects.get_or_create(
-                content_type = content_type,
-                object_id    = object_id,
-                category     = category,
-                defaults = {
-                    'priority': category.priority,
-                },
-            )
-            seen_tasks.append( slug )
-
-        # go through all tasks in db and delete redundant ones
-        for task in cls.objects_for(obj):
-            if task.category.slug in seen_tasks: continue
-            task.delete()
-
-        pass
+        # Imported here to avoid a circular import:
+        from pombola.tasks.regeneration import update_tasks
+        update_tasks(obj.__class__, {obj.pk: slug_list})
 
 
     def add_to_log(self, msg):
@@ -161,11 +135,23 @@ class Task(models.Model):
 
 @receiver( signals.post_delete )
 def delete_related_tasks(sender, instance, **kwargs):
+    # Tasks can't have tasks of their own:
+    if isinstance(instance, (Task, TaskCategory)):
+        return
     Task.objects_for(instance).delete();
 
 
 @receiver( signals.post_save )
 def post_save_call_generate_tasks(sender, instance, **kwargs):
+    if not hasattr(instance, 'generate_tasks'):
+        return False
+    # Imported here to avoid a circular import:
+    from pombola.tasks.regeneration import defer_object, is_deferring
+    if is_deferring():
+        # The tasks will be regenerated at the end of the
+        # defer_task_generation block:
+        defer_object(instance)
+        return False
     return Task.call_generate_tasks_on_if_possible( instance )
 
 
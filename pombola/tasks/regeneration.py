@@ -0,0 +1,181 @@
+"""Regenerate the tasks for many objects at once
+
+Task.update_for_object used to create or look up each task and its
+category one at a time, and delete stale tasks one by one, and it's
+called whenever any object with a generate_tasks method is saved.  Here
+the tasks wanted for a batch of objects are worked out together,
+compared with the existing tasks, and the differences applied with one
+bulk_create and one delete.
+
+Models can provide a generate_tasks_in_bulk classmethod that returns a
+dictionary mapping the primary key of each of the given objects to its
+task slugs; otherwise generate_tasks is called on each object.
+
+For bulk imports, wrap the import in defer_task_generation, so that the
+tasks for every object saved are regenerated together at the end,
+rather than after each save.  The tasks_regenerate management command
+regenerates every object's tasks."""
+
+from collections import defaultdict
+from functools import wraps
+import threading
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from pombola.tasks.models import Task, TaskCategory
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+_deferred = threading.local()
+
+
+def get_categories(slugs):
+    """Return a dictionary mapping each slug to its TaskCategory
+
+    Any categories that don't exist yet are created."""
+    slugs = set(slugs)
+    categories = dict(
+        (c.slug, c) for c in TaskCategory.objects.filter(slug__in=slugs))
+    missing = slugs - set(categories.keys())
+    if missing:
+        TaskCategory.objects.bulk_create(
+            [TaskCategory(slug=slug) for slug in missing])
+        # bulk_create doesn't set the IDs, so fetch them again:
+        for category in TaskCategory.objects.filter(slug__in=missing):
+            categories[category.slug] = category
+    return categories
+
+
+def generate_tasks_for_objects(model, objects):
+    """Return a dictionary mapping each object's pk to its task slugs"""
+    if hasattr(model, 'generate_tasks_in_bulk'):
+        return model.generate_tasks_in_bulk(objects)
+    return dict((o.pk, o.generate_tasks()) for o in objects)
+
+
+def update_tasks(model, slugs_by_pk):
+    """Make the tasks of the model's objects match slugs_by_pk
+
+    slugs_by_pk maps primary keys to lists of task slugs.  Missing
+    tasks are created, and any others for those objects are deleted;
+    tasks that are wanted and already exist are left alone.  Returns
+    the number of tasks created and deleted."""
+
+    # Tasks can only refer to objects with integer primary keys:
+    slugs_by_pk = dict(
+        (int(pk), set(slugs)) for pk, slugs in slugs_by_pk.items()
+        if str(pk).isdigit())
+    if not slugs_by_pk:
+        return 0, 0
+
+    content_type = ContentType.objects.get_for_model(model)
+
+    existing = set()
+    to_delete = []
+    for task_id, object_id, slug in Task.objects \
+            .filter(content_type=content_type, object_id__in=slugs_by_pk.keys()) \
+            .values_list('id', 'object_id', 'category__slug'):
+        if slug in slugs_by_pk[object_id]:
+            existing.add((object_id, slug))
+        else:
+            to_delete.append(task_id)
+
+    to_create = [
+        (object_id, slug)
+        for object_id, slugs in slugs_by_pk.items()
+        for slug in slugs
+        if (object_id, slug) not in existing
+    ]
+
+    with transaction.atomic():
+        if to_create:
+            categories = get_categories(slug for _, slug in to_create)
+            Task.objects.bulk_create(
+                [
+                    Task(
+                        content_type=content_type,
+                        object_id=object_id,
+                        category=categories[slug],
+                        priority=categories[slug].priority,
+                    )
+                    for object_id, slug in to_create
+                ],
+                batch_size=DEFAULT_BATCH_SIZE,
+            )
+        if to_delete:
+            Task.objects.filter(id__in=to_delete).delete()
+
+    return len(to_create), len(to_delete)
+
+
+def regenerate_tasks(model, pks=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Regenerate the tasks of the model's objects with these pks
+
+    If pks is None, the tasks of all the model's objects are
+    regenerated.  Any of pks that no longer exist have their tasks
+    deleted.  Returns the number of tasks created and deleted."""
+
+    if pks is None:
+        pks = model._default_manager.values_list('pk', flat=True)
+    pks = sorted(set(pks))
+
+    created = deleted = 0
+    for i in range(0, len(pks), batch_size):
+        batch = pks[i:i + batch_size]
+        objects = list(model._default_manager.filter(pk__in=batch))
+        slugs_by_pk = dict((pk, []) for pk in batch)
+        slugs_by_pk.update(generate_tasks_for_objects(model, objects))
+        batch_created, batch_deleted = update_tasks(model, slugs_by_pk)
+        created += batch_created
+        deleted += batch_deleted
+    return created, deleted
+
+
+def is_deferring():
+    return getattr(_deferred, 'depth', 0) > 0
+
+
+def defer_object(obj):
+    """Note that obj's tasks should be regenerated at the end of the block"""
+    _deferred.pending[obj._meta.concrete_model].add(obj.pk)
+
+
+class defer_task_generation(object):
+    """Regenerate tasks for the objects saved in a block all at once
+
+    This can be used as a context manager:
+
+        with defer_task_generation():
+            ...
+
+    or as a decorator on a function (e.g. a management command's
+    handle method).  Instead of the tasks being regenerated after each
+    save, the saved objects are noted, and their tasks are regenerated
+    in bulk when the outermost block ends.  If the block raises an
+    exception the tasks aren't regenerated, since the changes may have
+    been rolled back; the tasks_regenerate command can fix them up."""
+
+    def __enter__(self):
+        if not is_deferring():
+            _deferred.depth = 0
+            _deferred.pending = defaultdict(set)
+        _deferred.depth += 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _deferred.depth -= 1
+        if _deferred.depth > 0:
+            return
+        pending = _deferred.pending
+        del _deferred.pending
+        if exc_type is None:
+            for model, pks in pending.items():
+                regenerate_tasks(model, pks)
+
+    def __call__(self, f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with self.__class__():
+                return f(*args, **kwargs)
+        return wrapper
@@ -2,10 +2,15 @@
 Test the tasks
 """
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.sites.models import Site
 from models import TaskCategory, Task
 
+from pombola.core.models import Contact, ContactKind, Person
+from pombola.tasks.regeneration import defer_task_generation, regenerate_tasks
+
 
 class TaskTest(TestCase):
 
@@ -179,3 +184,87 @@ class TaskTest(TestCase):
         task.add_to_log("bar")
         self.assertEqual( task.log, "foo\nbar")
 
+
+class TaskRegenerationTest(TestCase):
+
+    def setUp(self):
+        self.email_kind = ContactKind.objects.create(slug='email', name='Email')
+
+    def create_people(self, n, start=0):
+        people = []
+        for i in range(start, start + n):
+            person = Person.objects.create(
+                legal_name='Person {0}'.format(i),
+                slug='person-{0}'.format(i),
+            )
+            Contact.objects.create(
+                content_object=person,
+                kind=self.email_kind,
+                value='person{0}@example.org'.format(i),
+            )
+            people.append(person)
+        return people
+
+    def task_slugs(self, obj):
+        return sorted(t.category.slug for t in Task.objects_for(obj))
+
+    def test_regenerate_tasks(self):
+        people = self.create_people(2)
+        self.assertEqual(
+            self.task_slugs(people[0]),
+            ['find-missing-address', 'find-missing-phone'],
+        )
+
+        # Tasks that are no longer wanted are deleted, and missing ones
+        # are created:
+        Task.objects_for(people[0]).delete()
+        Contact.objects.filter(object_id=people[1].id).delete()
+        Task.update_for_object(people[1], ['find-missing-address', 'something-else'])
+
+        self.assertEqual(regenerate_tasks(Person), (4, 1))
+        self.assertEqual(
+            self.task_slugs(people[0]),
+            ['find-missing-address', 'find-missing-phone'],
+        )
+        self.assertEqual(
+            self.task_slugs(people[1]),
+            ['find-missing-address', 'find-missing-email', 'find-missing-phone'],
+        )
+
+        # Running it again changes nothing:
+        self.assertEqual(regenerate_tasks(Person), (0, 0))
+
+    def test_regenerate_tasks_query_count_is_fixed(self):
+        self.create_people(2)
+        Task.objects.all().delete()
+        with CaptureQueriesContext(connection) as few_people_queries:
+            regenerate_tasks(Person)
+
+        self.create_people(10, start=2)
+        Task.objects.all().delete()
+        with CaptureQueriesContext(connection) as many_people_queries:
+            regenerate_tasks(Person)
+
+        self.assertEqual(Task.objects.count(), 24)
+        self.assertEqual(len(few_people_queries), len(many_people_queries))
+
+    def test_defer_task_generation(self):
+        with defer_task_generation():
+            people = self.create_people(3)
+            # Nothing is generated until the end of the block:
+            self.assertEqual(Task.objects.count(), 0)
+        self.assertEqual(Task.objects.count(), 6)
+        for person in people:
+            self.assertEqual(
+                self.task_slugs(person),
+                ['find-missing-address', 'find-missing-phone'],
+            )
+
+    def test_defer_task_generation_as_decorator(self):
+        @defer_task_generation()
+        def import_people():
+            self.create_people(2)
+            self.assertEqual(Task.objects.count(), 0)
+
+        import_people()
+        self.assertEqual(Task.objects.count(), 4)
@@ -28,3 +28,7 @@ class SubmissionAdmin(admin.ModelAdmin):
 @admin.register(models.Answer)
 class AnswerAdmin(admin.ModelAdmin):
     pass
+
+@admin.register(models.QuizResults)
+class QuizResultsAdmin(admin.ModelAdmin):
+    readonly_fields = ['quiz', 'results_json', 'modified']
@@ -0,0 +1,34 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand, CommandError
+
+from pombola.votematch.models import Quiz
+from pombola.votematch.scoring import update_quiz_results
+
+
+class Command(NoArgsCommand):
+    help = 'Recompute the best matching parties over all the submissions to each quiz'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--quiz',
+            help='Only update the results of the quiz with this slug'),
+        )
+
+    def handle_noargs(self, **options):
+        verbose = int(options['verbosity']) >= 2
+
+        quizzes = Quiz.objects.all()
+        if options['quiz']:
+            quizzes = quizzes.filter(slug=options['quiz'])
+            if not quizzes.exists():
+                raise CommandError("No quiz found with slug '%s'" % options['quiz'])
+
+        for quiz in quizzes:
+            results = update_quiz_results(quiz).results
+            if verbose:
+                self.stdout.write("%s: %d submissions\n" % (quiz, results['submission_count']))
+                for band in results['by_age_band']:
+                    self.stdout.write("  %s:\n" % band['age_band'])
+                    for best_match in band['best_matches']:
+                        self.stdout.write("    %s: %d\n" % (best_match['party_name'], best_match['count']))
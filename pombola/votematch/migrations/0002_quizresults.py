@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votematch', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizResults',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, verbose_name='created', editable=False)),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, verbose_name='modified', editable=False)),
+                ('results_json', models.TextField(default='{}')),
+                ('quiz', models.OneToOneField(to='votematch.Quiz')),
+            ],
+            options={
+                'verbose_name_plural': 'quiz results',
+            },
+        ),
+    ]
@@ -1,4 +1,8 @@
+import json
+
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from model_utils.models import TimeStampedModel
 from markitup.fields import MarkupField
 from random import choice
@@ -100,5 +104,46 @@ class Answer(TimeStampedModel):
     
     def __unicode__(self):
         return "%s - %s - %s" % ( self.submission, self.get_agreement_display(), self.statement.text )
-    
-     
\ No newline at end of file
+
+
+class QuizResults(TimeStampedModel):
+    """The best matching parties over all of a quiz's submissions
+
+    These are computed by pombola.votematch.scoring.compute_quiz_results,
+    and refreshed by the votematch_update_results management command."""
+    quiz = models.OneToOneField('Quiz')
+    results_json = models.TextField(default='{}')
+
+    def __unicode__(self):
+        return unicode(self.quiz)
+
+    @property
+    def results(self):
+        return json.loads(self.results_json)
+
+    @results.setter
+    def results(self, value):
+        self.results_json = json.dumps(value)
+
+    class Meta:
+        verbose_name_plural = "quiz results"
+
+
+@receiver(post_save, sender=Statement)
+@receiver(post_delete, sender=Statement)
+@receiver(post_save, sender=Party)
+@receiver(post_delete, sender=Party)
+@receiver(post_save, sender=Stance)
+@receiver(post_delete, sender=Stance)
+def invalidate_stance_matrix(sender, instance, **kwargs):
+    # Imported here to avoid a circular import:
+    from pombola.votematch.scoring import invalidate_stance_matrix
+
+    if isinstance(instance, Stance):
+        # The statement may already have gone if it's being deleted:
+        quiz_ids = Statement.objects.filter(id=instance.statement_id) \
+            .values_list('quiz_id', flat=True)
+    else:
+        quiz_ids = [instance.quiz_id]
+    for quiz_id in quiz_ids:
+        invalidate_stance_matrix(quiz_id)
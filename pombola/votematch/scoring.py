@@ -0,0 +1,233 @@
+"""Score submissions against each of a quiz's parties
+
+The parties' stances on a quiz's statements are loaded once into a
+"stance matrix", which for each statement and each possible answer
+holds the score that answer gives every party (in a fixed order of
+parties).  Scoring a submission is then just a matter of looking up
+the row for each of its answers and summing the rows, without any
+queries.  The matrices are kept in the cache, since votematch traffic
+comes in bursts, and are invalidated by the signal handlers in
+pombola.votematch.models when a quiz's parties, statements or stances
+change.
+
+compute_quiz_results scores all of a quiz's submissions to find the
+distribution of best-matching parties, which is stored as a
+QuizResults object by the votematch_update_results management command.
+"""
+
+from collections import defaultdict
+from itertools import groupby
+
+from django.core.cache import cache
+
+from pombola.votematch import models
+
+
+# Mapping of the difference to the scores. This is to allow us to compare the
+# stances from the party and the user.
+#
+# Attempts to create a score that mixes the size of the disagreement with the
+# strength of the stance. Hence if either party are neutral the score is zero,
+# if either party holds a feling the score scales up to a maximum of +-9.
+#
+# Done as a nested hash for now with the structure:
+#   hash[party_stance][user stance]
+#
+stance_to_score_mapping = {
+       -2:     { -2:  9,  -1:  3,  0: 0,  1: -3,  2: -9 },
+       -1:     { -2:  4,  -1:  2,  0: 0,  1: -2,  2: -4 },
+        0:     { -2:  0,  -1:  0,  0: 0,  1:  0,  2:  0 },
+        1:     { -2: -4,  -1: -2,  0: 0,  1:  2,  2:  4 },
+        2:     { -2: -9,  -1: -3,  0: 0,  1:  3,  2:  9 },
+}
+
+STANCE_MATRIX_CACHE_TIMEOUT = 60 * 60 * 24
+
+# (minimum age, maximum age, label) - the maximum is exclusive:
+AGE_BANDS = (
+    (None, 18,   'under 18'),
+    (18,   25,   '18-24'),
+    (25,   35,   '25-34'),
+    (35,   50,   '35-49'),
+    (50,   65,   '50-64'),
+    (65,   None, '65 and over'),
+)
+UNKNOWN_AGE_BAND = 'unknown'
+
+
+def stance_matrix_cache_key(quiz_id):
+    return 'votematch:stance-matrix:{0}'.format(quiz_id)
+
+
+def build_stance_matrix(quiz):
+    """Return the stance matrix for the quiz, using two queries
+
+    The matrix is a dictionary with 'party_ids', the ids of the quiz's
+    parties, and 'scores', which maps each statement id and then each
+    possible answer to a tuple of the scores for each party.  A party
+    with no stance on a statement always scores zero for it."""
+
+    party_ids = list(
+        quiz.party_set.order_by('id').values_list('id', flat=True))
+    party_index = dict((party_id, i) for i, party_id in enumerate(party_ids))
+
+    stances = defaultdict(lambda: [None] * len(party_ids))
+    for statement_id, party_id, agreement in models.Stance.objects \
+            .filter(statement__quiz=quiz, party__quiz=quiz) \
+            .values_list('statement_id', 'party_id', 'agreement'):
+        stances[statement_id][party_index[party_id]] = agreement
+
+    scores = {}
+    for statement_id in quiz.statement_set.values_list('id', flat=True):
+        statement_stances = stances[statement_id]
+        scores[statement_id] = dict(
+            (
+                answer,
+                tuple(
+                    0 if stance is None else stance_to_score_mapping[stance][answer]
+                    for stance in statement_stances
+                ),
+            )
+            for answer, _ in models.agreement_choices
+        )
+
+    return {
+        'party_ids': party_ids,
+        'scores': scores,
+    }
+
+
+def get_stance_matrix(quiz):
+    """Return the quiz's stance matrix from the cache, building it if needed"""
+    key = stance_matrix_cache_key(quiz.id)
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = build_stance_matrix(quiz)
+        cache.set(key, matrix, STANCE_MATRIX_CACHE_TIMEOUT)
+    return matrix
+
+
+def invalidate_stance_matrix(quiz_id):
+    cache.delete(stance_matrix_cache_key(quiz_id))
+
+
+def score_answers(matrix, answers):
+    """Return a list of (party id, score) for the answers
+
+    answers is a dictionary mapping statement ids to the agreement
+    given; any answers to statements that aren't in the matrix are
+    ignored.  The parties are in the same order as the matrix's."""
+    scores = matrix['scores']
+    rows = [
+        scores[statement_id][agreement]
+        for statement_id, agreement in answers.items()
+        if statement_id in scores
+    ]
+    if rows:
+        totals = [sum(column) for column in zip(*rows)]
+    else:
+        totals = [0] * len(matrix['party_ids'])
+    return zip(matrix['party_ids'], totals)
+
+
+def score_submission(submission, matrix=None):
+    """Return a list of (party id, score) for the submission's answers"""
+    if matrix is None:
+        matrix = get_stance_matrix(submission.quiz)
+    answers = dict(
+        submission.answer_set.values_list('statement_id', 'agreement'))
+    return score_answers(matrix, answers)
+
+
+def age_band(age):
+    if age is None:
+        return UNKNOWN_AGE_BAND
+    for minimum, maximum, label in AGE_BANDS:
+        if (minimum is None or age >= minimum) and (maximum is None or age < maximum):
+            return label
+
+
+def best_match(scores):
+    """Return the id of the best matching party in scores, or None
+
+    As on the results page, ties go to the party that comes first."""
+    best_party_id, best_score = None, None
+    for party_id, score in scores:
+        if best_score is None or score > best_score:
+            best_party_id, best_score = party_id, score
+    return best_party_id
+
+
+def compute_quiz_results(quiz):
+    """Find the best matching party for every submission to the quiz
+
+    Returns the number of submissions with answers, how often each
+    party was the best match overall and for each age band, and how
+    many submissions' best match was the party they expected.  The
+    answers are read in one pass, so the number of queries doesn't
+    depend on the number of submissions."""
+
+    matrix = build_stance_matrix(quiz)
+    party_names = dict(quiz.party_set.values_list('id', 'name'))
+
+    submissions = dict(
+        (submission_id, (age, expected_result_id))
+        for submission_id, age, expected_result_id in models.Submission.objects
+        .filter(quiz=quiz)
+        .values_list('id', 'age', 'expected_result_id')
+    )
+
+    answers = models.Answer.objects \
+        .filter(submission__quiz=quiz) \
+        .order_by('submission_id') \
+        .values_list('submission_id', 'statement_id', 'agreement')
+
+    submission_count = 0
+    expected_result_matches = 0
+    overall_counts = defaultdict(int)
+    age_band_counts = defaultdict(lambda: defaultdict(int))
+    for submission_id, rows in groupby(answers.iterator(), lambda row: row[0]):
+        party_id = best_match(score_answers(
+            matrix,
+            dict((statement_id, agreement) for _, statement_id, agreement in rows)))
+        if party_id is None:
+            continue
+        age, expected_result_id = submissions[submission_id]
+        submission_count += 1
+        if party_id == expected_result_id:
+            expected_result_matches += 1
+        overall_counts[party_id] += 1
+        age_band_counts[age_band(age)][party_id] += 1
+
+    def best_match_counts(counts):
+        return [
+            {
+                'party_id': party_id,
+                'party_name': party_names[party_id],
+                'count': counts[party_id],
+            }
+            for party_id in sorted(counts, key=lambda p: (-counts[p], party_names[p]))
+        ]
+
+    age_band_labels = [label for _, _, label in AGE_BANDS] + [UNKNOWN_AGE_BAND]
+    return {
+        'submission_count': submission_count,
+        'expected_result_matches': expected_result_matches,
+        'best_matches': best_match_counts(overall_counts),
+        'by_age_band': [
+            {
+                'age_band': label,
+                'submission_count': sum(age_band_counts[label].values()),
+                'best_matches': best_match_counts(age_band_counts[label]),
+            }
+            for label in age_band_labels
+            if label in age_band_counts
+        ],
+    }
+
+
+def update_quiz_results(quiz):
+    quiz_results, _ = models.QuizResults.objects.get_or_create(quiz=quiz)
+    quiz_results.results = compute_quiz_results(quiz)
+    quiz_results.save()
+    return quiz_results
@@ -0,0 +1,255 @@
+from itertools import product
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from pombola.votematch import models, scoring
+
+
+class VotematchTestCase(TestCase):
+
+    def setUp(self):
+        self.quiz = models.Quiz.objects.create(name='Test Quiz', slug='test-quiz')
+        self.alpha = self.quiz.party_set.create(name='Alpha')
+        self.beta = self.quiz.party_set.create(name='Beta')
+        self.gamma = self.quiz.party_set.create(name='Gamma')
+        self.statements = [
+            self.quiz.statement_set.create(text='Statement %d' % i)
+            for i in range(3)
+        ]
+        s0, s1, s2 = self.statements
+
+        # Gamma has no stance on the second statement:
+        self.stances = {
+            (self.alpha.id, s0.id): 2,
+            (self.alpha.id, s1.id): -1,
+            (self.beta.id, s0.id): -2,
+            (self.beta.id, s2.id): 1,
+            (self.gamma.id, s0.id): 0,
+            (self.gamma.id, s2.id): 2,
+        }
+        for (party_id, statement_id), agreement in self.stances.items():
+            models.Stance.objects.create(
+                party_id=party_id,
+                statement_id=statement_id,
+                agreement=agreement,
+            )
+
+    def create_submission(self, answers, age=None, expected_result=None):
+        submission = models.Submission.objects.create(
+            quiz=self.quiz,
+            age=age,
+            expected_result=expected_result,
+        )
+        for statement, agreement in answers:
+            submission.answer_set.create(statement=statement, agreement=agreement)
+        return submission
+
+
+class ScoringTest(VotematchTestCase):
+
+    def nested_loop_scores(self, answers):
+        """Score the answers the way the results page used to"""
+        results = []
+        for party in self.quiz.party_set.order_by('id'):
+            total_score = 0
+            for statement in self.statements:
+                stance = self.stances.get((party.id, statement.id))
+                answer = answers.get(statement.id)
+                if stance is None or answer is None:
+                    # One of the stances is missing. no change to score.
+                    continue
+                total_score += scoring.stance_to_score_mapping[stance][answer]
+            results.append((party.id, total_score))
+        return results
+
+    def test_score_answers_matches_nested_loop(self):
+        matrix = scoring.build_stance_matrix(self.quiz)
+        self.assertEqual(
+            matrix['party_ids'],
+            [self.alpha.id, self.beta.id, self.gamma.id],
+        )
+
+        agreements = [None] + [agreement for agreement, _ in models.agreement_choices]
+        for combination in product(agreements, repeat=len(self.statements)):
+            answers = dict(
+                (statement.id, agreement)
+                for statement, agreement in zip(self.statements, combination)
+                if agreement is not None
+            )
+            self.assertEqual(
+                scoring.score_answers(matrix, answers),
+                self.nested_loop_scores(answers),
+            )
+
+    def test_score_submission(self):
+        s0, s1, s2 = self.statements
+        submission = self.create_submission([(s0, 1), (s1, -2), (s2, 2)])
+        self.assertEqual(
+            scoring.score_submission(submission),
+            [(self.alpha.id, 3 + 4), (self.beta.id, -3 + 4), (self.gamma.id, 9)],
+        )
+
+    def test_age_band(self):
+        self.assertEqual(scoring.age_band(None), 'unknown')
+        self.assertEqual(scoring.age_band(17), 'under 18')
+        self.assertEqual(scoring.age_band(18), '18-24')
+        self.assertEqual(scoring.age_band(24), '18-24')
+        self.assertEqual(scoring.age_band(64), '50-64')
+        self.assertEqual(scoring.age_band(65), '65 and over')
+
+    def test_compute_quiz_results(self):
+        s0, s1, s2 = self.statements
+        self.create_submission([(s0, 2)], age=20, expected_result=self.alpha)
+        self.create_submission([(s0, -2)], age=30, expected_result=self.alpha)
+        self.create_submission([(s0, -2)], age=18)
+        self.create_submission([(s2, 2)])
+        # Every party scores zero for this, so it goes to the first party:
+        self.create_submission([(s1, 0)], age=22)
+        # Submissions without any answers aren't counted:
+        self.create_submission([], age=40)
+
+        def best_match(party, count):
+            return {'party_id': party.id, 'party_name': party.name, 'count': count}
+
+        # Alpha and Beta have the same count, so are sorted by name:
+        self.assertEqual(
+            scoring.compute_quiz_results(self.quiz),
+            {
+                'submission_count': 5,
+                'expected_result_matches': 1,
+                'best_matches': [
+                    best_match(self.alpha, 2),
+                    best_match(self.beta, 2),
+                    best_match(self.gamma, 1),
+                ],
+                'by_age_band': [
+                    {
+                        'age_band': '18-24',
+                        'submission_count': 3,
+                        'best_matches': [
+                            best_match(self.alpha, 2),
+                            best_match(self.beta, 1),
+                        ],
+                    },
+                    {
+                        'age_band': '25-34',
+                        'submission_count': 1,
+                        'best_matches': [best_match(self.beta, 1)],
+                    },
+                    {
+                        'age_band': 'unknown',
+                        'submission_count': 1,
+                        'best_matches': [best_match(self.gamma, 1)],
+                    },
+                ],
+            }
+        )
+
+    def test_update_results_command(self):
+        self.create_submission([(self.statements[0], 2)], age=20)
+        call_command('votematch_update_results', quiz='test-quiz')
+        results = models.QuizResults.objects.get(quiz=self.quiz).results
+        self.assertEqual(results['submission_count'], 1)
+        self.assertEqual(results['best_matches'][0]['party_id'], self.alpha.id)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+)
+class StanceMatrixCacheTest(VotematchTestCase):
+
+    def setUp(self):
+        super(StanceMatrixCacheTest, self).setUp()
+        cache.clear()
+        self.cache_key = scoring.stance_matrix_cache_key(self.quiz.id)
+
+    def assertInvalidatedBy(self, change):
+        scoring.get_stance_matrix(self.quiz)
+        self.assertIsNotNone(cache.get(self.cache_key))
+        change()
+        self.assertIsNone(cache.get(self.cache_key))
+
+    def test_matrix_is_cached(self):
+        matrix = scoring.get_stance_matrix(self.quiz)
+        with self.assertNumQueries(0):
+            self.assertEqual(scoring.get_stance_matrix(self.quiz), matrix)
+
+    def test_stance_changes_invalidate_matrix(self):
+        stance = models.Stance.objects.get(
+            party=self.gamma, statement=self.statements[0])
+        stance.agreement = 2
+        self.assertInvalidatedBy(stance.save)
+        self.assertEqual(
+            scoring.get_stance_matrix(self.quiz)['scores'][self.statements[0].id][2],
+            (9, -9, 9),
+        )
+        self.assertInvalidatedBy(stance.delete)
+        self.assertEqual(
+            scoring.get_stance_matrix(self.quiz)['scores'][self.statements[0].id][2],
+            (9, -9, 0),
+        )
+
+    def test_party_changes_invalidate_matrix(self):
+        self.assertInvalidatedBy(
+            lambda: self.quiz.party_set.create(name='Delta'))
+        self.assertEqual(len(scoring.get_stance_matrix(self.quiz)['party_ids']), 4)
+        self.assertInvalidatedBy(self.beta.delete)
+        self.assertEqual(len(scoring.get_stance_matrix(self.quiz)['party_ids']), 3)
+
+    def test_statement_changes_invalidate_matrix(self):
+        statement = self.statements[1]
+        statement.text = 'Changed statement'
+        self.assertInvalidatedBy(statement.save)
+        self.assertInvalidatedBy(statement.delete)
+        self.assertNotIn(
+            statement.id, scoring.get_stance_matrix(self.quiz)['scores'])
+
+    def test_other_quizzes_are_unaffected(self):
+        other_quiz = models.Quiz.objects.create(name='Other Quiz', slug='other-quiz')
+        scoring.get_stance_matrix(self.quiz)
+        other_quiz.party_set.create(name='Other')
+        self.assertIsNotNone(cache.get(self.cache_key))
+
+
+class QuizDetailViewTest(VotematchTestCase):
+
+    def test_submission_is_created_with_answers(self):
+        s0, s1, s2 = self.statements
+        response = self.client.post(
+            reverse('votematch-quiz', kwargs={'slug': 'test-quiz'}),
+            {
+                'statement-%d' % s0.id: '2',
+                'statement-%d' % s1.id: '',
+                'statement-%d' % s2.id: '-1',
+                'age': '30',
+                'expected_result': str(self.beta.id),
+            }
+        )
+
+        submission = models.Submission.objects.get(quiz=self.quiz)
+        self.assertRedirects(response, submission.get_absolute_url())
+        self.assertEqual(submission.age, 30)
+        self.assertEqual(submission.expected_result, self.beta)
+        self.assertEqual(
+            dict(submission.answer_set.values_list('statement_id', 'agreement')),
+            {s0.id: 2, s2.id: -1},
+        )
+
+    def test_no_submission_without_answers(self):
+        response = self.client.post(
+            reverse('votematch-quiz', kwargs={'slug': 'test-quiz'}),
+            dict(
+                [('statement-%d' % s.id, '') for s in self.statements] +
+                [('age', ''), ('expected_result', '')]
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(models.Submission.objects.exists())
@@ -1,8 +1,9 @@
 import models
+from pombola.votematch.scoring import get_stance_matrix, score_submission
 
+from django.db import transaction
 from django.shortcuts  import render_to_response, get_object_or_404, redirect
 from django.template   import RequestContext
-from django.core.exceptions import ObjectDoesNotExist
 
 
 def quiz_detail (request, slug):
@@ -43,18 +44,22 @@ def quiz_detail (request, slug):
 
         # get all the answers
         if len(answers):
-            submission = models.Submission.objects.create(
-                quiz            = quiz,
-                age             = age,
-                expected_result = expected_result
-            )
-            
-            for statement_id, answer in answers.iteritems():
-                submission.answer_set.create(
-                    statement = statements[statement_id],
-                    agreement = answer
+            with transaction.atomic():
+                submission = models.Submission.objects.create(
+                    quiz            = quiz,
+                    age             = age,
+                    expected_result = expected_result
                 )
 
+                models.Answer.objects.bulk_create([
+                    models.Answer(
+                        submission = submission,
+                        statement  = statements[statement_id],
+                        agreement  = answer
+                    )
+                    for statement_id, answer in answers.iteritems()
+                ])
+
             return redirect(submission)
 
 
@@ -69,24 +74,6 @@ def quiz_detail (request, slug):
     
 
 
-# Mapping of the difference to the scores. This is to allow us to compare the
-# stances from the party and the user.
-#
-# Attempts to create a score that mixes the size of the disagreement with the
-# strength of the stance. Hence if either party are neutral the score is zero,
-# if either party holds a feling the score scales up to a maximum of +-9.
-#
-# Done as a nested hash for now with the structure:
-#   hash[party_stance][user stance]
-#
-stance_to_score_mapping = {
-       -2:     { -2:  9,  -1:  3,  0: 0,  1: -3,  2: -9 },
-       -1:     { -2:  4,  -1:  2,  0: 0,  1: -2,  2: -4 },
-        0:     { -2:  0,  -1:  0,  0: 0,  1:  0,  2:  0 },
-        1:     { -2: -4,  -1: -2,  0: 0,  1:  2,  2:  4 },
-        2:     { -2: -9,  -1: -3,  0: 0,  1:  3,  2:  9 },
-}
-
 def submission_detail (request, slug, token):
 
     # TODO - we're not checking that the quiz slug is correct. We don't really
@@ -99,24 +86,18 @@ def submission_detail (request, slug, token):
     
     quiz = submission.quiz
 
-    results = []
-    for party in quiz.party_set.all():
-        total_score = 0
-
-        for statement in quiz.statement_set.all():
-            try:
-                answer = submission.answer_set.get(statement=statement)
-                stance = party.stance_set.get(statement=statement)
-                score = stance_to_score_mapping[stance.agreement][answer.agreement]
-                total_score += score
-            except ObjectDoesNotExist:
-                # One of the stances is missing. no change to score.
-                total_score += 0
-
-        results.append({
-            'score':          total_score,
-            'party':          party,
-        })
+    # The scores are found from the quiz's cached stance matrix, see
+    # pombola.votematch.scoring for how they're calculated.
+    matrix = get_stance_matrix(quiz)
+    parties = quiz.party_set.in_bulk(matrix['party_ids'])
+    results = [
+        {
+            'score': score,
+            'party': parties[party_id],
+        }
+        for party_id, score in score_submission(submission, matrix)
+        if party_id in parties
+    ]
 
     # Useful for manually testing different scores.
     # results[0]['score'] = 4
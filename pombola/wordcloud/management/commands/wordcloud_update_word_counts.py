@@ -0,0 +1,43 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from pombola.hansard.models import Sitting
+from pombola.wordcloud.wordcloud import update_sitting_word_counts
+
+
+class Command(NoArgsCommand):
+    help = 'Count the words used in hansard sittings, for the word cloud'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--all',
+            action='store_true',
+            dest='all',
+            default=False,
+            help='Recount the words in every sitting, not just those without counts'
+        ),
+        make_option(
+            '--batch-size',
+            type='int',
+            dest='batch_size',
+            default=50,
+            help='The number of sittings to count at a time'
+        ),
+    )
+
+    def handle_noargs(self, **options):
+        verbose = int(options['verbosity']) >= 2
+
+        sittings = Sitting.objects.filter(entry__isnull=False)
+        if not options['all']:
+            sittings = sittings.filter(word_counts__isnull=True)
+        sitting_ids = sorted(set(sittings.values_list('id', flat=True)))
+
+        batch_size = options['batch_size']
+        for i in range(0, len(sitting_ids), batch_size):
+            batch = sitting_ids[i:i + batch_size]
+            update_sitting_word_counts(batch)
+            if verbose:
+                self.stdout.write("Counted words in {0} of {1} sittings".format(
+                    i + len(batch), len(sitting_ids)))
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hansard', '0003_datetimefield_remove_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SittingWordCount',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('word', models.CharField(max_length=200, db_index=True)),
+                ('count', models.PositiveIntegerField()),
+                ('sitting', models.ForeignKey(related_name='word_counts', to='hansard.Sitting')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='sittingwordcount',
+            unique_together=set([('sitting', 'word')]),
+        ),
+    ]
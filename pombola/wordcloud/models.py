@@ -0,0 +1,26 @@
+from django.db import models
+from django.dispatch import receiver
+
+from pombola.hansard.models import Sitting
+from pombola.hansard.signals import entries_created
+
+
+class SittingWordCount(models.Model):
+    """The number of times a word was used in the entries of a sitting"""
+
+    sitting = models.ForeignKey(Sitting, related_name='word_counts')
+    word = models.CharField(max_length=200, db_index=True)
+    count = models.PositiveIntegerField()
+
+    def __unicode__(self):
+        return u"{0}: {1} ({2})".format(self.sitting, self.word, self.count)
+
+    class Meta:
+        unique_together = ('sitting', 'word')
+
+
+@receiver(entries_created)
+def count_words_in_new_entries(sender, sitting, **kwargs):
+    # Imported here to avoid a circular import:
+    from pombola.wordcloud.wordcloud import update_sitting_word_counts
+    update_sitting_word_counts([sitting.id])
@@ -1,78 +1,86 @@
 # coding=UTF-8
-from mock import patch, Mock
+from datetime import date
 
 from django.test import TestCase
+from django.test.utils import override_settings
 
-from pombola.wordcloud.wordcloud import popular_words
+from pombola.hansard.models import Entry, Sitting, Source, Venue
+from pombola.wordcloud.wordcloud import (
+    cached_top_words, top_words, update_sitting_word_counts, words_in_text
+)
 
 
 def debug_print():
     print 'DEBUGGING'
 
 
-@patch('pombola.wordcloud.wordcloud.recent_entries')
-class TestPopularWords(TestCase):
-    def make_entries(self, recent_entries, text_entries):
-        recent_entries.return_value = [
-            Mock(**{'object.content': x}) for x in text_entries
-            ]
-
-    def test_popular_words_punctuation(self, recent_entries):
-        text_entries = [
-            'Testing! Testing!',
-            'Testing again.',
-            ]
+class TestWordsInText(TestCase):
+    def test_punctuation_and_stop_words(self):
+        self.assertEqual(
+            list(words_in_text('Testing! The testing, again.')),
+            ['testing', 'testing'],
+            )
 
-        self.make_entries(recent_entries, text_entries)
 
-        self.assertEqual(
-            [{'text': 'testing', 'link': '/search/hansard/?q=testing', 'weight': 3}],
-            popular_words(),
+class TestTopWords(TestCase):
+    def setUp(self):
+        venue = Venue.objects.create(name='Test Venue', slug='test-venue')
+        source = Source.objects.create(
+            name='Test Source',
+            date=date(2015, 2, 1),
+            url='http://example.com/example',
             )
+        self.old_sitting = Sitting.objects.create(
+            venue=venue, source=source, start_date=date(2015, 1, 1))
+        self.new_sitting = Sitting.objects.create(
+            venue=venue, source=source, start_date=date(2015, 1, 2))
+
+        for i, (sitting, content) in enumerate((
+                (self.old_sitting, 'Academies and schools.'),
+                (self.new_sitting, 'Academies! More academies.'),
+                (self.new_sitting, 'Regional schools.'),
+                )):
+            Entry.objects.create(
+                type='speech',
+                sitting=sitting,
+                page_number=1,
+                text_counter=i,
+                content=content,
+                )
 
-    def test_popular_words(self, recent_entries):
-        text_entries = [
-            'As well as issuing 107 formal notices to underperforming academies, '
-            'we have intervened and changed the sponsor in 75 cases of particular '
-            'concern. The results of such intervention are evident.',
-            'I am interested in what the right hon. Lady has to say about failing '
-            'academies because, as she will know, the regional schools commissioner '
-            'is involved in one academy in my constituency that Ofsted judges to '
-            'be inadequate.',
-            ]
+        update_sitting_word_counts([self.old_sitting.id, self.new_sitting.id])
 
-        self.make_entries(recent_entries, text_entries)
+    def test_top_words(self):
+        self.assertEqual(
+            [(w['text'], w['weight']) for w in top_words()],
+            [('academies', 3), ('schools', 2), ('regional', 1)],
+            )
+        self.assertEqual(
+            [(w['text'], w['weight']) for w in top_words(max_sittings=1)],
+            [('academies', 2), ('regional', 1), ('schools', 1)],
+            )
+        self.assertEqual(
+            [(w['text'], w['weight']) for w in top_words(end_date=date(2015, 1, 1))],
+            [('academies', 1), ('schools', 1)],
+            )
 
-        words = popular_words()
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    })
+    def test_cached_top_words_invalidated_by_new_counts(self):
+        self.assertEqual(cached_top_words(max_words=1)[0]['text'], 'academies')
 
-        expected = [
-            {'text': 'academies', 'link': '/search/hansard/?q=academies', 'weight': 2},
-            {'text': 'changed', 'link': '/search/hansard/?q=changed', 'weight': 1},
-            {'text': 'underperforming', 'link': '/search/hansard/?q=underperforming', 'weight': 1},
-            {'text': 'inadequate', 'link': '/search/hansard/?q=inadequate', 'weight': 1},
-            {'text': 'sponsor', 'link': '/search/hansard/?q=sponsor', 'weight': 1},
-            {'text': 'intervention', 'link': '/search/hansard/?q=intervention', 'weight': 1},
-            {'text': 'judges', 'link': '/search/hansard/?q=judges', 'weight': 1},
-            {'text': 'ofsted', 'link': '/search/hansard/?q=ofsted', 'weight': 1},
-            {'text': '107', 'link': '/search/hansard/?q=107', 'weight': 1},
-            {'text': 'interested', 'link': '/search/hansard/?q=interested', 'weight': 1},
-            {'text': 'notices', 'link': '/search/hansard/?q=notices', 'weight': 1},
-            {'text': 'concern', 'link': '/search/hansard/?q=concern', 'weight': 1},
-            {'text': 'commissioner', 'link': '/search/hansard/?q=commissioner', 'weight': 1},
-            {'text': 'intervened', 'link': '/search/hansard/?q=intervened', 'weight': 1},
-            {'text': 'academy', 'link': '/search/hansard/?q=academy', 'weight': 1},
-            {'text': 'regional', 'link': '/search/hansard/?q=regional', 'weight': 1},
-            {'text': '75', 'link': '/search/hansard/?q=75', 'weight': 1},
-            {'text': 'schools', 'link': '/search/hansard/?q=schools', 'weight': 1},
-            {'text': 'cases', 'link': '/search/hansard/?q=cases', 'weight': 1},
-            {'text': 'lady', 'link': '/search/hansard/?q=lady', 'weight': 1},
-            {'text': 'issuing', 'link': '/search/hansard/?q=issuing', 'weight': 1},
-            {'text': 'formal', 'link': '/search/hansard/?q=formal', 'weight': 1},
-            {'text': 'evident', 'link': '/search/hansard/?q=evident', 'weight': 1},
-            {'text': 'involved', 'link': '/search/hansard/?q=involved', 'weight': 1},
-            {'text': 'failing', 'link': '/search/hansard/?q=failing', 'weight': 1},
-            {'text': 'constituency', 'link': '/search/hansard/?q=constituency', 'weight': 1},
-            ]
+        Entry.objects.create(
+            type='speech',
+            sitting=self.new_sitting,
+            page_number=1,
+            text_counter=3,
+            content='Schools, schools, schools.',
+            )
+        # The cached results are used until the counts are updated:
+        self.assertEqual(cached_top_words(max_words=1)[0]['text'], 'academies')
 
-        # I guess this is slightly fragile and relies on the ordering being preserved.
-        self.assertEqual(words, expected)
+        update_sitting_word_counts([self.new_sitting.id])
+        self.assertEqual(cached_top_words(max_words=1)[0]['text'], 'schools')
@@ -5,11 +5,11 @@ from .views import wordcloud
 
 urlpatterns = [
     url(r'^wordcloud/$', wordcloud, name='wordcloud'),
-    url(r'^wordcloud/(?P<max_entries>\d+)/$', wordcloud, name='wordcloud'),
+    url(r'^wordcloud/(?P<max_sittings>\d+)/$', wordcloud, name='wordcloud'),
 
     # Temporary redirects of old urls
     url(r'^tagcloud/$',
         RedirectView.as_view(pattern_name='wordcloud', permanent=True)),
-    url(r'^tagcloud/(?P<max_entries>\d+)/$',
+    url(r'^tagcloud/(?P<max_sittings>\d+)/$',
         RedirectView.as_view(pattern_name='wordcloud', permanent=True)),
 ]
@@ -1,8 +1,12 @@
+from collections import defaultdict
 import os
-from operator import itemgetter
 import re
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
 
-from haystack.query import SearchQuerySet
 from pombola.hansard import models as hansard_models
 
 
@@ -11,33 +15,118 @@ BASEDIR = os.path.dirname(__file__)
 with open(os.path.join(BASEDIR, 'stopwords.txt'), 'rU') as f:
     STOP_WORDS = set(f.read().splitlines())
 
-def recent_entries(max_entries=10):
-    return SearchQuerySet().models(hansard_models.Entry).order_by('-sitting_start_date')[:max_entries]
+# The key of the value that's changed whenever the word counts change,
+# so that all cached top_words results are invalidated at once:
+CACHE_VERSION_KEY = 'wordcloud:version'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def words_in_text(text):
+    """Yield each word in text, in lower case, skipping stop words"""
+    text = re.sub(ur'[^\w\s]', '', text.lower())
+
+    for x in text.split():
+        if x not in STOP_WORDS:
+            yield x
+
+
+def update_sitting_word_counts(sitting_ids):
+    """Recount the words used in each of the sittings with sitting_ids
+
+    This should be called whenever entries are added to a sitting;
+    the counts for other sittings are left alone."""
+    # Imported here to avoid a circular import:
+    from pombola.wordcloud.models import SittingWordCount
+
+    sitting_ids = list(sitting_ids)
+    max_length = SittingWordCount._meta.get_field('word').max_length
+
+    counts = defaultdict(lambda: defaultdict(int))
+    entry_rows = hansard_models.Entry.objects \
+        .filter(sitting_id__in=sitting_ids) \
+        .values_list('sitting_id', 'content')
+    for sitting_id, content in entry_rows.iterator():
+        for word in words_in_text(content):
+            if len(word) <= max_length:
+                counts[sitting_id][word] += 1
+
+    with transaction.atomic():
+        SittingWordCount.objects.filter(sitting_id__in=sitting_ids).delete()
+        SittingWordCount.objects.bulk_create(
+            [
+                SittingWordCount(sitting_id=sitting_id, word=word, count=count)
+                for sitting_id, sitting_counts in counts.items()
+                for word, count in sitting_counts.items()
+            ],
+            batch_size=1000,
+        )
+
+    invalidate_cached_words()
+
+
+def selected_sitting_ids(max_sittings=None, start_date=None, end_date=None):
+    """Return the IDs of the most recent max_sittings in the date range"""
+    sittings = hansard_models.Sitting.objects.order_by('-start_date', '-id')
+    if start_date:
+        sittings = sittings.filter(start_date__gte=start_date)
+    if end_date:
+        sittings = sittings.filter(start_date__lte=end_date)
+    sitting_ids = sittings.values_list('id', flat=True)
+    if max_sittings:
+        sitting_ids = sitting_ids[:max_sittings]
+    return list(sitting_ids)
+
+
+def top_words(max_words=50, max_sittings=None, start_date=None, end_date=None):
+    """Return the most used words in the selected sittings
+
+    The sittings are the most recent max_sittings (or all of them)
+    that started between start_date and end_date, if they're given.
+    The words are found from the stored per-sitting word counts
+    rather than the entries themselves."""
+    # Imported here to avoid a circular import:
+    from pombola.wordcloud.models import SittingWordCount
+
+    sitting_ids = selected_sitting_ids(max_sittings, start_date, end_date)
+    if not sitting_ids:
+        return []
+
+    word_weights = SittingWordCount.objects \
+        .filter(sitting_id__in=sitting_ids) \
+        .values('word') \
+        .annotate(weight=Sum('count')) \
+        .order_by('-weight', 'word')[:max_words]
 
+    return [
+        {
+            "text": row['word'],
+            "weight": row['weight'],
+            "link": "/search/hansard/?q=%s" % row['word'],
+        }
+        for row in word_weights
+    ]
 
-def popular_words(max_entries=10, max_words=50):
-    sqs = recent_entries(max_entries)
 
-    # Generate tag cloud from content of returned entries
-    words = {}
-    for entry in sqs:
-        text = re.sub(ur'[^\w\s]', '', entry.object.content.lower())
+def invalidate_cached_words():
+    """Make sure that cached_top_words doesn't return any older results"""
+    cache.set(CACHE_VERSION_KEY, time.time(), None)
 
-        for x in text.split():
-            if x not in STOP_WORDS:
-                words[x] = 1 + words.get(x, 0)
 
-    wordlist = []
+def cached_top_words(max_words=50, max_sittings=None, start_date=None, end_date=None):
+    """Return top_words(...), from the cache if possible
 
-    for word in words:
-        wordlist.append(
-            {
-                "text": word,
-                "weight": words.get(word),
-                "link": "/search/hansard/?q=%s" % word,
-                }
-            )
+    The cached results are invalidated by invalidate_cached_words,
+    which is called whenever the word counts are updated."""
 
-    wordlist.sort(key=itemgetter('weight'), reverse=True)
+    version = cache.get(CACHE_VERSION_KEY)
+    if version is None:
+        invalidate_cached_words()
+        version = cache.get(CACHE_VERSION_KEY)
 
-    return wordlist[:max_words]
+    cache_key = 'wordcloud:top_words:{0}:{1}:{2}:{3}:{4}'.format(
+        version, max_words, max_sittings, start_date, end_date)
+    words = cache.get(cache_key)
+    if words is None:
+        words = top_words(max_words, max_sittings, start_date, end_date)
+        cache.set(cache_key, words, CACHE_TIMEOUT)
+    return words